@@ -1,11 +1,6 @@
-from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_core.messages import HumanMessage
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.prebuilt import create_react_agent
 import os
+import threading
 from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
-from langchain_openai import AzureOpenAIEmbeddings
 load_dotenv()
 
 # Get them from environment
@@ -14,14 +9,35 @@ endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
 deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
 api_version = os.getenv("AZURE_OPENAI_API_VERSION")
 
-# Set up AzureChatOpenAI
-llm = AzureChatOpenAI(
-    deployment_name=deployment,
-    azure_endpoint=endpoint,
-    api_key=api_key,
-    api_version=api_version
-)
+_llm = None
+_llm_lock = threading.Lock()
+
+
+def get_llm():
+    """Set up AzureChatOpenAI on first use (importing langchain_openai is slow)."""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                from langchain_openai import AzureChatOpenAI
+                _llm = AzureChatOpenAI(
+                    deployment_name=deployment,
+                    azure_endpoint=endpoint,
+                    api_key=api_key,
+                    api_version=api_version,
+                    # Retries go through resilience.call() so they share the retry budget
+                    max_retries=0,
+                )
+    return _llm
+
+
+def __getattr__(name):
+    # Keeps `from agent.models import llm` working; it builds the client on access
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__=="__main__":
-    print("Executed Successfully")
\ No newline at end of file
+    get_llm()
+    print("Executed Successfully")
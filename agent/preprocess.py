@@ -1,9 +1,44 @@
-from langchain_community.tools.tavily_search import TavilySearchResults
+from agent.rules import rule_based_enrich, record_fixture
+from metrics import upstream, llm_usage, cache_lookup, inc
+from resilience import CircuitOpen, guarded
+import deadline
+import resilience
 import os
+import threading
+
+_tavily = None
+_tavily_lock = threading.Lock()
+
+
+class TavilyError(Exception):
+    """The Tavily tool returns its error text instead of raising; this lets the circuit breaker see it."""
+
+def get_tavily():
+    """Creates the Tavily search tool on first use (langchain_community is slow to import)."""
+    global _tavily
+    if _tavily is None:
+        with _tavily_lock:
+            if _tavily is None:
+                from langchain_community.tools.tavily_search import TavilySearchResults
+                if os.getenv("TAVILY_API_URL"):
+                    # The wrapper reads its endpoint from this module constant (load tests use a local stub)
+                    from langchain_community.utilities import tavily_search as tavily_api
+                    tavily_api.TAVILY_API_URL = os.getenv("TAVILY_API_URL").rstrip("/")
+                _tavily = TavilySearchResults(api_key=os.getenv("TAVILY_API_KEY"))
+    return _tavily
+
+# When set, every LLM enrichment is appended here for `python -m agent.rules`
+ENRICH_FIXTURE_PATH = os.getenv("ENRICH_FIXTURE_PATH")
+
+def enrich_profile_json(llm, profile_json: dict, use_rules: bool = True) -> dict:
+    # Simple personas are handled by the rules; the LLM is only asked when they are unsure
+    if use_rules and not ENRICH_FIXTURE_PATH:
+        rule_result, confident = rule_based_enrich(profile_json)
+        inc("enrich_total", method="rules" if confident else "llm")
+        if confident:
+            print(f"Enriched persona with rules (LLM skipped): {rule_result['name']} {rule_result['company_names']}")
+            return rule_result
 
-tavily = TavilySearchResults(api_key=os.getenv("TAVILY_API_KEY"))
-
-def enrich_profile_json(llm, profile_json: dict) -> dict:
     # Create a prompt to clean and extract fields
     prompt = f"""
 You are a data extractor. Given this JSON object:
@@ -29,7 +64,18 @@ If no companies or extra links are found, return None for those fields.
 """
 
     # Invoke the LLM
-    response = llm.invoke(prompt)
+    def invoke():
+        with upstream("azure_openai", purpose="enrich"):
+            return llm.invoke(prompt, **deadline.timeout_kwargs("enrichment"))
+
+    try:
+        response = resilience.call("azure_openai", invoke)
+    except CircuitOpen as e:
+        if use_rules and not ENRICH_FIXTURE_PATH:
+            print(f"Using the rule-based enrichment: {e}")
+            return rule_result
+        raise
+    llm_usage(response, purpose="enrich")
 
     # Parse the content from the response (string -> dict)
     import json
@@ -40,10 +86,34 @@ If no companies or extra links are found, return None for those fields.
         print(response.content)
         return None
 
+    if ENRICH_FIXTURE_PATH:
+        record_fixture(ENRICH_FIXTURE_PATH, profile_json, result_json)
+
     return result_json
 
 
-def update_intro_with_search(profile_json: dict) -> dict:
+def tavily_search(query: str, num_results: int = 3, search_cache: dict = None):
+    """Runs a Tavily query, reusing the result when the same query is already in `search_cache`."""
+    if search_cache is not None:
+        cache_lookup("search", query in search_cache)
+        if query in search_cache:
+            return search_cache[query]
+    # The Tavily client has no per-call timeout; at least do not start a query past the deadline
+    deadline.check("tavily search")
+    try:
+        with guarded("tavily"), upstream("tavily"):
+            results = get_tavily().run(query, num_results=num_results)
+            if isinstance(results, str):
+                raise TavilyError(results[:200])
+    except (CircuitOpen, TavilyError) as e:
+        print(f"Skipping Tavily search {query!r}: {e}")
+        return []
+    if search_cache is not None:
+        search_cache[query] = results
+    return results
+
+
+def update_intro_with_search(profile_json: dict, search_cache: dict = None) -> dict:
     # Extract name, company_names, and social_profiles
     og_keys = profile_json.get("original_keys", {})
     name = profile_json.get("name", "")
@@ -66,7 +136,7 @@ def update_intro_with_search(profile_json: dict) -> dict:
     # Collect top 3 titles from results for each query
     results_titles = []
     for query in search_queries:
-        results = tavily.run(query, num_results=3)
+        results = tavily_search(query, num_results=3, search_cache=search_cache)
         if results and isinstance(results, list):
             for result in results[:3]:
                 title = result.get("title")
@@ -85,7 +155,7 @@ def update_intro_with_search(profile_json: dict) -> dict:
     return updated_json
 
 
-def find_linkedin_profiles_by_tavily(profile_json: dict) -> list:
+def find_linkedin_profiles_by_tavily(profile_json: dict, titles: dict = None, search_cache: dict = None) -> list:
     if profile_json is None:
         print("Error: profile_json is None!")
         return []
@@ -100,30 +170,36 @@ def find_linkedin_profiles_by_tavily(profile_json: dict) -> list:
     # Search 1: Query with just the name
     if name:
         query_name = f"LinkedIn profile of {name}"
-        results_name = tavily.run(query_name, num_results=3)
+        results_name = tavily_search(query_name, num_results=3, search_cache=search_cache)
         if results_name and isinstance(results_name, list):
             for result in results_name:
                 if 'linkedin.com/in' in result.get('url', '') and 'company' not in result.get('url', ''):
                     linkedin_links.append(result.get('url'))
+                    if titles is not None and result.get('title'):
+                        titles[result.get('url')] = result.get('title')
 
     # Search 2: Query with name + each company name
     for company_name in company_names:
         if company_name:
             query_name_company = f"LinkedIn profile of {name} at {company_name}"
-            results_name_company = tavily.run(query_name_company, num_results=3)
+            results_name_company = tavily_search(query_name_company, num_results=3, search_cache=search_cache)
             if results_name_company and isinstance(results_name_company, list):
                 for result in results_name_company:
                     if 'linkedin.com/in' in result.get('url', '') and 'company' not in result.get('url', ''):
                         linkedin_links.append(result.get('url'))
+                        if titles is not None and result.get('title'):
+                            titles[result.get('url')] = result.get('title')
 
     # Search 3: Query with name + full social profile URL
     for profile in social_profiles:
         if 'linkedin.com' not in profile:
             query_social_url = f"LinkedIn profile of {name} based on social profile {profile}"
-            results_social_url = tavily.run(query_social_url, num_results=3)
+            results_social_url = tavily_search(query_social_url, num_results=3, search_cache=search_cache)
             if results_social_url and isinstance(results_social_url, list):
                 for result in results_social_url:
                     if 'linkedin.com/in' in result.get('url', '') and 'company' not in result.get('url', ''):
                         linkedin_links.append(result.get('url'))
+                        if titles is not None and result.get('title'):
+                            titles[result.get('url')] = result.get('title')
 
     return linkedin_links
@@ -0,0 +1,237 @@
+"""
+Rule-based persona enrichment.
+
+Handles the common persona shapes ("Content @ Dock", "Eric Doty (Superpath)",
+"RohanM") with regexes so `enrich_profile_json` only needs the LLM when the
+rules are unsure. Run as a script to replay a fixture file and measure how
+often the rules agree with recorded LLM output:
+
+    python -m agent.rules agent/fixtures/enrich_fixtures.jsonl
+
+The seed entries in that file are hand-labelled ("source": "hand"); entries
+appended through ENRICH_FIXTURE_PATH are real LLM output ("source": "llm").
+Agreement is reported for both separately, and tests/test_rules.py fails when
+the rules are confident on a fixture and disagree with its label.
+"""
+import json
+import re
+import sys
+
+URL_RE = re.compile(r"https?://[^\s,;\"'<>()]+|www\.[^\s,;\"'<>()]+", re.IGNORECASE)
+PAREN_RE = re.compile(r"\(([^()]+)\)")
+# Words that introduce a company: "Content @ Dock", "Engineer at Acme Corp", "CTO | Acme", "ex-Meta"
+CONNECTOR_RE = re.compile(r"\s@\s?|^@\s?|\bat\s+|\s\|\s|\b[Ee]x-\s?")
+COMPANY_RE = re.compile(r"(?:" + CONNECTOR_RE.pattern + r")([A-Z0-9][\w&.'-]*(?:\s+[A-Z0-9][\w&.'-]*){0,3})")
+# A single capital initial glued to the end of a name ("RohanM")
+TRAILING_INITIAL_RE = re.compile(r"(?<=[a-z])(?=[A-Z](?:\s|$))")
+# Any other capital inside a word: "McDonald" and "DeShawn", but also "JohnSmith"
+INNER_CAPITAL_RE = re.compile(r"[a-z][A-Z]")
+
+# Words that may appear in an intro without naming a company
+ROLE_WORDS = {
+    "ceo", "cto", "cfo", "coo", "cmo", "vp", "head", "lead", "senior", "sr", "junior", "jr",
+    "staff", "principal", "founder", "co-founder", "cofounder", "engineer", "engineering",
+    "developer", "manager", "director", "product", "marketing", "content", "sales", "designer",
+    "design", "data", "scientist", "analyst", "consultant", "writer", "editor", "growth",
+    "operations", "ops", "software", "owner", "partner", "president", "advisor", "investor",
+    "research", "researcher", "student", "intern", "freelance", "freelancer", "community",
+    "support", "customer", "success", "hr", "recruiter", "talent", "speaker", "ux", "ui",
+    "of", "and", "&", "the",
+}
+# Links that identify the person rather than a company
+PERSONAL_KEYS = ("social_profile", "image")
+
+
+def _strings(value):
+    """Yields every string nested inside a persona value."""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from _strings(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from _strings(v)
+
+
+def clean_name(raw_name):
+    """
+    Returns (cleaned name, company found in the name, confident flag).
+
+    "Eric Doty (Superpath)" -> ("Eric Doty", "Superpath", True)
+    "RohanM"                -> ("Rohan M", None, True)
+    "McDonald Smith"        -> ("McDonald Smith", None, False)
+    """
+    if not raw_name or not isinstance(raw_name, str):
+        return None, None, False
+
+    company = None
+    paren = PAREN_RE.search(raw_name)
+    if paren:
+        company = paren.group(1).strip()
+        raw_name = PAREN_RE.sub(" ", raw_name)
+
+    at = re.search(r"\s(?:@|at|\|)\s+(.+)$", raw_name)
+    if at:
+        company = company or at.group(1).strip()
+        raw_name = raw_name[:at.start()]
+
+    name = TRAILING_INITIAL_RE.sub(" ", raw_name)
+    name = re.sub(r"[^\w\s.'-]", " ", name)
+    name = " ".join(name.split())
+
+    tokens = name.split()
+    confident = 1 <= len(tokens) <= 4 and all(re.fullmatch(r"[^\W\d_][\w.'-]*", t) for t in tokens)
+    # Inner capitals are kept as written; whether "JohnSmith" is two names is left to the LLM
+    confident = confident and not INNER_CAPITAL_RE.search(name)
+    if confident:
+        name = " ".join(t[0].upper() + t[1:] for t in tokens)
+    return name or None, company, confident
+
+
+def extract_companies(intro):
+    """
+    Returns (companies mentioned in the intro, confident flag).
+
+    The rules are unsure when a connector (at, @, ex-) is not followed by a
+    capitalised company ("Head of Growth at hubspot"), or when capitalised
+    words are left over that are neither a role word nor part of a matched
+    company. Matches made only of role words ("CTO | Founder") are not
+    companies.
+    """
+    if not intro or not isinstance(intro, str):
+        return [], True
+
+    text = URL_RE.sub(" ", intro)
+    companies = [m.strip(" .,") for m in PAREN_RE.findall(text)]
+    text = PAREN_RE.sub(" ", text)
+    confident = True
+    for connector in CONNECTOR_RE.finditer(text):
+        match = COMPANY_RE.match(text, connector.start())
+        company = match.group(1).strip(" .,") if match else ""
+        if all(w.lower() in ROLE_WORDS for w in company.split()):
+            # "|" also separates roles ("Founder @ Acme | Investor at ..."); the others must name a company
+            confident = confident and connector.group().strip() == "|" and bool(company)
+            continue
+        companies.append(company)
+    leftover = COMPANY_RE.sub(" ", text)
+
+    unknown = [w for w in re.findall(r"[A-Za-z][\w&'-]*", leftover)
+               if w[0].isupper() and w.lower() not in ROLE_WORDS]
+    return companies, confident and not unknown
+
+
+def extract_links(profile_json):
+    """All URLs in the persona except the ones under social_profile and image."""
+    personal = set()
+    for key in PERSONAL_KEYS:
+        personal.update(_strings(profile_json.get(key)))
+
+    links = []
+    for key, value in profile_json.items():
+        if key in PERSONAL_KEYS:
+            continue
+        for text in _strings(value):
+            for url in URL_RE.findall(text):
+                url = url.rstrip(".")
+                if url not in personal and url not in links:
+                    links.append(url)
+    return links
+
+
+def rule_based_enrich(profile_json):
+    """
+    Deterministic version of `enrich_profile_json`.
+
+    Returns:
+        tuple: (result in the same shape as the LLM output, confident flag)
+    """
+    profile_json = profile_json or {}
+    name, name_company, name_ok = clean_name(profile_json.get("name"))
+    companies, intro_ok = extract_companies(profile_json.get("intro"))
+    if name_company:
+        companies.insert(0, name_company)
+
+    deduped = []
+    for company in companies:
+        if company and company.lower() not in {c.lower() for c in deduped}:
+            deduped.append(company)
+    links = extract_links(profile_json)
+
+    result = {
+        "name": name,
+        "company_names": deduped or None,
+        "links": links or None,
+        "original_keys": profile_json,
+    }
+    return result, bool(name_ok and intro_ok)
+
+
+# --- Fixture replay ---
+def _norm_list(values):
+    return sorted({str(v).strip().lower().rstrip("/") for v in values or [] if v})
+
+
+def record_fixture(path, profile_json, llm_result):
+    """Appends one persona and the LLM's enrichment of it to a JSONL fixture file."""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"input": profile_json, "llm_output": llm_result, "source": "llm"},
+                           ensure_ascii=False) + "\n")
+
+
+def measure_rule_agreement(path):
+    """
+    Replays a fixture file through the rules and compares with the recorded LLM output.
+
+    Returns:
+        dict: counts plus per-field agreement over the personas the rules were confident on;
+        `recorded` and `recorded_all` count only fixtures with real LLM output
+    """
+    stats = {"total": 0, "confident": 0, "name": 0, "company_names": 0, "links": 0, "all": 0,
+             "recorded": 0, "recorded_all": 0}
+    disagreements = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            fixture = json.loads(line)
+            stats["total"] += 1
+            result, confident = rule_based_enrich(fixture["input"])
+            if not confident:
+                continue
+            stats["confident"] += 1
+            recorded = fixture.get("source", "llm") == "llm"
+            stats["recorded"] += recorded
+            expected = fixture["llm_output"] or {}
+            checks = {
+                "name": (result["name"] or "").lower() == (expected.get("name") or "").lower(),
+                "company_names": _norm_list(result["company_names"]) == _norm_list(expected.get("company_names")),
+                "links": _norm_list(result["links"]) == _norm_list(expected.get("links")),
+            }
+            for field, ok in checks.items():
+                stats[field] += ok
+            if all(checks.values()):
+                stats["all"] += 1
+                stats["recorded_all"] += recorded
+            else:
+                disagreements.append({"input": fixture["input"], "rules": result, "llm": expected})
+
+    stats["coverage"] = stats["confident"] / stats["total"] if stats["total"] else 0.0
+    stats["agreement"] = stats["all"] / stats["confident"] if stats["confident"] else 0.0
+    stats["disagreements"] = disagreements
+    return stats
+
+
+if __name__ == "__main__":
+    fixture_path = sys.argv[1] if len(sys.argv) > 1 else "agent/fixtures/enrich_fixtures.jsonl"
+    report = measure_rule_agreement(fixture_path)
+    for item in report.pop("disagreements"):
+        print(f"Disagreement on {item['input'].get('name')!r}: rules={item['rules']['name']!r} "
+              f"{item['rules']['company_names']} vs llm={item['llm'].get('name')!r} {item['llm'].get('company_names')}")
+    print(f"Rules confident on {report['confident']}/{report['total']} personas "
+          f"({report['coverage']:.0%}), full agreement with the fixture labels on {report['agreement']:.0%} of those.")
+    print(f"Field agreement: name {report['name']}, company_names {report['company_names']}, links {report['links']}")
+    hand = report["confident"] - report["recorded"]
+    if hand:
+        print(f"{hand} of those are hand-labelled, not LLM output; agreement with recorded LLM output: "
+              f"{report['recorded_all']}/{report['recorded']}.")
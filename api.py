@@ -1,16 +1,104 @@
-from flask import Flask, request, jsonify
-from pyngrok import ngrok
-from run import find_best_linkedin_match
+from flask import Flask, Response, request, jsonify, url_for, stream_with_context
+from jobqueue import JobQueue, QueueFull
+from run import find_best_linkedin_match, cached_match, iter_bulk_matches, warmup
+import deadline
+import memory
+import metrics
+import resilience
+import argparse
+import json
+import os
+import queue
+import time
 
 app = Flask(__name__)
 
+# Pipeline work never runs on the HTTP threads: requests only enqueue jobs
+job_queue = JobQueue(
+    workers=int(os.getenv("API_WORKERS", "4")),
+    max_pending=int(os.getenv("API_MAX_PENDING", "32")),
+    abandon_after=float(os.getenv("API_ABANDON_AFTER", "120")),
+)
+# How long the synchronous /persona endpoint waits before giving up on a job. It holds an
+# HTTP thread the whole time, so long batches of searches belong on /jobs
+PERSONA_TIMEOUT = float(os.getenv("API_PERSONA_TIMEOUT", "300"))
+# /persona jobs get a deadline this much shorter than PERSONA_TIMEOUT, so a partial
+# result comes back instead of a 504
+PERSONA_DEADLINE_MARGIN = float(os.getenv("API_PERSONA_DEADLINE_MARGIN", "5"))
+# Filled in by prefork.py when this process is one of several workers
+worker_info = {}
+# Largest number of personas accepted by one /personas call
+BULK_MAX_PERSONAS = int(os.getenv("API_BULK_MAX_PERSONAS", "500"))
+# Retry-After sent with 503 while RSS is over MEMORY_BUDGET_MB
+MEMORY_RETRY_AFTER = int(os.getenv("API_MEMORY_RETRY_AFTER", "30"))
+
+
+def profile_requested():
+    """True when the client asked for a profile of this request (`X-Profile: 1`)."""
+    return request.headers.get("X-Profile", "").lower() in ("1", "true", "yes") or None
+
+
+def cache_bypassed(data):
+    """True when the client asked for a fresh result (`Cache-Control: no-cache` or `"no_cache": true`)."""
+    return "no-cache" in request.headers.get("Cache-Control", "").lower() or bool(data.get("no_cache"))
+
+
+def requested_deadline(data):
+    """Per-request deadline in seconds from the body's optional `deadline` (None: PERSONA_DEADLINE)."""
+    try:
+        value = float(data.get("deadline"))
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def persona_deadline(data):
+    """Deadline for a /persona job: the requested or default one, but always inside PERSONA_TIMEOUT."""
+    limit = max(PERSONA_TIMEOUT - PERSONA_DEADLINE_MARGIN, deadline.MIN_TIMEOUT)
+    return min(requested_deadline(data) or deadline.DEFAULT_DEADLINE or limit, limit)
+
+
+def queue_full_response(error: QueueFull):
+    response = jsonify({"message": "Too many requests, job queue is full", "retry_after": error.retry_after})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
+def over_budget_response():
+    response = jsonify({"message": "Server is over its memory budget, try again later",
+                        "retry_after": MEMORY_RETRY_AFTER})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(MEMORY_RETRY_AFTER)
+    return response
+
+
 @app.route('/persona', methods=['POST'])
 def handle_persona():
-    data = request.get_json()
-    
+    """Blocking compatibility path: answers with the result, partial once PERSONA_TIMEOUT is near."""
+    data = request.get_json(silent=True)
+    persona = data.get("persona") if isinstance(data, dict) else None
+    if not isinstance(persona, dict):
+        return jsonify({"message": "Request body must contain a 'persona' object"}), 400
+    bypass_cache = cache_bypassed(data)
+    # Cached results are answered on the HTTP thread, without queueing
+    cached = None if bypass_cache or profile_requested() else cached_match(persona)
+    if cached is not None:
+        return jsonify({"message": "Status 200!", "Result": cached})
+    if not memory.budget.admit():
+        return over_budget_response()
+    try:
+        job = job_queue.submit(find_best_linkedin_match, persona, profile=profile_requested(),
+                               deadline=persona_deadline(data), bypass_cache=bypass_cache)
+    except QueueFull as e:
+        return queue_full_response(e)
+
+    if not job_queue.wait(job, PERSONA_TIMEOUT):
+        return jsonify({"message": f"Timed out after {PERSONA_TIMEOUT:.0f}s, job cancelled"}), 504
+    if job.status != "done":
+        return jsonify({"message": f"Job {job.status}", "error": job.error}), 500
 
-    persona = data.get("persona", {})
-    result = find_best_linkedin_match(persona)
+    result = job.result
     response = {
         "message": "Status 200!",
         "Result": result
@@ -18,9 +106,168 @@ def handle_persona():
 
     return jsonify(response)
 
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    data = request.get_json(silent=True)
+    persona = data.get("persona") if isinstance(data, dict) else None
+    if not isinstance(persona, dict):
+        return jsonify({"message": "Request body must contain a 'persona' object"}), 400
+    if not memory.budget.admit():
+        return over_budget_response()
+
+    try:
+        job = job_queue.submit(find_best_linkedin_match, persona, profile=profile_requested(),
+                               deadline=requested_deadline(data), bypass_cache=cache_bypassed(data))
+    except QueueFull as e:
+        return queue_full_response(e)
+
+    status_url = url_for("get_job", job_id=job.id)
+    response = jsonify({"job_id": job.id, "status": job.status, "status_url": status_url})
+    response.status_code = 202
+    response.headers["Location"] = status_url
+    return response
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"message": f"Unknown job {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({"message": f"Unknown job {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+
+def run_bulk(personas, cancel_event=None, sink=None):
+    """Job body for /personas; each result is also pushed to `sink` when streaming."""
+    results = []
+    for persona_id, result in iter_bulk_matches(personas, cancel_event=cancel_event):
+        item = {"persona_id": persona_id, "result": result}
+        results.append(item)
+        if sink is not None:
+            sink.put(item)
+    return results
+
+
+@app.route('/personas', methods=['POST'])
+def handle_personas():
+    data = request.get_json(silent=True) or {}
+    personas = data.get("personas")
+    if not isinstance(personas, list) or not all(isinstance(p, dict) for p in personas):
+        return jsonify({"message": "Request body must contain a 'personas' array of objects"}), 400
+    if len(personas) > BULK_MAX_PERSONAS:
+        return jsonify({"message": f"At most {BULK_MAX_PERSONAS} personas per request"}), 413
+
+    stream = request.args.get("stream") in ("1", "true") or \
+        "application/x-ndjson" in request.headers.get("Accept", "")
+    if not memory.budget.admit():
+        return over_budget_response()
+    sink = queue.Queue() if stream else None
+    try:
+        job = job_queue.submit(run_bulk, personas, sink=sink)
+    except QueueFull as e:
+        return queue_full_response(e)
+
+    if not stream:
+        status_url = url_for("get_job", job_id=job.id)
+        response = jsonify({"job_id": job.id, "status": job.status, "status_url": status_url})
+        response.status_code = 202
+        response.headers["Location"] = status_url
+        return response
+
+    def generate():
+        try:
+            while True:
+                # An open stream counts as polling, so the job is not abandoned
+                job.last_polled = time.time()
+                try:
+                    item = sink.get(timeout=1)
+                except queue.Empty:
+                    if job.finished and sink.empty():
+                        break
+                    continue
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+            if job.status != "done":
+                yield json.dumps({"error": job.error or f"Job {job.status}"}) + "\n"
+        except GeneratorExit:
+            # Client went away: stop the remaining work
+            job_queue.cancel(job.id)
+            raise
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Stage and upstream metrics of this process in the Prometheus text format."""
+    body = metrics.render_prometheus()
+    queue_lines = [
+        "# HELP job_queue_pending Jobs queued or running",
+        "# TYPE job_queue_pending gauge",
+        f"job_queue_pending {job_queue.pending_count()}",
+    ]
+    return Response(body + "\n".join(queue_lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/worker', methods=['GET'])
+def worker_stats():
+    """Memory and torch settings of the worker process that answered."""
+    from prefork import process_memory
+    return jsonify({**worker_info, "memory_mb": process_memory(), "pending_jobs": job_queue.pending_count(),
+                    "memory_budget_mb": memory.budget.limit / memory.MB or None,
+                    "circuit_breakers": resilience.status()})
+
+
+def serve(host: str, port: int, threads: int = 8, sock=None):
+    """
+    Serves the app with waitress when installed, else Flask's threaded server without debug.
+
+    `sock` is an already listening socket to serve from instead of binding host:port
+    (prefork.py's workers share the parent's socket).
+    """
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        print("waitress not installed, falling back to Flask's threaded server.")
+        if sock is None:
+            app.run(host=host, port=port, debug=False, threaded=True)
+        else:
+            from werkzeug.serving import make_server
+            make_server(host, port, app, threaded=True, fd=sock.fileno()).serve_forever()
+        return
+    print(f"Serving on http://{host}:{port} with waitress ({threads} threads)")
+    if sock is None:
+        waitress_serve(app, host=host, port=port, threads=threads)
+    else:
+        waitress_serve(app, sockets=[sock], threads=threads)
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Persona matching API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8, help="HTTP threads (waitress only)")
+    parser.add_argument("--ngrok", action="store_true", help="Expose the server through an ngrok tunnel")
+    parser.add_argument("--dev", action="store_true", help="Run Flask's debug server instead")
+    parser.add_argument("--no-warmup", action="store_true", help="Load models on the first request instead")
+    args = parser.parse_args()
+
+    if not args.no_warmup:
+        print(f"Models loaded: {warmup()}")
 
-    public_url = ngrok.connect(5000)
-    print(f"Public ngrok URL: {public_url}/persona")
+    if args.ngrok:
+        from pyngrok import ngrok
+        public_url = ngrok.connect(args.port)
+        print(f"Public ngrok URL: {public_url}/persona")
 
-    app.run(port=5000, debug=True)
+    if args.dev:
+        app.run(host=args.host, port=args.port, debug=True)
+    else:
+        serve(args.host, args.port, threads=args.threads)
@@ -0,0 +1,150 @@
+"""
+Offline benchmark of `find_best_linkedin_match` against a recorded archive.
+
+    python -m benchmarks.replay record --personas personas.jsonl --archive fixtures/bench
+    python -m benchmarks.bench --personas personas.jsonl --archive fixtures/bench --save baseline.json
+    python -m benchmarks.bench --personas personas.jsonl --archive fixtures/bench --baseline baseline.json
+
+Reports throughput, p50/p95/p99 per pipeline stage and upstream, and peak RSS.
+"""
+
+import argparse
+import json
+import resource
+import sys
+import time
+
+import metrics
+import result_cache
+import vector_index
+from benchmarks.replay import Latency, ReplaySession
+
+
+def _parse_fixed(values):
+    fixed = {}
+    for value in values or []:
+        upstream, _, seconds = value.partition("=")
+        fixed[upstream] = float(seconds)
+    return fixed
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def collect(registry):
+    """Per-series latency percentiles (seconds) from a sample-keeping registry."""
+    report = {}
+    for (name, labels), histogram in sorted(registry.histograms.items(), key=lambda item: item[0]):
+        if not name.endswith("_duration_seconds"):
+            continue
+        series = ",".join(f"{k}={v}" for k, v in labels) or name
+        report[series] = {
+            "count": histogram.count,
+            "p50": histogram.quantile(0.50),
+            "p95": histogram.quantile(0.95),
+            "p99": histogram.quantile(0.99),
+            "max": histogram.max,
+        }
+    return report
+
+
+def run_benchmark(personas_path, archive_path, concurrency=1, repeat=1, latency=None, warmup=True):
+    """
+    Replays the persona set `repeat` times and returns the benchmark report.
+
+    Models are loaded before the clock starts, so the numbers cover the
+    per-persona pipeline only.
+    """
+    import run
+    personas = list(run.iter_personas_jsonl(personas_path))
+
+    metrics.ENABLED = True
+    metrics.registry = metrics.Registry(keep_samples=True)
+    # Every repeat must run the pipeline, not answer from the persona result cache
+    result_cache.ENABLED = False
+    # ... or from profiles the vector index kept from an earlier repeat
+    vector_index.ENABLED = False
+    with ReplaySession(archive_path, mode="replay", latency=latency) as session:
+        if warmup:
+            run.warmup()
+            metrics.registry.reset()
+
+        failures = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            session.archive.rewind()
+            for persona_id, result in run.iter_best_matches(personas, concurrency=concurrency):
+                if "error" in result:
+                    failures += 1
+                    print(f"Persona {persona_id} failed: {result['error']}")
+        elapsed = time.perf_counter() - start
+
+    total = len(personas) * repeat
+    return {
+        "personas": total,
+        "failures": failures,
+        "replay_misses": session.misses,
+        "concurrency": concurrency,
+        "wall_seconds": elapsed,
+        "throughput_per_min": total / elapsed * 60 if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": collect(metrics.registry),
+    }
+
+
+def print_report(report, baseline=None):
+    print(f"\n{report['personas']} personas, concurrency {report['concurrency']}: "
+          f"{report['wall_seconds']:.1f}s, {report['throughput_per_min']:.1f} personas/min, "
+          f"peak RSS {report['peak_rss_mb']:.0f} MB, {report['failures']} failures, "
+          f"{report['replay_misses']} replay misses")
+    if baseline:
+        change = (report["throughput_per_min"] / baseline["throughput_per_min"] - 1) * 100 \
+            if baseline.get("throughput_per_min") else 0.0
+        print(f"Baseline: {baseline['throughput_per_min']:.1f} personas/min ({change:+.1f}%), "
+              f"peak RSS {baseline['peak_rss_mb']:.0f} MB")
+
+    print(f"\n{'series':<40} {'count':>6} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'max s':>8}"
+          + (f" {'p95 vs base':>12}" if baseline else ""))
+    for series, row in report["stages"].items():
+        line = (f"{series:<40} {row['count']:>6} {row['p50']:>8.3f} {row['p95']:>8.3f} "
+                f"{row['p99']:>8.3f} {row['max']:>8.3f}")
+        if baseline:
+            base = baseline.get("stages", {}).get(series)
+            line += f" {row['p95'] - base['p95']:>+11.3f}s" if base else f" {'new':>12}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded upstream responses and benchmark the pipeline.")
+    parser.add_argument("--personas", required=True, help="JSONL file with one persona per line")
+    parser.add_argument("--archive", required=True, help="Directory recorded with `benchmarks.replay record`")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the persona set this many times")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Multiplier on recorded upstream latency (0 = instant)")
+    parser.add_argument("--latency", action="append", metavar="UPSTREAM=SECONDS",
+                        help="Fixed latency for one upstream (google_cse, linkedin, image_cdn, tavily, azure_openai)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Relative latency jitter, e.g. 0.2")
+    parser.add_argument("--save", help="Write the report as JSON (e.g. a baseline)")
+    parser.add_argument("--baseline", help="Compare against a report saved with --save")
+    args = parser.parse_args(argv)
+
+    latency = Latency(scale=args.latency_scale, fixed=_parse_fixed(args.latency), jitter=args.jitter)
+    report = run_benchmark(args.personas, args.archive, concurrency=args.concurrency,
+                           repeat=args.repeat, latency=latency)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport saved to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
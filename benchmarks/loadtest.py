@@ -0,0 +1,211 @@
+"""
+Concurrent load generator for api.py.
+
+    python -m benchmarks.stubs --port 8790 --print-env      # then export the printed variables
+    python api.py --port 5000
+    python -m benchmarks.loadtest --url http://127.0.0.1:5000 --clients 16 --duration 120
+
+Each client posts personas to /persona (or submits them to /jobs and polls)
+in a loop and records latency and outcome. The report gives throughput,
+latency percentiles of successful requests and a breakdown of failures.
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import Counter
+
+import requests
+
+
+def synthetic_personas(count, stub_url=None):
+    """Personas whose names the stub search returns as the first candidate."""
+    first = ["Eric", "Priya", "Jonas", "Maria", "Wei", "Amara", "Luca", "Sofia", "Ravi", "Hannah"]
+    last = ["Doty", "Sharma", "Berg", "Lopez", "Chen", "Okafor", "Rossi", "Novak", "Iyer", "Schmidt"]
+    personas = []
+    for i in range(count):
+        name = f"{first[i % len(first)]} {last[(i // len(first)) % len(last)]}"
+        slug = name.lower().replace(" ", "-")
+        personas.append({
+            "id": f"load-{i}",
+            "name": name,
+            "image": f"{stub_url}/img/{slug}.png" if stub_url else None,
+            "intro": "Content @ Dock",
+            "timezone": "America/Los_Angeles",
+            "company_industry": None,
+            "company_size": None,
+            "social_profile": None,
+        })
+    return personas
+
+
+def load_personas(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoadTest:
+    """
+    Drives the API with `clients` concurrent clients.
+
+    Args:
+        url: Base URL of api.py
+        personas: Personas to send, round robin
+        clients: Number of concurrent clients
+        mode: "persona" (synchronous endpoint) or "jobs" (submit and poll)
+        timeout: Per-request timeout in seconds
+        respect_retry_after: On 429, wait Retry-After before the next request
+    """
+
+    def __init__(self, url, personas, clients=8, mode="persona", timeout=600, respect_retry_after=True,
+                 poll_interval=1.0):
+        self.url = url.rstrip("/")
+        self.personas = personas
+        self.clients = clients
+        self.mode = mode
+        self.timeout = timeout
+        self.respect_retry_after = respect_retry_after
+        self.poll_interval = poll_interval
+        self.latencies = []
+        self.outcomes = Counter()
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _take(self):
+        with self._lock:
+            persona = self.personas[self._next % len(self.personas)]
+            self._next += 1
+            return persona
+
+    def _record(self, outcome, latency=None):
+        with self._lock:
+            self.outcomes[outcome] += 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def _one(self, session, persona):
+        """Runs one request; returns (outcome, seconds to wait before the next one)."""
+        if self.mode == "persona":
+            response = session.post(f"{self.url}/persona", json={"persona": persona}, timeout=self.timeout)
+            if response.status_code == 200:
+                return "ok", 0
+            return f"http_{response.status_code}", self._retry_after(response)
+
+        response = session.post(f"{self.url}/jobs", json={"persona": persona}, timeout=self.timeout)
+        if response.status_code != 202:
+            return f"http_{response.status_code}", self._retry_after(response)
+        status_url = self.url + response.json()["status_url"]
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            job = session.get(status_url, timeout=self.timeout).json()
+            if job.get("status") == "done":
+                return "ok", 0
+            if job.get("status") in ("failed", "cancelled"):
+                return f"job_{job['status']}", 0
+        return "job_timeout", 0
+
+    def _retry_after(self, response):
+        if response.status_code != 429 or not self.respect_retry_after:
+            return 0
+        try:
+            return float(response.headers.get("Retry-After", 1))
+        except ValueError:
+            return 1.0
+
+    def _client(self, stop_at, remaining):
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            if remaining is not None:
+                with self._lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                outcome, wait = self._one(session, self._take())
+            except requests.exceptions.RequestException as e:
+                outcome, wait = type(e).__name__, 0
+            elapsed = time.perf_counter() - start
+            self._record(outcome, elapsed if outcome == "ok" else None)
+            if wait:
+                time.sleep(min(wait, max(0.0, stop_at - time.monotonic())))
+
+    def run(self, duration=60.0, total_requests=None):
+        remaining = [total_requests] if total_requests else None
+        stop_at = time.monotonic() + (duration if not total_requests else 10 ** 9)
+        threads = [threading.Thread(target=self._client, args=(stop_at, remaining), daemon=True)
+                   for _ in range(self.clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.report(time.perf_counter() - start)
+
+    def report(self, elapsed):
+        total = sum(self.outcomes.values())
+        ok = self.outcomes.get("ok", 0)
+        return {
+            "clients": self.clients,
+            "mode": self.mode,
+            "elapsed_seconds": elapsed,
+            "requests": total,
+            "succeeded": ok,
+            "throughput_per_sec": ok / elapsed if elapsed else 0.0,
+            "latency": {
+                "p50": percentile(self.latencies, 0.50),
+                "p95": percentile(self.latencies, 0.95),
+                "p99": percentile(self.latencies, 0.99),
+                "max": max(self.latencies, default=0.0),
+            },
+            "errors": {k: v for k, v in sorted(self.outcomes.items()) if k != "ok"},
+        }
+
+
+def print_report(report):
+    latency = report["latency"]
+    print(f"\n{report['clients']} clients ({report['mode']}), {report['elapsed_seconds']:.1f}s: "
+          f"{report['requests']} requests, {report['succeeded']} succeeded, "
+          f"{report['throughput_per_sec']:.2f} req/s")
+    print(f"Latency of successful requests: p50 {latency['p50']:.2f}s  p95 {latency['p95']:.2f}s  "
+          f"p99 {latency['p99']:.2f}s  max {latency['max']:.2f}s")
+    if report["errors"]:
+        print("Errors: " + ", ".join(f"{kind} x{count}" for kind, count in report["errors"].items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test api.py with concurrent clients.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="Base URL of api.py")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to run (ignored with --requests)")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests instead")
+    parser.add_argument("--mode", choices=["persona", "jobs"], default="persona")
+    parser.add_argument("--personas", help="JSONL personas to send (default: synthetic ones)")
+    parser.add_argument("--synthetic", type=int, default=50, help="Number of synthetic personas")
+    parser.add_argument("--stub-url", default="http://127.0.0.1:8790", help="Stub server for persona images")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--ignore-retry-after", action="store_true", help="Do not back off on 429")
+    parser.add_argument("--save", help="Write the report as JSON")
+    args = parser.parse_args(argv)
+
+    personas = load_personas(args.personas) if args.personas else synthetic_personas(args.synthetic, args.stub_url)
+    test = LoadTest(args.url, personas, clients=args.clients, mode=args.mode, timeout=args.timeout,
+                    respect_retry_after=not args.ignore_retry_after)
+    report = test.run(duration=args.duration, total_requests=args.requests)
+    print_report(report)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
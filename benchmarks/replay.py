@@ -0,0 +1,299 @@
+"""
+Record/replay layer for every upstream the pipeline talks to.
+
+In record mode the real HTTP calls (Google CSE, LinkedIn through the proxy,
+image CDNs), Azure OpenAI calls and Tavily searches go through, and each
+response is appended to `<archive>/responses.jsonl` together with how long it
+took. In replay mode the same calls are answered from the archive, after a
+synthetic delay, and nothing leaves the machine.
+
+    python -m benchmarks.replay record --personas personas.jsonl --archive fixtures/bench
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import types
+from collections import defaultdict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Query parameters that are secrets or differ between otherwise identical calls
+_IGNORED_PARAMS = {"key", "api_key"}
+# Module globals holding `time` for politeness delays (3 s between scrapes, retry backoff)
+_DELAY_MODULES = ("scrappers.combine", "scrappers.search", "scrappers.scrape", "resilience")
+
+_real_sleep = time.sleep
+
+
+class ReplayMiss(Exception):
+    """A call was made in replay mode that is not in the archive."""
+
+
+def canonical_url(url):
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in _IGNORED_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+
+
+def upstream_of(url):
+    """Coarse upstream name used for latency settings and reports."""
+    host = urlsplit(url).netloc.lower()
+    if "googleapis.com" in host:
+        return "google_cse"
+    if "linkedin.com" in host:
+        return "linkedin"
+    return "image_cdn"
+
+
+class Archive:
+    """Recorded responses keyed by (kind, request key); repeated calls replay in recorded order."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = os.path.join(path, "responses.jsonl")
+        self.entries = defaultdict(list)
+        self._cursor = defaultdict(int)
+        self._lock = threading.Lock()
+        if os.path.exists(self.file):
+            with open(self.file, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[(entry["kind"], entry["key"])].append(entry)
+
+    def add(self, entry):
+        with self._lock:
+            self.entries[(entry["kind"], entry["key"])].append(entry)
+            os.makedirs(self.path, exist_ok=True)
+            with open(self.file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def next(self, kind, key):
+        with self._lock:
+            entries = self.entries.get((kind, key))
+            if not entries:
+                raise ReplayMiss(f"No recorded {kind} response for {key}")
+            index = self._cursor[(kind, key)]
+            self._cursor[(kind, key)] = index + 1
+            return entries[min(index, len(entries) - 1)]
+
+    def rewind(self):
+        with self._lock:
+            self._cursor.clear()
+
+    def __len__(self):
+        return sum(len(v) for v in self.entries.values())
+
+
+class Latency:
+    """
+    Synthetic delay for replayed calls.
+
+    Args:
+        scale: Multiplier applied to the recorded duration (0 = no delay)
+        fixed: upstream -> seconds, used instead of the recorded duration
+        jitter: Relative random jitter (0.2 = +/-20%)
+    """
+
+    def __init__(self, scale=1.0, fixed=None, jitter=0.0, seed=0):
+        self.scale = scale
+        self.fixed = fixed or {}
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def wait(self, upstream, recorded):
+        delay = self.fixed.get(upstream, recorded * self.scale)
+        if self.jitter:
+            with self._lock:
+                delay *= 1 + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            _real_sleep(delay)
+
+
+class _RecordedMessage:
+    """Stand-in for the LangChain AIMessage the pipeline reads `.content` from."""
+
+    def __init__(self, content, usage_metadata=None):
+        self.content = content
+        self.usage_metadata = usage_metadata or {}
+        self.response_metadata = {}
+
+
+class _LLMProxy:
+    def __init__(self, session, real=None):
+        self.session = session
+        self.real = real
+
+    def invoke(self, messages, **kwargs):
+        key = _digest(messages)
+        if self.session.mode == "record":
+            start = time.perf_counter()
+            response = self.real.invoke(messages, **kwargs)
+            self.session.archive.add({
+                "kind": "llm", "key": key, "elapsed": time.perf_counter() - start,
+                "content": response.content,
+                "usage": dict(getattr(response, "usage_metadata", None) or {}),
+            })
+            return response
+        entry = self.session.lookup("llm", key)
+        self.session.latency.wait("azure_openai", entry["elapsed"])
+        return _RecordedMessage(entry["content"], entry.get("usage"))
+
+
+class _TavilyProxy:
+    def __init__(self, session, real=None):
+        self.session = session
+        self.real = real
+
+    def run(self, query, **kwargs):
+        key = _digest([query, kwargs])
+        if self.session.mode == "record":
+            start = time.perf_counter()
+            results = self.real.run(query, **kwargs)
+            self.session.archive.add({"kind": "tavily", "key": key, "elapsed": time.perf_counter() - start,
+                                      "results": results})
+            return results
+        entry = self.session.lookup("tavily", key)
+        self.session.latency.wait("tavily", entry["elapsed"])
+        return entry["results"]
+
+
+class ReplaySession:
+    """
+    Patches the upstream seams for the duration of a `with` block.
+
+    Args:
+        archive: Directory holding responses.jsonl
+        mode: "record" or "replay"
+        latency: Latency used when replaying
+        skip_delays: Skip the pipeline's politeness sleeps and retry backoff
+    """
+
+    def __init__(self, archive, mode="replay", latency=None, skip_delays=True):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown mode {mode!r}")
+        self.archive = archive if isinstance(archive, Archive) else Archive(archive)
+        self.mode = mode
+        self.latency = latency or Latency()
+        self.skip_delays = skip_delays
+        self.misses = 0
+        self._saved = []
+
+    def lookup(self, kind, key):
+        try:
+            return self.archive.next(kind, key)
+        except ReplayMiss:
+            self.misses += 1
+            raise
+
+    # --- requests ---
+    def _request(self, original):
+        session = self
+
+        def request(http_session, method, url, **kwargs):
+            body = kwargs.get("data") or kwargs.get("json")
+            key = _digest([method.upper(), canonical_url(url), body])
+            upstream = upstream_of(url)
+            if session.mode == "record":
+                start = time.perf_counter()
+                try:
+                    response = original(http_session, method, url, **kwargs)
+                except requests.exceptions.RequestException as e:
+                    session.archive.add({"kind": "http", "key": key, "url": canonical_url(url),
+                                         "elapsed": time.perf_counter() - start, "error": type(e).__name__})
+                    raise
+                session.archive.add({
+                    "kind": "http", "key": key, "url": canonical_url(url),
+                    "elapsed": time.perf_counter() - start,
+                    "status": response.status_code, "reason": response.reason,
+                    "headers": {k: v for k, v in response.headers.items() if k.lower() == "content-type"},
+                    "encoding": response.encoding,
+                    "body": base64.b64encode(response.content).decode("ascii"),
+                })
+                return response
+
+            try:
+                entry = session.lookup("http", key)
+            except ReplayMiss:
+                raise requests.exceptions.ConnectionError(f"Not in replay archive: {method} {canonical_url(url)}")
+            session.latency.wait(upstream, entry["elapsed"])
+            if entry.get("error"):
+                raise getattr(requests.exceptions, entry["error"], requests.exceptions.RequestException)(
+                    f"Recorded {entry['error']} for {url}")
+            response = requests.models.Response()
+            response.status_code = entry["status"]
+            response.reason = entry.get("reason")
+            response.headers = CaseInsensitiveDict(entry.get("headers") or {})
+            response.encoding = entry.get("encoding")
+            response._content = base64.b64decode(entry["body"])
+            response.url = url
+            return response
+
+        return request
+
+    def _patch(self, owner, name, value):
+        self._saved.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, value)
+
+    def __enter__(self):
+        import importlib
+        from agent import models, preprocess
+
+        self._patch(requests.Session, "request", self._request(requests.Session.request))
+        real_llm = models.get_llm() if self.mode == "record" else None
+        real_tavily = preprocess.get_tavily() if self.mode == "record" else None
+        self._patch(models, "_llm", _LLMProxy(self, real_llm))
+        self._patch(preprocess, "_tavily", _TavilyProxy(self, real_tavily))
+        if self.mode == "replay":
+            # Geocoding is not archived; unknown locations stay unresolved instead of going online
+            from scrappers.geocache import get_resolver
+            self._patch(get_resolver(), "use_network", False)
+
+        if self.skip_delays:
+            no_sleep = types.SimpleNamespace(**{k: getattr(time, k) for k in dir(time) if not k.startswith("_")})
+            no_sleep.sleep = lambda seconds: None
+            for module_name in _DELAY_MODULES:
+                self._patch(importlib.import_module(module_name), "time", no_sleep)
+        return self
+
+    def __exit__(self, *exc):
+        while self._saved:
+            owner, name, value = self._saved.pop()
+            setattr(owner, name, value)
+        return False
+
+
+def record(personas_path, archive_path, workers=1):
+    """Runs the real pipeline over a persona file and archives every upstream response."""
+    import result_cache
+    import vector_index
+    from run import iter_personas_jsonl, iter_best_matches
+    result_cache.ENABLED = False  # a cached persona would make no upstream calls to record
+    vector_index.ENABLED = False  # nor would one matched from previously scraped profiles
+    with ReplaySession(archive_path, mode="record", skip_delays=False) as session:
+        for persona_id, result in iter_best_matches(iter_personas_jsonl(personas_path), concurrency=workers):
+            print(f"Recorded persona {persona_id}: {result.get('linkedin_url') or result.get('error')}")
+    print(f"Archive {archive_path} now holds {len(session.archive)} responses.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record upstream responses for offline benchmarks.")
+    parser.add_argument("mode", choices=["record"])
+    parser.add_argument("--personas", required=True, help="JSONL file with one persona per line")
+    parser.add_argument("--archive", required=True, help="Directory to write responses.jsonl to")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    record(args.personas, args.archive, workers=args.workers)
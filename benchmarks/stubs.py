@@ -0,0 +1,319 @@
+"""
+Local stand-ins for every upstream, for load tests that must not spend quota.
+
+One HTTP server answers:
+- GET  /customsearch/v1          Google Custom Search JSON API
+- POST /search                   Tavily search API
+- POST /openai/deployments/<d>/chat/completions   Azure OpenAI chat completions
+- GET  /in/<slug>                public LinkedIn profile pages
+- GET  /img/<name>.png           profile images
+
+Each upstream gets its own latency and error rate:
+
+    python -m benchmarks.stubs --port 8790 --latency linkedin=1.5 --error-rate linkedin=0.05 --print-env
+
+`--print-env` prints the variables that point the pipeline (and api.py) at the stubs.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+UPSTREAMS = ("google", "tavily", "azure", "linkedin", "image")
+
+# Error status returned by each upstream when a failure is injected
+ERROR_STATUS = {"google": 429, "tavily": 500, "azure": 429, "linkedin": 429, "image": 503}
+
+_COMPANIES = ["Dock", "Superpath", "Acme", "Globex", "Initech", "Hooli", "Umbrella", "Stark Industries"]
+_ROLES = ["Content Lead", "Software Engineer", "Product Manager", "Head of Growth", "Data Scientist"]
+_LOCATIONS = ["San Francisco, California, United States", "London, England, United Kingdom",
+              "Bengaluru, Karnataka, India", "New York, New York, United States"]
+
+
+class StubConfig:
+    """Latency (mean seconds, +/- jitter) and error rate per upstream, plus candidates per search."""
+
+    def __init__(self, latency=None, error_rate=None, jitter=0.25, candidates=3, seed=0):
+        self.latency = {name: 0.0 for name in UPSTREAMS}
+        self.latency.update(latency or {})
+        self.error_rate = {name: 0.0 for name in UPSTREAMS}
+        self.error_rate.update(error_rate or {})
+        self.jitter = jitter
+        self.candidates = candidates
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = {name: 0 for name in UPSTREAMS}
+        self.errors = {name: 0 for name in UPSTREAMS}
+
+    def delay_and_fail(self, upstream):
+        """Sleeps for the upstream's latency; True when this call should fail."""
+        with self._lock:
+            self.requests[upstream] += 1
+            jitter = self._random.uniform(-self.jitter, self.jitter)
+            fail = self._random.random() < self.error_rate[upstream]
+            if fail:
+                self.errors[upstream] += 1
+        delay = self.latency[upstream] * (1 + jitter)
+        if delay > 0:
+            time.sleep(delay)
+        return fail
+
+
+# --- Fake people ---
+def _seed(text):
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def _slugify(name):
+    return "-".join(re.findall(r"[a-z0-9]+", name.lower())) or "someone"
+
+
+def candidates_for(name, count):
+    """Deterministic candidate profiles for a searched name: the person first, then look-alikes."""
+    slug = _slugify(name)
+    results = [slug, f"{slug}-{_seed(slug) % 0xfffff:05x}"]
+    first = slug.split("-")[0]
+    results += [f"{first}-{other}" for other in ("smith", "kumar", "garcia", "chen", "mueller")]
+    return results[:count]
+
+
+def person_for(slug):
+    seed = _seed(slug)
+    tokens = [t for t in slug.split("-") if not (re.search(r"\d", t) and len(t) >= 4)]
+    return {
+        "name": " ".join(t.capitalize() for t in tokens),
+        "company": _COMPANIES[seed % len(_COMPANIES)],
+        "role": _ROLES[(seed >> 3) % len(_ROLES)],
+        "location": _LOCATIONS[(seed >> 6) % len(_LOCATIONS)],
+    }
+
+
+def profile_html(slug, base_url):
+    person = person_for(slug)
+    return f"""<!DOCTYPE html>
+<html><head><title>{person['name']} | LinkedIn</title>
+<link rel="canonical" href="https://www.linkedin.com/in/{slug}"></head>
+<body>
+<h1 class="top-card-layout__title">{person['name']}</h1>
+<h2 class="top-card-layout__headline">{person['role']} at {person['company']}</h2>
+<img alt="{person['name']}" src="{base_url}/img/{slug}.png">
+<section class="summary"><p>{person['role']} at {person['company']}. I write about teams, tools and
+growth, and help {person['company']} customers get the most out of the product.</p></section>
+<section data-section="experience"><ul>
+<li class="experience-item"><h3 class="result-card__title">{person['role']}</h3>
+<h4 class="result-card__subtitle">{person['company']} · Full-time</h4>
+<span class="date-range">2021 - Present</span>
+<span class="location">{person['location']}</span></li>
+</ul></section>
+</body></html>"""
+
+
+def png_bytes(name, size=64):
+    """A small RGB gradient PNG whose colours depend on `name`."""
+    seed = _seed(name)
+    r, g, b = seed & 0xFF, (seed >> 8) & 0xFF, (seed >> 16) & 0xFF
+    rows = b"".join(b"\x00" + bytes(c for x in range(size) for c in ((r + x) % 256, (g + y) % 256, b))
+                    for y in range(size))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+def _searched_name(query):
+    """Name part of a pipeline query ('Eric Doty "Dock" site:linkedin.com/in/', 'LinkedIn profile of Eric Doty at Dock')."""
+    query = re.sub(r'"[^"]*"|site:\S+', " ", query)
+    query = re.sub(r"(?i)^linkedin profile of\s+", "", query.strip())
+    query = re.split(r"(?i)\s+(at|based on)\s+", query)[0]
+    return " ".join(query.split()[:3])
+
+
+# --- Chat completions ---
+def chat_reply(messages):
+    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+    if "data extractor" in prompt:
+        match = re.search(r"'name': '([^']*)'", prompt)
+        name = re.sub(r"\s*\(.*?\)", "", match.group(1)) if match else "Unknown"
+        return json.dumps({"name": name, "company_names": None, "links": None, "original_keys": {}})
+    score = (_seed(prompt) % 100) / 100
+    return json.dumps({"score": score, "reason": "Stub validation response."})
+
+
+def chat_completion(body, deployment):
+    content = chat_reply(body.get("messages") or [])
+    prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages") or []) // 4
+    return {
+        "id": f"chatcmpl-stub-{_seed(content):08x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": deployment,
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                  "total_tokens": prompt_tokens + len(content) // 4},
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    config: StubConfig = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _base_url(self):
+        return f"http://{self.headers.get('Host') or '%s:%d' % self.server.server_address}"
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw or b"{}")
+        except json.JSONDecodeError:
+            return {}
+
+    def _fail(self, upstream):
+        if self.config.delay_and_fail(upstream):
+            self._send(ERROR_STATUS[upstream], {"error": {"message": f"Injected {upstream} failure"}})
+            return True
+        return False
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path.rstrip("/").endswith("/customsearch/v1"):
+            if self._fail("google"):
+                return
+            query = parse_qs(parts.query).get("q", [""])[0]
+            name = _searched_name(query)
+            items = []
+            for slug in candidates_for(name, self.config.candidates):
+                person = person_for(slug)
+                items.append({"link": f"https://www.linkedin.com/in/{slug}",
+                              "title": f"{person['name']} - {person['role']} - {person['company']} | LinkedIn"})
+            self._send(200, {"items": items, "queries": {}})
+        elif parts.path.startswith("/in/"):
+            if self._fail("linkedin"):
+                return
+            slug = parts.path[len("/in/"):].strip("/") or "someone"
+            self._send(200, profile_html(slug, self._base_url()), "text/html; charset=utf-8")
+        elif parts.path.startswith("/img/"):
+            if self._fail("image"):
+                return
+            self._send(200, png_bytes(parts.path), "image/png")
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        parts = urlsplit(self.path)
+        body = self._body()
+        if parts.path.rstrip("/").endswith("/search"):
+            if self._fail("tavily"):
+                return
+            name = _searched_name(body.get("query", ""))
+            results = []
+            for slug in candidates_for(name, min(self.config.candidates, body.get("max_results") or 5)):
+                person = person_for(slug)
+                results.append({"title": f"{person['name']} - {person['company']} | LinkedIn",
+                                "url": f"https://www.linkedin.com/in/{slug}",
+                                "content": f"{person['role']} at {person['company']}", "score": 0.9})
+            self._send(200, {"query": body.get("query"), "results": results, "images": [],
+                             "answer": None, "response_time": 0.1})
+        elif "/chat/completions" in parts.path:
+            if self._fail("azure"):
+                return
+            match = re.search(r"/deployments/([^/]+)/", parts.path)
+            self._send(200, chat_completion(body, match.group(1) if match else "stub"))
+        else:
+            self._send(404, {"error": "not found"})
+
+
+def stub_env(base_url):
+    """Environment that points the pipeline at the stub server."""
+    return {
+        "GOOGLE_CSE_BASE_URL": f"{base_url}/customsearch/v1",
+        "GOOGLE_SEARCH_API_KEY": "stub",
+        "GOOGLE_SEARCH_ENGINE_ID": "stub",
+        "TAVILY_API_URL": base_url,
+        "TAVILY_API_KEY": "tvly-stub",
+        "AZURE_OPENAI_ENDPOINT": base_url,
+        "AZURE_OPENAI_API_KEY": "stub",
+        "AZURE_OPENAI_DEPLOYMENT_NAME": "stub",
+        "AZURE_OPENAI_API_VERSION": "2024-02-01",
+        "LINKEDIN_BASE_URL": base_url,
+        "GEOCACHE_PATH": ".cache/geocache-loadtest.sqlite",
+        # Load tests resend the same personas; measure the pipeline, not the result cache
+        "RESULT_CACHE": "0",
+        "VECTOR_INDEX": "0",
+    }
+
+
+def start_stub_server(host="127.0.0.1", port=8790, config=None):
+    """Starts the stubs on a background thread and returns the server."""
+    handler = type("Handler", (StubHandler,), {"config": config or StubConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _parse_pairs(values, cast=float):
+    pairs = {}
+    for value in values or []:
+        name, _, amount = value.partition("=")
+        if name not in UPSTREAMS:
+            raise SystemExit(f"Unknown upstream {name!r}, expected one of {', '.join(UPSTREAMS)}")
+        pairs[name] = cast(amount)
+    return pairs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-ins for Google CSE, Tavily, Azure OpenAI and LinkedIn.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--latency", action="append", metavar="UPSTREAM=SECONDS",
+                        help=f"Mean latency per upstream ({', '.join(UPSTREAMS)})")
+    parser.add_argument("--error-rate", action="append", metavar="UPSTREAM=FRACTION")
+    parser.add_argument("--jitter", type=float, default=0.25, help="Relative latency jitter")
+    parser.add_argument("--candidates", type=int, default=3, help="Profiles returned per search")
+    parser.add_argument("--print-env", action="store_true", help="Print the env vars that point api.py here")
+    args = parser.parse_args(argv)
+
+    config = StubConfig(latency=_parse_pairs(args.latency), error_rate=_parse_pairs(args.error_rate),
+                        jitter=args.jitter, candidates=args.candidates)
+    server = start_stub_server(args.host, args.port, config)
+    base_url = f"http://{args.host}:{server.server_address[1]}"
+    print(f"Stub upstreams listening on {base_url}")
+    if args.print_env:
+        for key, value in stub_env(base_url).items():
+            print(f"export {key}={value}")
+    try:
+        while True:
+            time.sleep(30)
+            print(f"requests {config.requests} injected errors {config.errors}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,86 @@
 import numpy as np
 import os
-from sklearn.metrics.pairwise import cosine_similarity
 from PIL import Image, UnidentifiedImageError
 import requests
 from io import BytesIO
 import json
-import spacy
 import re
-import numpy as np
-from torchvision import models, transforms
-import torch
-import torch.nn as nn
-import json
-from sentence_transformers import SentenceTransformer
-from langchain_openai import AzureChatOpenAI  # Add this import
+import threading
+from typing import TYPE_CHECKING
+from confidenceScore.prompt_serializer import serialize_profiles_for_prompt, count_tokens
+from confidenceScore.structured import structured_similarity
+from metrics import stage, upstream, llm_usage
+import deadline
+import resilience
+from deadline import DeadlineExceeded
+from resilience import CircuitOpen, guarded
+
+# torch, torchvision, spaCy, sentence-transformers and scikit-learn are imported
+# on first use (or by warmup()) so importing this module stays fast.
+if TYPE_CHECKING:
+    from langchain_openai import AzureChatOpenAI
+
+_nlp = None
+_model_lock = threading.Lock()
+
+def get_nlp():
+    """Loads the spaCy pipeline on first use."""
+    global _nlp
+    if _nlp is None:
+        with _model_lock:
+            if _nlp is None:
+                import spacy
+                _nlp = spacy.load("en_core_web_sm")
+    return _nlp
+
+def cosine_similarity(X, Y):
+    from sklearn.metrics.pairwise import cosine_similarity as sk_cosine_similarity
+    return sk_cosine_similarity(X, Y)
 
-nlp = spacy.load("en_core_web_sm")
 # ----------------- IMAGE SIMILARITY -----------------
 
-import requests
-from PIL import Image, UnidentifiedImageError
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 
 class VGG16ImageComparer:
     def __init__(self):
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        vgg = models.vgg16(weights=models.VGG16_Weights.DEFAULT)
-        self.model = nn.Sequential(*list(vgg.features.children()))
-        self.model.to(self.device)
-        self.model.eval()
-        self.transform = transforms.Compose([
-            transforms.Resize(256),
-            transforms.CenterCrop(224),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-        ])
+        # VGG16 weights are loaded by load(), on the first feature extraction
+        self.device = None
+        self.model = None
+        self.transform = None
+        self._load_lock = threading.Lock()
         self.cache = {}
+        self.features = {}  # URL -> feature vector, filled by similarity() and precompute_features()
+
+    def evict(self):
+        """Drops downloaded images and cached features; returns how many entries were dropped."""
+        dropped = len(self.cache) + len(self.features)
+        self.cache = {}
+        self.features = {}
+        return dropped
+
+    def load(self):
+        """Loads VGG16 (downloading the weights the first time). Safe to call repeatedly."""
+        if self.model is not None:
+            return self
+        with self._load_lock:
+            if self.model is not None:
+                return self
+            import torch
+            import torch.nn as nn
+            from torchvision import models, transforms
+            self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            vgg = models.vgg16(weights=models.VGG16_Weights.DEFAULT)
+            model = nn.Sequential(*list(vgg.features.children()))
+            model.to(self.device)
+            model.eval()
+            self.transform = transforms.Compose([
+                transforms.Resize(256),
+                transforms.CenterCrop(224),
+                transforms.ToTensor(),
+                transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+            ])
+            self.model = model
+        return self
 
     import os
 
@@ -60,8 +105,11 @@ class VGG16ImageComparer:
                     file_id = url.split('/d/')[1].split('/')[0]
                     url = f'https://drive.google.com/uc?id={file_id}'
 
-                response = requests.get(url, headers=headers, timeout=20, stream=True)
-                response.raise_for_status()
+                with guarded("image_cdn"), upstream("image_cdn") as call:
+                    response = requests.get(url, headers=headers, timeout=deadline.timeout(20, "image download"),
+                                            stream=True)
+                    response.raise_for_status()
+                    call.bytes = len(response.content)
 
                 image_data = BytesIO(response.content)
                 img = Image.open(image_data).convert('RGB')
@@ -80,7 +128,15 @@ class VGG16ImageComparer:
                 self.cache[url] = img
                 return img
 
+            except DeadlineExceeded:
+                raise
+            except CircuitOpen as e:
+                # Not the image's fault either: skip it without caching the miss
+                print(f"Skipping image download: {e}")
+                return None
             except requests.exceptions.RequestException as req_error:
+                # A timeout cut short by the request deadline says nothing about the image: do not cache it
+                deadline.check("image download")
                 print(f"Request error: {str(req_error)}")
             except UnidentifiedImageError as img_error:
                 print(f"Unrecognized image: {str(img_error)}")
@@ -95,9 +151,11 @@ class VGG16ImageComparer:
     def get_features(self, img):
         if img is None: 
             return None
+        import torch
+        self.load()
         try:
             img_t = self.transform(img).unsqueeze(0).to(self.device)
-            with torch.no_grad():
+            with stage("vgg16"), torch.inference_mode():
                 features = self.model(img_t)
                 features = torch.nn.functional.adaptive_avg_pool2d(features, (1, 1)).squeeze()
             return features.cpu().numpy()
@@ -105,6 +163,46 @@ class VGG16ImageComparer:
             print(f"Feature extraction error: {str(e)[:200]}")
             return None
 
+    def precompute_features(self, urls, batch_size=16, download_workers=8):
+        """
+        Download images concurrently and run them through VGG16 in shared batches.
+        Results land in `self.features`, which `similarity` checks first.
+        """
+        urls = [u for u in dict.fromkeys(urls) if u and isinstance(u, str) and u not in self.features]
+        if not urls:
+            return
+        with ThreadPoolExecutor(max_workers=download_workers) as pool:
+            images = list(pool.map(lambda u: self.download_image(u, save_as=f"batch_{abs(hash(u))}"), urls))
+
+        loaded = [(url, img) for url, img in zip(urls, images) if img is not None]
+        import torch
+        self.load()
+        for start in range(0, len(loaded), batch_size):
+            chunk = loaded[start:start + batch_size]
+            try:
+                batch = torch.stack([self.transform(img) for _, img in chunk]).to(self.device)
+                with stage("vgg16", batch="true"), torch.inference_mode():
+                    features = self.model(batch)
+                    features = torch.nn.functional.adaptive_avg_pool2d(features, (1, 1)).flatten(1)
+                for (url, _), feature in zip(chunk, features.cpu().numpy()):
+                    self.features[url] = feature
+            except Exception as e:
+                print(f"Batch feature extraction error: {str(e)[:200]}")
+        print(f"Precomputed image features for {len(loaded)}/{len(urls)} images.")
+
+    def features_for(self, url, save_as="img"):
+        """VGG16 features of the image at `url` (cached), or None when it cannot be loaded."""
+        if url in self.features:
+            return self.features[url]
+        # Download and load image as PIL.Image
+        img = self.download_image(url, save_as=save_as)
+        if img is None:
+            return None
+        features = self.get_features(img)
+        if features is not None:
+            self.features[url] = features
+        return features
+
     def similarity(self, url1, url2):
         if not url1 or not url2:
             return 0.0
@@ -112,15 +210,8 @@ class VGG16ImageComparer:
         if url1 == url2:
             return 1.0
 
-        # Download and load images as PIL.Image
-        img1 = self.download_image(url1, save_as="img1")
-        img2 = self.download_image(url2, save_as="img2")
-
-        if img1 is None or img2 is None:
-            return 0.0
-
-        f1 = self.get_features(img1)
-        f2 = self.get_features(img2)
+        f1 = self.features_for(url1, save_as="img1")
+        f2 = self.features_for(url2, save_as="img2")
 
         if f1 is None or f2 is None:
             return 0.0
@@ -157,8 +248,18 @@ def persona_similarity(profile1, profile2, embedder):
 # ----------------- LLM VALIDATION -----------------
 
 
-def llm_validation(profile1, profile2, llm_client: AzureChatOpenAI):
+# Token budget for both profiles in the validation prompt (0 or None = full indented JSON)
+PROMPT_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "1200")) or None
+
+
+def llm_validation(profile1, profile2, llm_client: "AzureChatOpenAI", token_budget=PROMPT_TOKEN_BUDGET):
     """LLM validation using pre-initialized AzureChatOpenAI client"""
+    if not token_budget:
+        profile1_text = json.dumps(profile1, indent=2)
+        profile2_text = json.dumps(profile2, indent=2)
+    else:
+        profile1_text, profile2_text, _ = serialize_profiles_for_prompt(profile1, profile2, token_budget)
+
     validation_prompt = f"""
     You are an expert at verifying if two professional profiles belong to the same person.
     Analyze the following profiles and give a score between 0 and 1 (1=definitely same, 0=definitely different).
@@ -166,17 +267,23 @@ def llm_validation(profile1, profile2, llm_client: AzureChatOpenAI):
     Return JSON: {{"score": float, "reason": string}}
 
     Profile 1:
-    {json.dumps(profile1, indent=2)}
+    {profile1_text}
 
     Profile 2:
-    {json.dumps(profile2, indent=2)}
+    {profile2_text}
     """
+    print(f"LLM validation prompt: {count_tokens(validation_prompt)} tokens (budget {token_budget}).")
     
+    def invoke():
+        with upstream("azure_openai", purpose="validation"):
+            return llm_client.invoke([
+                {"role": "system", "content": "You are a HR verification AI that outputs JSON"},
+                {"role": "user", "content": validation_prompt}
+            ], **deadline.timeout_kwargs("llm validation"))
+
     try:
-        response = llm_client.invoke([
-            {"role": "system", "content": "You are a HR verification AI that outputs JSON"},
-            {"role": "user", "content": validation_prompt}
-        ])
+        response = resilience.call("azure_openai", invoke)
+        llm_usage(response, purpose="validation")
         
         # Parse response
         content = response.content
@@ -191,7 +298,14 @@ def llm_validation(profile1, profile2, llm_client: AzureChatOpenAI):
     except json.JSONDecodeError:
         print("LLM returned invalid JSON")
         return 0.0, "Validation error"
+    except DeadlineExceeded:
+        raise
+    except CircuitOpen as e:
+        print(f"LLM validation skipped: {e}")
+        return 0.0, "Service unavailable"
     except Exception as e:
+        # A call timed out by the request deadline is not a zero score
+        deadline.check("llm validation")
         print(f"LLM validation failed: {str(e)[:200]}")
         return 0.0, "Service error"
 
@@ -209,72 +323,224 @@ def preprocess_text(text):
     text = text.lower()
     
     # Step 4: Process the text with spaCy for tokenization, lemmatization, and stopword removal
-    doc = nlp(text)
+    doc = get_nlp()(text)
 
     # Step 5: Lemmatize and remove stopwords
     processed_text = " ".join([token.lemma_ for token in doc if not token.is_stop and not token.is_punct])
 
     return processed_text
 
+_sentence_model = None
+
+def get_sentence_model():
+    """Loads the MiniLM sentence transformer once and reuses it."""
+    global _sentence_model
+    if _sentence_model is None:
+        with _model_lock:
+            if _sentence_model is None:
+                from sentence_transformers import SentenceTransformer
+                _sentence_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+    return _sentence_model
+
 def get_embedding(text: str) -> np.ndarray:
     """
     Generate an embedding for the input text using the specified transformer model.
 
     Args:
-        model_id (str): Hugging Face model ID (e.g., "sentence-transformers/all-MiniLM-L6-v2")
         text (str): The input text to embed
 
     Returns:
         np.ndarray: The generated embedding as a numpy array
     """
-    model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-    embedding = model.encode(text)
+    import torch
+    with stage("embedding"), torch.inference_mode():
+        embedding = get_sentence_model().encode(text)
     return embedding
 
+def get_embeddings(texts, batch_size: int = 64) -> dict:
+    """
+    Embed many texts in shared forward passes.
+
+    Returns:
+        dict: text -> embedding for every distinct non-empty text
+    """
+    unique = list(dict.fromkeys(t for t in texts if t))
+    if not unique:
+        return {}
+    import torch
+    with stage("embedding", batch="true"), torch.inference_mode():
+        embeddings = get_sentence_model().encode(unique, batch_size=batch_size)
+    return dict(zip(unique, embeddings))
+
+def warmup(image_comparer=None) -> dict:
+    """
+    Loads spaCy, the sentence transformer and (optionally) VGG16 up front.
+
+    Returns:
+        dict: model name -> load time in seconds
+    """
+    import time
+    timings = {}
+    steps = [("spacy", get_nlp), ("sentence_transformer", get_sentence_model)]
+    if image_comparer is not None:
+        steps.append(("vgg16", image_comparer.load))
+    for name, load in steps:
+        start = time.perf_counter()
+        load()
+        timings[name] = time.perf_counter() - start
+    return timings
+
+def cached_embedder(embeddings: dict, fallback=get_embedding):
+    """Embedder for `persona_similarity` that looks texts up in precomputed `embeddings` first."""
+    def embed(text):
+        if text in embeddings:
+            return embeddings[text]
+        return fallback(text)
+    return embed
+
 # ----------------- MAIN COMPARISON FUNCTION -----------------
-def confidence_score(profile1, profile2, embedder, image_comparer, llm_validation, 
-                     llm_client: AzureChatOpenAI):    
-    # 1. Calculate raw scores
-    og_keys = profile1.get("original_keys")
-    img_score = image_comparer.similarity(og_keys.get("image"), profile2.get("image"))
-    persona_score = persona_similarity(profile1, profile2, embedder)
-    llm_score, llm_reason = llm_validation(profile1, profile2, llm_client)
+DOMINANT_THRESHOLD = 0.9
 
-    # 2. Check for dominant component (>90%)
-    max_score = max(img_score, persona_score, llm_score)
-    if max_score >= 0.9:
-        return {
-            "image_similarity": f"{img_score:.4f}",
-            "persona_similarity": f"{persona_score:.4f}",
-            "llm_validation": f"{llm_score:.4f}",
-            "llm_reason": llm_reason,
-            "overall_confidence": f"{max_score:.4f} (dominant component)"
-        }
-
-    # 3. Adaptive weighting logic
-    original_weights = {'image': 0.6, 'persona': 0.25, 'llm': 0.15}
-    
+# Cascade order, cheapest first. The LLM call is always last: it is the
+# slowest and the only one that costs money per call.
+CASCADE_ORDER = ("image", "persona", "llm")
+
+
+def component_weights(img_score):
+    """Return the weights used for the weighted average of the components."""
     if img_score < 5e-4:
+        return {'image': 0.0, 'persona': 0.75, 'llm': 0.25}
+    return {'image': 0.6, 'persona': 0.25, 'llm': 0.15}
+
+
+def combine_scores(img_score, persona_score, llm_score):
+    """
+    Combine the component scores into the overall confidence.
+
+    Returns:
+        tuple: (overall score, label used in the `overall_confidence` string)
+    """
+    # Dominant component (>90%)
+    max_score = max(img_score, persona_score, llm_score)
+    if max_score >= DOMINANT_THRESHOLD:
+        return max_score, "dominant component"
+
+    # Adaptive weighting logic
+    weights = component_weights(img_score)
+    if weights['image'] == 0.0:
         print(f"Image similarity too low ({img_score:.4f}) - redistributing weight.")
-        adjusted_weights = {'image': 0.0, 'persona': 0.75, 'llm': 0.25}
-    else:
-        adjusted_weights = original_weights
 
-    # 4. Calculate weighted average
     components = [
-        ('image', img_score, adjusted_weights['image']),
-        ('persona', persona_score, adjusted_weights['persona']),
-        ('llm', llm_score, adjusted_weights['llm'])
+        ('image', img_score, weights['image']),
+        ('persona', persona_score, weights['persona']),
+        ('llm', llm_score, weights['llm'])
     ]
-    
+
     total_weight = sum(w for _, _, w in components)
     weighted_sum = sum(score * weight for _, score, weight in components)
     overall = weighted_sum / total_weight if total_weight > 0 else 0.0
+    return overall, f"using {total_weight:.1f}/1.0 weight"
+
+
+def recombine_confidence(scores):
+    """
+    Recomputes `overall_confidence` of a stored `confidence_score()` result with combine_scores.
+
+    Results with a skipped component keep their stored overall confidence.
+    """
+    try:
+        img_score, persona_score, llm_score = (float(scores[key]) for key in
+                                               ("image_similarity", "persona_similarity", "llm_validation"))
+    except (KeyError, TypeError, ValueError):
+        return dict(scores)
+    overall, label = combine_scores(img_score, persona_score, llm_score)
+    return {**scores, "overall_confidence": f"{overall:.4f} ({label})"}
+
+
+def _format_score(score):
+    return "skipped" if score is None else f"{score:.4f}"
+
+
+def _cascade_confidence_score(profile1, profile2, embedder, image_comparer, llm_validation,
+                              llm_client, structured_score=None):
+    """Compute components in CASCADE_ORDER and stop at the first dominant one."""
+    og_keys = profile1.get("original_keys")
+    scorers = {
+        'image': lambda: image_comparer.similarity(og_keys.get("image"), profile2.get("image")),
+        'persona': lambda: persona_similarity(profile1, profile2, embedder),
+        'llm': lambda: llm_validation(profile1, profile2, llm_client),
+    }
+    scores = {name: None for name in CASCADE_ORDER}
+    llm_reason = "skipped"
+    overall, label = None, None
+
+    for name in CASCADE_ORDER:
+        with stage("component", component=name):
+            if name == 'llm':
+                scores['llm'], llm_reason = scorers['llm']()
+            else:
+                scores[name] = scorers[name]()
+
+        if scores[name] >= DOMINANT_THRESHOLD:
+            overall, label = scores[name], "dominant component"
+            break
+
+    if overall is None:
+        overall, label = combine_scores(scores['image'], scores['persona'], scores['llm'])
+
+    skipped = [name for name in CASCADE_ORDER if scores[name] is None]
+    if skipped:
+        print(f"Cascade skipped {', '.join(skipped)} ({label}).")
+
+    return {
+        "structured_similarity": f"{structured_score:.4f}",
+        "image_similarity": _format_score(scores['image']),
+        "persona_similarity": _format_score(scores['persona']),
+        "llm_validation": _format_score(scores['llm']),
+        "llm_reason": llm_reason,
+        "overall_confidence": f"{overall:.4f} ({label})"
+    }
+
+
+def confidence_score(profile1, profile2, embedder, image_comparer, llm_validation, 
+                     llm_client: "AzureChatOpenAI", cascade=False, structured_score=None):
+    """
+    Score how likely profile2 (a scraped candidate) is the same person as profile1.
+
+    The cheap structured similarity (names, companies, timezone, headline; see
+    confidenceScore/structured.py) is reported alongside the other components but
+    does not enter the overall confidence. Pass `structured_score` when it was
+    already computed to rank the candidates.
+
+    With `cascade=True` the components are computed cheapest-first (see CASCADE_ORDER)
+    and evaluation stops at the first dominant component; the components after it are
+    reported as "skipped". (No bound on the remaining components can prune earlier: each
+    of them may still score 1.0 and become dominant.)
+    """
+    if structured_score is None:
+        structured_score, _ = structured_similarity(profile1, profile2)
+
+    if cascade:
+        return _cascade_confidence_score(profile1, profile2, embedder, image_comparer,
+                                         llm_validation, llm_client, structured_score)
+
+    # 1. Calculate raw scores
+    og_keys = profile1.get("original_keys")
+    with stage("component", component="image"):
+        img_score = image_comparer.similarity(og_keys.get("image"), profile2.get("image"))
+    with stage("component", component="persona"):
+        persona_score = persona_similarity(profile1, profile2, embedder)
+    with stage("component", component="llm"):
+        llm_score, llm_reason = llm_validation(profile1, profile2, llm_client)
+
+    # 2. Dominant component check and adaptive weighting
+    overall, label = combine_scores(img_score, persona_score, llm_score)
 
     return {
+        "structured_similarity": f"{structured_score:.4f}",
         "image_similarity": f"{img_score:.4f}",
         "persona_similarity": f"{persona_score:.4f}",
         "llm_validation": f"{llm_score:.4f}",
         "llm_reason": llm_reason,
-        "overall_confidence": f"{overall:.4f} (using {total_weight:.1f}/1.0 weight)"
+        "overall_confidence": f"{overall:.4f} ({label})"
     }
@@ -0,0 +1,138 @@
+import json
+import re
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional, fall back to a character estimate
+    _encoding = None
+
+# Fields in the order they matter to the LLM judge. Fields at the end are
+# truncated first (and dropped last of all) when a profile is over budget.
+FIELD_PRIORITY = [
+    "name", "company_names", "headline", "intro", "timezone", "company_industry",
+    "company_size", "url", "social_profile", "links", "workspaces", "experience",
+    "summary", "education", "skills", "languages", "highlights", "image",
+]
+
+# Keys that never help the judge
+_DROPPED_KEYS = {"original_keys"}
+
+MAX_TEXT_CHARS = 600
+
+
+def count_tokens(text):
+    """Token count of `text` (tiktoken when installed, else ~4 characters per token)."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def _dedupe_sentences(text):
+    # The Tavily-augmented intro repeats the same search titles many times
+    seen, parts = set(), []
+    for part in re.split(r"(?:\.\s+-\s+|\.\s+|\s+-\s+)", text):
+        key = part.strip().lower()
+        if key and key not in seen:
+            seen.add(key)
+            parts.append(part.strip())
+    return ". ".join(parts)
+
+
+def _clean(value):
+    """Removes empty values, duplicate list entries and redundant whitespace."""
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        return value or None
+    if isinstance(value, dict):
+        cleaned = {k: _clean(v) for k, v in value.items()}
+        return {k: v for k, v in cleaned.items() if v not in (None, [], {}, "")} or None
+    if isinstance(value, list):
+        out, seen = [], set()
+        for item in value:
+            item = _clean(item)
+            key = json.dumps(item, sort_keys=True, ensure_ascii=False)
+            if item is not None and key not in seen:
+                seen.add(key)
+                out.append(item)
+        return out or None
+    return value
+
+
+def compact_profile(profile):
+    """
+    Flattens a persona or candidate profile into a deduplicated, priority-ordered dict.
+
+    Persona fields that only live under `original_keys` (timezone, company size, ...)
+    are lifted to the top level; the copy itself is dropped.
+    """
+    profile = profile or {}
+    merged = dict(profile.get("original_keys") or {})
+    merged.update({k: v for k, v in profile.items() if k not in _DROPPED_KEYS and v is not None})
+
+    if isinstance(merged.get("intro"), str):
+        merged["intro"] = _dedupe_sentences(merged["intro"])
+    if merged.get("intro") and merged.get("intro") == merged.get("headline"):
+        merged.pop("intro")
+
+    merged = _clean(merged) or {}
+    for key, value in merged.items():
+        if isinstance(value, str) and len(value) > MAX_TEXT_CHARS:
+            merged[key] = value[:MAX_TEXT_CHARS] + "..."
+
+    ordered = {k: merged[k] for k in FIELD_PRIORITY if k in merged}
+    ordered.update({k: v for k, v in merged.items() if k not in ordered})
+    return ordered
+
+
+def _dumps(data):
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def _shrink(data, key):
+    """Shrinks one field a step. Returns False once there is nothing left to remove."""
+    value = data.get(key)
+    if isinstance(value, list) and len(value) > 1:
+        data[key] = value[:len(value) // 2]
+    elif isinstance(value, str) and len(value) > 40:
+        data[key] = value[:len(value) // 2] + "..."
+    elif key in data:
+        del data[key]
+    else:
+        return False
+    return True
+
+
+def serialize_profile(profile, token_budget=None):
+    """
+    Compact JSON for one profile, truncated lowest-priority field first to fit `token_budget`.
+    `name` is never removed.
+    """
+    data = compact_profile(profile)
+    text = _dumps(data)
+    if token_budget is None:
+        return text
+
+    while count_tokens(text) > token_budget:
+        # Lowest priority first; unknown keys rank below everything listed
+        order = [k for k in data if k not in FIELD_PRIORITY][::-1] + \
+                [k for k in reversed(FIELD_PRIORITY) if k in data and k != "name"]
+        if not order or not _shrink(data, order[0]):
+            break
+        text = _dumps(data)
+    return text
+
+
+def serialize_profiles_for_prompt(profile1, profile2, token_budget=None):
+    """
+    Serializes both profiles with the budget split evenly between them.
+
+    Returns:
+        tuple: (profile1 text, profile2 text, token count of both)
+    """
+    per_profile = token_budget // 2 if token_budget else None
+    text1 = serialize_profile(profile1, per_profile)
+    text2 = serialize_profile(profile2, per_profile)
+    return text1, text2, count_tokens(text1) + count_tokens(text2)
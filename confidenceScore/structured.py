@@ -0,0 +1,167 @@
+import re
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+
+from scrappers.prefilter import name_tokens, normalize_text, name_match_score
+from scrappers.geocache import resolve_timezone
+
+# Features in column order. A feature that cannot be computed for a pair
+# (e.g. the persona has no company) is masked out and the weights of the
+# remaining ones are renormalised.
+STRUCTURED_FEATURES = ("name", "company", "timezone", "headline")
+STRUCTURED_WEIGHTS = np.array([0.45, 0.30, 0.10, 0.15])
+
+# Suffixes that differ between "Dock", "Dock Inc." and "Dock Technologies Ltd"
+_COMPANY_SUFFIXES = {"inc", "llc", "ltd", "limited", "corp", "corporation", "co", "company",
+                     "gmbh", "plc", "pvt", "private", "technologies", "technology", "labs", "hq", "the"}
+_STOPWORDS = {"and", "the", "for", "with", "from", "our", "you", "your", "who", "what", "are",
+              "was", "has", "have", "about", "into", "over", "out", "all", "its", "not", "but",
+              "at", "of", "in", "on", "to", "a", "an", "by", "as", "is", "we", "i", "my", "or"}
+
+
+def company_key(company):
+    """Normalised company name without legal suffixes ("Dock, Inc." -> "dock")."""
+    tokens = [t for t in normalize_text(company).split() if t not in _COMPANY_SUFFIXES]
+    return " ".join(tokens)
+
+
+def keywords(text, exclude=()):
+    if not text:
+        return set()
+    text = re.sub(r"@", " ", text)
+    return {t for t in normalize_text(text).split()
+            if len(t) > 2 and t not in _STOPWORDS and t not in exclude and not t.isdigit()}
+
+
+@lru_cache(maxsize=1024)
+def utc_offset_hours(timezone):
+    try:
+        from zoneinfo import ZoneInfo
+        return datetime.now(ZoneInfo(timezone)).utcoffset().total_seconds() / 3600
+    except Exception:
+        return None
+
+
+def timezone_compatibility(tz1, tz2):
+    """1.0 for the same zone, decreasing with the UTC offset gap, None when unknown."""
+    if not tz1 or not tz2:
+        return None
+    if tz1 == tz2:
+        return 1.0
+    off1, off2 = utc_offset_hours(tz1), utc_offset_hours(tz2)
+    if off1 is None or off2 is None:
+        return None
+    gap = abs(off1 - off2)
+    gap = min(gap, 24 - gap)
+    return max(0.0, 1.0 - gap / 4)
+
+
+def persona_features(profile):
+    """Pre-computes everything the persona side of `structured_similarity` needs."""
+    og_keys = profile.get("original_keys") or {}
+    name = profile.get("name") or og_keys.get("name")
+    companies = {company_key(c) for c in (profile.get("company_names") or []) if c}
+    companies.discard("")
+    # The original intro only: the search-augmented intro is mostly other people's titles
+    intro = og_keys.get("intro") or ""
+    exclude = set(name_tokens(name)) | {t for c in companies for t in c.split()}
+    return {
+        "name": name,
+        "companies": companies,
+        "timezone": og_keys.get("timezone") or profile.get("timezone"),
+        "keywords": keywords(intro, exclude),
+    }
+
+
+def candidate_features(profile):
+    companies = set()
+    for workspace in profile.get("workspaces") or []:
+        if isinstance(workspace, dict) and workspace.get("name"):
+            companies.add(company_key(workspace["name"]))
+    location = None
+    for entry in profile.get("experience") or []:
+        if not isinstance(entry, dict):
+            continue
+        if entry.get("company"):
+            companies.add(company_key(entry["company"]))
+        location = location or entry.get("location")
+    companies.discard("")
+    headline = " ".join(filter(None, [profile.get("intro") or profile.get("headline"),
+                                      (profile.get("summary") or "")[:300]]))
+    return {
+        "name_tokens": name_tokens(profile.get("name")),
+        "companies": companies,
+        "headline": normalize_text(headline),
+        # Cache and gazetteer only: this scorer must stay cheap
+        "timezone": profile.get("timezone") or resolve_timezone(location, use_network=False),
+    }
+
+
+def _company_score(persona_companies, candidate_companies, headline):
+    if not persona_companies:
+        return None
+    best = 0.0
+    for company in persona_companies:
+        if company in candidate_companies:
+            return 1.0
+        # A workspace "Dock Financial" for "Dock", or the company named in the headline
+        tokens = set(company.split())
+        if any(tokens <= set(other.split()) or set(other.split()) <= tokens for other in candidate_companies):
+            best = max(best, 0.8)
+        elif re.search(rf"\b{re.escape(company)}\b", headline):
+            best = max(best, 0.7)
+    return best
+
+
+def feature_vector(persona, candidate):
+    """Raw feature values for one pair, NaN where a feature is unknown."""
+    company = _company_score(persona["companies"], candidate["companies"], candidate["headline"])
+    tz = timezone_compatibility(persona["timezone"], candidate["timezone"])
+    if persona["keywords"]:
+        headline_tokens = set(candidate["headline"].split())
+        headline = len(persona["keywords"] & headline_tokens) / len(persona["keywords"])
+    else:
+        headline = None
+    name = name_match_score(persona["name"], candidate["name_tokens"]) if persona["name"] else None
+    return [np.nan if v is None else v for v in (name, company, tz, headline)]
+
+
+def score_matrix(features):
+    """Weighted score per row of an (n, len(STRUCTURED_FEATURES)) matrix, ignoring NaNs."""
+    features = np.asarray(features, dtype=float).reshape(-1, len(STRUCTURED_FEATURES))
+    known = ~np.isnan(features)
+    weights = known * STRUCTURED_WEIGHTS
+    totals = weights.sum(axis=1)
+    scores = (np.nan_to_num(features) * weights).sum(axis=1)
+    return np.divide(scores, totals, out=np.zeros_like(scores), where=totals > 0)
+
+
+def structured_similarity(profile1, profile2):
+    """
+    Cheap similarity from names, companies, timezone and headline keywords.
+
+    Returns:
+        tuple: (score in [0, 1], dict of the individual feature values)
+    """
+    row = feature_vector(persona_features(profile1), candidate_features(profile2))
+    details = {name: (None if np.isnan(v) else round(float(v), 4)) for name, v in zip(STRUCTURED_FEATURES, row)}
+    return float(score_matrix([row])[0]), details
+
+
+def rank_candidates(profile1, candidates):
+    """
+    Orders scraped candidates (URL -> profile) by structured similarity, best first.
+
+    Returns:
+        list: (url, score) tuples
+    """
+    if not candidates:
+        return []
+    persona = persona_features(profile1)
+    urls = list(candidates)
+    matrix = [feature_vector(persona, candidate_features(candidates[url])) for url in urls]
+    scores = score_matrix(matrix)
+    order = np.argsort(-scores, kind="stable")
+    return [(urls[i], float(scores[i])) for i in order]
@@ -0,0 +1,151 @@
+"""
+Per-request deadlines.
+
+`find_best_linkedin_match(persona, deadline=30)` opens a deadline scope for
+the request. Code further down does not take the deadline as an argument:
+each upstream call asks `timeout(default)` for its timeout, which is the
+usual timeout capped at the time left, and retry loops ask `allows(seconds)`
+before backing off. Once the time is up, `timeout()` and `check()` raise
+`DeadlineExceeded`, and run.py returns the best match scored so far, flagged
+as partial.
+
+The scope is a context variable, so it covers the request's own thread only;
+work handed to a thread pool runs without a deadline unless the pool copies
+the context.
+"""
+
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+# Default per-persona deadline in seconds for run.py and the API (0 = none)
+DEFAULT_DEADLINE = float(os.getenv("PERSONA_DEADLINE", "0"))
+# Calls that would get less than this are not started
+MIN_TIMEOUT = float(os.getenv("DEADLINE_MIN_TIMEOUT", "0.5"))
+
+_current = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised once the request's deadline has passed."""
+
+    def __init__(self, what=""):
+        super().__init__(f"Deadline exceeded before {what}" if what else "Deadline exceeded")
+        self.what = what
+
+
+class Deadline:
+    """
+    Args:
+        seconds: Time budget, counted from now
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.expires_at = self.started + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    @property
+    def exhausted(self):
+        """Too little time left to start another call."""
+        return self.remaining() < MIN_TIMEOUT
+
+
+@contextmanager
+def scope(seconds):
+    """
+    Runs the block under a deadline of `seconds` (None or 0: no deadline).
+
+    Nested scopes never outlive the enclosing one.
+    """
+    parent = _current.get()
+    if not seconds:
+        yield parent
+        return
+    if parent is not None:
+        seconds = min(seconds, parent.remaining())
+    deadline = Deadline(seconds)
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def request_scope(seconds=None):
+    """`scope(seconds)`, falling back to DEFAULT_DEADLINE when `seconds` is None."""
+    return scope(DEFAULT_DEADLINE if seconds is None else seconds)
+
+
+@contextmanager
+def reserve(seconds):
+    """Runs the block under a deadline ending `seconds` before the current one (no-op without one)."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    with scope(max(parent.remaining() - seconds, 1e-9)) as deadline:
+        yield deadline
+
+
+def current():
+    """The active Deadline, or None."""
+    return _current.get()
+
+
+def remaining():
+    """Seconds left, or None without a deadline."""
+    deadline = _current.get()
+    return None if deadline is None else deadline.remaining()
+
+
+def expired():
+    deadline = _current.get()
+    return deadline is not None and deadline.expired
+
+
+def check(what=""):
+    """Raises DeadlineExceeded when less than MIN_TIMEOUT is left, too little to start another call."""
+    deadline = _current.get()
+    if deadline is not None and deadline.exhausted:
+        raise DeadlineExceeded(what)
+
+
+def timeout(default, what=""):
+    """
+    Timeout for the next upstream call: `default`, capped at the time left.
+
+    Raises:
+        DeadlineExceeded: Less than MIN_TIMEOUT is left
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return default
+    left = deadline.remaining()
+    if left < MIN_TIMEOUT:
+        raise DeadlineExceeded(what)
+    return min(default, left)
+
+
+def timeout_kwargs(what=""):
+    """`{"timeout": ...}` for clients that take a per-call timeout keyword (LangChain chat models), else {}."""
+    if _current.get() is None:
+        return {}
+    return {"timeout": timeout(float("inf"), what)}
+
+
+def allows(seconds):
+    """True when waiting `seconds` (e.g. a retry backoff) still leaves room for another call."""
+    deadline = _current.get()
+    return deadline is None or deadline.remaining() >= seconds + MIN_TIMEOUT
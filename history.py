@@ -0,0 +1,128 @@
+"""
+Match history for scheduled re-verification (`run.py --reverify`).
+
+Per persona it records the enriched persona, its candidate URLs, the latest
+result and the component scores of every candidate. Per candidate URL it
+records the scraped profile, a hash of its content and when it was scraped.
+A re-verification only rescrapes pages older than HISTORY_PAGE_TTL. It
+rescores a candidate only when the persona or the candidate's page changed,
+and otherwise recombines the stored component scores.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+DEFAULT_HISTORY_PATH = os.getenv("HISTORY_PATH", os.path.join(".cache", "match_history.sqlite"))
+# Scraped pages younger than this are reused as they are
+PAGE_TTL = float(os.getenv("HISTORY_PAGE_TTL", str(30 * 24 * 3600)))
+
+Page = namedtuple("Page", "profile content_hash scraped_at")
+PersonaRecord = namedtuple("PersonaRecord", "fingerprint final_persona candidate_urls result verified_at")
+ScoreRecord = namedtuple("ScoreRecord", "fingerprint content_hash scores scored_at")
+
+
+def content_hash(profile):
+    return hashlib.sha256(json.dumps(profile, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class MatchHistory:
+    """
+    Args:
+        path: SQLite file (None = in-memory only)
+        page_ttl: Seconds before a scraped page is considered stale
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, page_ttl=PAGE_TTL):
+        self.page_ttl = page_ttl
+        self._lock = threading.Lock()
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY, profile TEXT, content_hash TEXT, scraped_at REAL);
+            CREATE TABLE IF NOT EXISTS personas (
+                persona_id TEXT PRIMARY KEY, fingerprint TEXT, final_persona TEXT, candidate_urls TEXT,
+                result TEXT, verified_at REAL);
+            CREATE TABLE IF NOT EXISTS scores (
+                persona_id TEXT, url TEXT, fingerprint TEXT, content_hash TEXT, scores TEXT, scored_at REAL,
+                PRIMARY KEY (persona_id, url));
+        """)
+        self._db.commit()
+
+    # --- Pages ---
+    def pages(self, urls):
+        """Stored pages for `urls`: url -> Page (unknown URLs are left out)."""
+        urls = list(urls)
+        if not urls:
+            return {}
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT url, profile, content_hash, scraped_at FROM pages WHERE url IN ({','.join('?' * len(urls))})",
+                urls).fetchall()
+        return {url: Page(json.loads(profile), digest, scraped_at) for url, profile, digest, scraped_at in rows}
+
+    def is_stale(self, page, now=None):
+        return page is None or (now or time.time()) - page.scraped_at > self.page_ttl
+
+    def put_pages(self, profiles_by_url):
+        now = time.time()
+        rows = [(url, json.dumps(profile, ensure_ascii=False), content_hash(profile), now)
+                for url, profile in profiles_by_url.items()]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    # --- Personas ---
+    def persona(self, persona_id):
+        """The PersonaRecord of the last verification, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT fingerprint, final_persona, candidate_urls, result, verified_at "
+                                   "FROM personas WHERE persona_id = ?", (persona_id,)).fetchone()
+        if row is None:
+            return None
+        fingerprint, final_persona, candidate_urls, result, verified_at = row
+        return PersonaRecord(fingerprint, json.loads(final_persona), json.loads(candidate_urls),
+                             json.loads(result), verified_at)
+
+    def put_persona(self, persona_id, fingerprint, final_persona, candidate_urls, result):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO personas VALUES (?, ?, ?, ?, ?, ?)",
+                             (persona_id, fingerprint, json.dumps(final_persona, ensure_ascii=False),
+                              json.dumps(candidate_urls), json.dumps(result, ensure_ascii=False), time.time()))
+            self._db.commit()
+
+    # --- Component scores ---
+    def scores(self, persona_id):
+        """url -> ScoreRecord for every candidate scored for this persona."""
+        with self._lock:
+            rows = self._db.execute("SELECT url, fingerprint, content_hash, scores, scored_at FROM scores "
+                                    "WHERE persona_id = ?", (persona_id,)).fetchall()
+        return {url: ScoreRecord(fingerprint, digest, json.loads(scores), scored_at)
+                for url, fingerprint, digest, scores, scored_at in rows}
+
+    def put_score(self, persona_id, url, fingerprint, page_hash, scores):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?)",
+                             (persona_id, url, fingerprint, page_hash, json.dumps(scores, ensure_ascii=False),
+                              time.time()))
+            self._db.commit()
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_history():
+    """Shared history using HISTORY_PATH."""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = MatchHistory()
+    return _history
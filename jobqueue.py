@@ -0,0 +1,182 @@
+"""
+Bounded in-process job queue used by the API server.
+
+Work is run on a fixed pool of worker threads. Submitting beyond the queue
+capacity raises `QueueFull` so the server can answer 429 instead of piling
+up requests. Jobs are cancelled cooperatively: the job function receives a
+`threading.Event` and stops at the next stage boundary once it is set.
+"""
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """Raised when the queue already holds `max_pending` unfinished jobs."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once its cancel event is set."""
+
+
+def check_cancelled(cancel_event, stage=""):
+    """Stage-boundary check for cooperative cancellation."""
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelled(f"Cancelled before {stage}" if stage else "Cancelled")
+
+
+class Job:
+    def __init__(self, fn, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.last_polled = self.created_at
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def to_dict(self):
+        data = {"job_id": self.id, "status": self.status, "created_at": self.created_at}
+        if self.started_at:
+            data["started_at"] = self.started_at
+        if self.finished_at:
+            data["finished_at"] = self.finished_at
+            data["duration"] = round(self.finished_at - (self.started_at or self.created_at), 3)
+        if self.status == "done":
+            data["result"] = self.result
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class JobQueue:
+    """
+    Args:
+        workers: Number of jobs running at the same time
+        max_pending: Maximum number of queued + running jobs
+        abandon_after: Cancel a job nobody has polled for this many seconds (None = never)
+        result_ttl: How long finished jobs are kept for polling
+    """
+
+    def __init__(self, workers=4, max_pending=32, abandon_after=120, result_ttl=600):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.abandon_after = abandon_after
+        self.result_ttl = result_ttl
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._avg_duration = 60.0  # seconds, refined as jobs finish
+
+        # Threads start on the first submit, so a process can fork after creating the queue
+        self._reaper = None
+
+    def pending_count(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def retry_after(self, pending=None):
+        """Rough number of seconds until a slot frees up."""
+        if pending is None:
+            pending = self.pending_count()
+        return max(1, int(self._avg_duration * max(1, pending - self.workers + 1) / self.workers))
+
+    def submit(self, fn, *args, **kwargs):
+        """Queues `fn(*args, cancel_event=..., **kwargs)` and returns the Job."""
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self.max_pending:
+                raise QueueFull(self.retry_after(pending))
+            job = Job(fn, args, kwargs)
+            self._jobs[job.id] = job
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+                self._reaper.start()
+        self._pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id, touch=True):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job and touch:
+            job.last_polled = time.time()
+        return job
+
+    def cancel(self, job_id):
+        job = self.get(job_id, touch=False)
+        if job and not job.finished:
+            job.cancel_event.set()
+            if job.status == "queued":
+                self._finish(job, "cancelled", error="Cancelled before start")
+        return job
+
+    def wait(self, job, timeout):
+        """Waits for a job; cancels it and returns False if it is not done in time."""
+        deadline = time.time() + timeout
+        while not job.done_event.wait(min(1.0, max(0.0, deadline - time.time()))):
+            if time.time() >= deadline:
+                self.cancel(job.id)
+                return False
+            job.last_polled = time.time()  # a blocked waiter counts as polling
+        return True
+
+    def _run(self, job):
+        if job.cancel_event.is_set():
+            return
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            result = job.fn(*job.args, cancel_event=job.cancel_event, **job.kwargs)
+            self._finish(job, "done", result=result)
+        except JobCancelled as e:
+            self._finish(job, "cancelled", error=str(e))
+        except Exception as e:
+            traceback.print_exc()
+            self._finish(job, "failed", error=f"{type(e).__name__}: {e}")
+
+    def _finish(self, job, status, result=None, error=None):
+        if job.finished:
+            return
+        job.result, job.error = result, error
+        job.finished_at = time.time()
+        job.status = status
+        if status == "done" and job.started_at:
+            # Exponential moving average feeds the Retry-After estimate
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * (job.finished_at - job.started_at)
+        job.done_event.set()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(5)
+            now = time.time()
+            with self._lock:
+                jobs = list(self._jobs.values())
+            for job in jobs:
+                if job.finished:
+                    if now - job.finished_at > self.result_ttl:
+                        with self._lock:
+                            self._jobs.pop(job.id, None)
+                elif self.abandon_after and now - job.last_polled > self.abandon_after:
+                    print(f"Job {job.id} not polled for {self.abandon_after}s, cancelling.")
+                    self.cancel(job.id)
+
+    def shutdown(self):
+        for job in list(self._jobs.values()):
+            job.cancel_event.set()
+        self._pool.shutdown(wait=False)
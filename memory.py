@@ -0,0 +1,188 @@
+"""
+Per-stage memory accounting and an RSS budget.
+
+Accounting (MEMORY_ACCOUNTING=1, the default when MEMORY_BUDGET_MB is set and
+metrics are enabled): every `metrics.stage()` block records how much the process RSS
+grew while it ran (`stage_rss_growth_bytes_total`), and stages that grow it
+by more than MEMORY_LOG_THRESHOLD_MB are logged. RSS is process-wide, so with
+several personas in flight a stage is also charged for what the other threads
+allocated meanwhile; read the numbers from a single-worker run when hunting a
+leak. With MEMORY_TRACEMALLOC=1 the log line also lists the top allocation
+sites of the stage (tracemalloc slows Python allocations down noticeably, so
+it stays off by default).
+
+Budget: with MEMORY_BUDGET_MB set, `budget.check()` runs before new work is
+accepted. Over budget, it first runs the registered evictors (in-process
+caches), a garbage collection and `malloc_trim`; if RSS is still over budget,
+`over_budget()` is true and api.py rejects new work with 503 until memory
+comes back down.
+"""
+
+import ctypes
+import gc
+import os
+import threading
+import time
+import tracemalloc
+
+import metrics
+
+BUDGET_MB = float(os.getenv("MEMORY_BUDGET_MB", "0"))  # 0 = no budget
+# Reading RSS around every stage is not free, so accounting is off unless a budget
+# is set (or it is asked for), and never runs with metrics disabled
+ENABLED = (os.getenv("MEMORY_ACCOUNTING", "1" if BUDGET_MB else "0").lower() in ("1", "true", "yes")
+           and metrics.ENABLED)
+TRACEMALLOC = os.getenv("MEMORY_TRACEMALLOC", "0").lower() in ("1", "true", "yes")
+LOG_THRESHOLD_MB = float(os.getenv("MEMORY_LOG_THRESHOLD_MB", "50"))
+TOP_ALLOCATIONS = int(os.getenv("MEMORY_TOP_ALLOCATIONS", "5"))
+# Minimum seconds between two eviction rounds
+EVICT_INTERVAL = float(os.getenv("MEMORY_EVICT_INTERVAL", "10"))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+MB = 1024 * 1024
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None when it cannot be read."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+
+def _malloc_trim():
+    """Returns freed heap pages to the OS (glibc only); no-op elsewhere."""
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class StageMemoryTracker:
+    """
+    `metrics.stage_listeners` hook recording RSS growth per stage.
+
+    Each thread keeps its own stack of open stages, so nested stages
+    (scoring > confidence_score > component[llm]) are each charged separately.
+    """
+
+    def __init__(self, threshold_mb=LOG_THRESHOLD_MB, use_tracemalloc=TRACEMALLOC, top=TOP_ALLOCATIONS):
+        self.threshold = threshold_mb * MB
+        self.use_tracemalloc = use_tracemalloc
+        self.top = top
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def enter_stage(self, name):
+        snapshot = tracemalloc.take_snapshot() if self.use_tracemalloc and tracemalloc.is_tracing() else None
+        self._stack().append((name, current_rss(), snapshot))
+
+    def exit_stage(self, name):
+        stack = self._stack()
+        if not stack:
+            return
+        _, before, snapshot = stack.pop()
+        after = current_rss()
+        if before is None or after is None:
+            return
+        growth = after - before
+        metrics.set_gauge("process_rss_bytes", after)
+        if growth > 0:
+            metrics.inc("stage_rss_growth_bytes_total", growth, stage=name)
+        if growth >= self.threshold:
+            print(f"Memory: stage {name} grew RSS by {growth / MB:.0f} MB (now {after / MB:.0f} MB)")
+            if snapshot is not None:
+                for line in self.top_allocations(snapshot):
+                    print(f"  {line}")
+
+    def top_allocations(self, before):
+        """Largest allocation growth since `before`, one line per source line."""
+        stats = tracemalloc.take_snapshot().compare_to(before, "lineno")
+        return [f"{stat.size_diff / MB:+.1f} MB in {stat.count_diff:+d} blocks: {stat.traceback[0]}"
+                for stat in stats[:self.top] if stat.size_diff > 0]
+
+
+class MemoryBudget:
+    """
+    RSS limit enforced by evicting caches and, failing that, rejecting new work.
+
+    Args:
+        limit_mb: RSS budget in MB (0 disables the budget)
+        evict_interval: Minimum seconds between eviction rounds
+    """
+
+    def __init__(self, limit_mb=BUDGET_MB, evict_interval=EVICT_INTERVAL):
+        self.limit = int(limit_mb * MB)
+        self.evict_interval = evict_interval
+        self.evictors = {}  # name -> callable returning the number of entries dropped
+        self._lock = threading.Lock()
+        self._last_evict = 0.0
+        metrics.set_gauge("memory_budget_bytes", self.limit)
+
+    def register_evictor(self, name, evict):
+        """Registers a cache to clear when over budget; `evict()` may return the entries dropped."""
+        self.evictors[name] = evict
+
+    def evict(self):
+        """Clears every registered cache and hands the freed memory back to the OS."""
+        for name, evict in list(self.evictors.items()):
+            try:
+                dropped = evict()
+            except Exception as e:
+                print(f"Memory: evicting {name} failed: {e}")
+                continue
+            metrics.inc("memory_evictions_total", cache=name)
+            print(f"Memory: evicted {name}" + (f" ({dropped} entries)" if dropped else ""))
+        gc.collect()
+        _malloc_trim()
+
+    def check(self):
+        """
+        Evicts caches when RSS is over budget (at most once per evict_interval).
+
+        Returns:
+            bool: True when RSS is still over budget afterwards
+        """
+        if not self.limit:
+            return False
+        rss = current_rss()
+        if rss is None:
+            return False
+        metrics.set_gauge("process_rss_bytes", rss)
+        if rss <= self.limit:
+            return False
+        with self._lock:
+            if time.monotonic() - self._last_evict >= self.evict_interval:
+                self._last_evict = time.monotonic()
+                print(f"Memory: RSS {rss / MB:.0f} MB over budget of {self.limit / MB:.0f} MB, evicting caches")
+                self.evict()
+                rss = current_rss() or rss
+                metrics.set_gauge("process_rss_bytes", rss)
+        return rss > self.limit
+
+    def admit(self):
+        """True when new work may start; counts a rejection otherwise."""
+        if self.check():
+            metrics.inc("memory_rejections_total")
+            return False
+        return True
+
+
+tracker = StageMemoryTracker()
+budget = MemoryBudget()
+
+if ENABLED:
+    if TRACEMALLOC and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    metrics.stage_listeners.append(tracker)
@@ -0,0 +1,316 @@
+"""
+In-process metrics for the matching pipeline.
+
+Counters and latency histograms keyed by name and labels, exported in the
+Prometheus text format (`api.py` serves them at /metrics) and summarised at the
+end of batch runs. Set METRICS_ENABLED=0 to turn every call into a no-op.
+
+    with stage("scrape"):
+        ...
+    with upstream("google_cse") as call:
+        response = requests.get(...)
+        call.bytes = len(response.content)
+    inc("cache_hits_total", cache="search")
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+
+# Seconds. Upstream calls range from ~10 ms (cache) to 45 s (scrape timeout)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HELP = {
+    "stage_duration_seconds": "Time spent in each pipeline stage",
+    "stage_errors_total": "Pipeline stages that raised",
+    "upstream_duration_seconds": "Latency of calls to external services",
+    "upstream_requests_total": "Calls to external services",
+    "upstream_errors_total": "Failed calls to external services",
+    "upstream_retries_total": "Retried calls to external services",
+    "upstream_bytes_total": "Response bytes received from external services",
+    "cache_hits_total": "Lookups answered from a cache",
+    "cache_misses_total": "Lookups that missed a cache",
+    "llm_tokens_total": "LLM tokens used",
+    "enrich_total": "Personas enriched, by method (rules or llm)",
+    "process_rss_bytes": "Resident set size of this process",
+    "memory_budget_bytes": "Configured RSS budget (0 = none)",
+    "stage_rss_growth_bytes_total": "RSS growth observed across each pipeline stage",
+    "memory_evictions_total": "Cache evictions triggered by the memory budget",
+    "memory_rejections_total": "Requests rejected because RSS was over budget",
+    "circuit_breaker_open": "1 while the upstream's circuit breaker is open or half open",
+    "circuit_breaker_opened_total": "Times the upstream's circuit breaker opened",
+    "circuit_breaker_rejections_total": "Calls failed fast because the upstream's circuit breaker was open",
+    "retry_budget_exhausted_total": "Retries skipped because the shared retry budget was spent",
+    "deadline_exceeded_total": "Persona requests cut short by their deadline, by the call that hit it",
+    "vector_index_profiles": "Profiles in the local vector index",
+    "local_matches_total": "Personas matched from the local vector index without calling the search APIs",
+}
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS, keep_samples=False):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        # Raw values for exact percentiles (benchmarks only, grows without bound)
+        self.samples = [] if keep_samples else None
+
+    def observe(self, value):
+        if self.samples is not None:
+            self.samples.append(value)
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Exact when samples are kept, else estimated from the buckets by linear interpolation."""
+        if not self.count:
+            return 0.0
+        if self.samples:
+            ordered = sorted(self.samples)
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+
+class Registry:
+    def __init__(self, keep_samples=False):
+        self.keep_samples = keep_samples
+        self._lock = threading.Lock()
+        self.counters = {}    # (name, labels) -> float
+        self.gauges = {}      # (name, labels) -> float
+        self.histograms = {}  # (name, labels) -> Histogram
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(keep_samples=self.keep_samples)
+            histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(h.counts), h.sum, h.count, h.buckets) for key, h in histograms]
+
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), value in gauges:
+            header(name, "gauge")
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), counts, total, count, buckets in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Human readable table of every histogram and counter, for the end of a run."""
+        with self._lock:
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            counters = sorted(self.counters.items())
+            rows = [(_series(key), h.count, h.sum, h.quantile(0.5), h.quantile(0.95), h.max)
+                    for key, h in histograms]
+
+        lines = [f"{'series':<52} {'count':>6} {'total s':>9} {'p50 s':>8} {'p95 s':>8} {'max s':>8}"]
+        for series, count, total, p50, p95, peak in rows:
+            lines.append(f"{series:<52} {count:>6} {total:>9.2f} {p50:>8.3f} {p95:>8.3f} {peak:>8.3f}")
+        for key, value in counters:
+            lines.append(f"{_series(key):<52} {_number(value):>6}")
+        return "\n".join(lines)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (k + '="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+               for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _series(key):
+    name, labels = key
+    return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+
+registry = Registry()
+
+
+class _Call:
+    """Handle yielded by `upstream()`; set `bytes` or `retries` on it before leaving the block."""
+    __slots__ = ("bytes", "retries")
+
+    def __init__(self):
+        self.bytes = 0
+        self.retries = 0
+
+
+_NOOP_CALL = _Call()
+
+
+class _Noop:
+    """Shared context manager returned when metrics are disabled (no generator per call)."""
+
+    def __enter__(self):
+        return _NOOP_CALL
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _Noop()
+
+
+def inc(name, value=1, **labels):
+    if ENABLED:
+        registry.inc(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    if ENABLED:
+        registry.observe(name, value, **labels)
+
+
+def set_gauge(name, value, **labels):
+    if ENABLED:
+        registry.set_gauge(name, value, **labels)
+
+
+@contextmanager
+def _stage(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield _NOOP_CALL
+    except BaseException:
+        registry.inc("stage_errors_total", stage=name, **labels)
+        raise
+    finally:
+        registry.observe("stage_duration_seconds", time.perf_counter() - start, stage=name, **labels)
+
+
+@contextmanager
+def _upstream(name, **labels):
+    call = _Call()
+    start = time.perf_counter()
+    try:
+        yield call
+    except BaseException:
+        registry.inc("upstream_errors_total", upstream=name, **labels)
+        raise
+    finally:
+        registry.observe("upstream_duration_seconds", time.perf_counter() - start, upstream=name, **labels)
+        registry.inc("upstream_requests_total", upstream=name, **labels)
+        if call.bytes:
+            registry.inc("upstream_bytes_total", call.bytes, upstream=name, **labels)
+        if call.retries:
+            registry.inc("upstream_retries_total", call.retries, upstream=name, **labels)
+
+
+# Objects with enter_stage(name)/exit_stage(name), e.g. an active profiler.SamplingProfiler
+stage_listeners = []
+
+
+@contextmanager
+def _observed_stage(name, **labels):
+    listeners = list(stage_listeners)
+    # "component[llm]" for stage("component", component="llm")
+    display = f"{name}[{','.join(str(v) for v in labels.values())}]" if labels else name
+    for listener in listeners:
+        listener.enter_stage(display)
+    try:
+        with (_stage(name, **labels) if ENABLED else _NOOP):
+            yield _NOOP_CALL
+    finally:
+        for listener in listeners:
+            listener.exit_stage(display)
+
+
+def stage(name, **labels):
+    """Context manager timing one pipeline stage (and counting it as an error if it raises)."""
+    if stage_listeners:
+        return _observed_stage(name, **labels)
+    return _stage(name, **labels) if ENABLED else _NOOP
+
+
+def upstream(name, **labels):
+    """Context manager timing one call to an external service; yields a handle for bytes/retries."""
+    return _upstream(name, **labels) if ENABLED else _NOOP
+
+
+def cache_lookup(cache, hit):
+    if ENABLED:
+        registry.inc("cache_hits_total" if hit else "cache_misses_total", cache=cache)
+
+
+def llm_usage(response, **labels):
+    """Counts prompt/completion tokens from a LangChain chat response, when it reports them."""
+    if not ENABLED:
+        return
+    usage = getattr(response, "usage_metadata", None) or {}
+    if not usage:
+        token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+        usage = {"input_tokens": token_usage.get("prompt_tokens"),
+                 "output_tokens": token_usage.get("completion_tokens")}
+    for kind, key in (("prompt", "input_tokens"), ("completion", "output_tokens")):
+        if usage.get(key):
+            registry.inc("llm_tokens_total", usage[key], kind=kind, **labels)
+
+
+def render_prometheus():
+    return registry.render_prometheus()
+
+
+def summary():
+    return registry.summary()
@@ -0,0 +1,176 @@
+"""
+Prefork multi-process server for api.py.
+
+The parent loads every model once (run.warmup()), freezes the GC so those
+objects are not touched again, opens the listening socket and forks N
+workers. The workers share the model weights copy-on-write and each serves
+requests from the shared socket with waitress (like api.py) and its own job
+queue.
+
+    python prefork.py --workers 4 --torch-threads 2 --port 5000
+
+Torch thread counts default to cores / workers so workers do not
+oversubscribe the CPU. No inference may run in the parent before forking:
+an OpenMP pool that exists at fork time can deadlock in the children.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+_PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024 if hasattr(os, "sysconf") else 4
+
+
+def process_memory(pid=None):
+    """
+    RSS, PSS and shared memory of a process in MB (Linux /proc).
+
+    PSS splits shared pages between the processes sharing them, so summing PSS
+    over the workers gives the real memory cost of the pool.
+    """
+    pid = pid or os.getpid()
+    stats = {"pid": pid}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"):
+                    stats[key.lower()] = int(value.split()[0]) / 1024
+        stats["shared"] = stats.pop("shared_clean", 0) + stats.pop("shared_dirty", 0)
+        stats["private"] = stats.pop("private_clean", 0) + stats.pop("private_dirty", 0)
+    except OSError:
+        # No smaps_rollup (older kernels, non-Linux): fall back to statm
+        try:
+            with open(f"/proc/{pid}/statm", "r") as f:
+                _, resident, shared = (int(x) for x in f.read().split()[:3])
+            stats.update(rss=resident * _PAGE_KB / 1024, shared=shared * _PAGE_KB / 1024)
+        except OSError:
+            pass
+    return stats
+
+
+def configure_torch_threads(intra_op, inter_op):
+    """Sets torch's thread pools for this worker process."""
+    import torch
+    torch.set_num_threads(intra_op)
+    try:
+        torch.set_num_interop_threads(inter_op)
+    except RuntimeError as e:
+        # Only allowed before the first inter-op parallel work in the process
+        print(f"Could not set inter-op threads: {e}")
+
+
+def _serve_worker(sock, worker_index, intra_op, inter_op, http_threads):
+    import api
+
+    configure_torch_threads(intra_op, inter_op)
+    api.worker_info.update(index=worker_index, torch_threads=intra_op, torch_interop_threads=inter_op)
+    host, port = sock.getsockname()[:2]
+    print(f"Worker {worker_index} (pid {os.getpid()}) serving, torch threads {intra_op}/{inter_op}")
+    # Same server as `python api.py`: waitress on the inherited socket
+    api.serve(host, port, threads=http_threads, sock=sock)
+
+
+def _spawn(sock, worker_index, intra_op, inter_op, http_threads):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 0
+        try:
+            _serve_worker(sock, worker_index, intra_op, inter_op, http_threads)
+        except BaseException as e:
+            print(f"Worker {worker_index} exited: {type(e).__name__}: {e}")
+            code = 1
+        os._exit(code)
+    return pid
+
+
+def print_memory_report(workers):
+    parent = process_memory()
+    print(f"Parent pid {parent['pid']}: RSS {parent.get('rss', 0):.0f} MB")
+    total_pss = 0.0
+    for index, pid in sorted(workers.items(), key=lambda item: item[1]):
+        stats = process_memory(pid)
+        total_pss += stats.get("pss", 0.0)
+        print(f"  worker {index} pid {pid}: RSS {stats.get('rss', 0):.0f} MB, "
+              f"PSS {stats.get('pss', 0):.0f} MB, shared {stats.get('shared', 0):.0f} MB, "
+              f"private {stats.get('private', 0):.0f} MB")
+    if total_pss:
+        print(f"  workers total PSS {total_pss:.0f} MB")
+
+
+def main(argv=None):
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Prefork API server sharing model memory between workers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("PREFORK_WORKERS", "2")))
+    parser.add_argument("--threads", type=int, default=8, help="HTTP threads per worker (waitress only)")
+    parser.add_argument("--torch-threads", type=int, default=int(os.getenv("TORCH_THREADS", "0")),
+                        help="Intra-op threads per worker (default: cores / workers)")
+    parser.add_argument("--torch-interop-threads", type=int, default=int(os.getenv("TORCH_INTEROP_THREADS", "1")))
+    parser.add_argument("--memory-report-interval", type=float, default=300,
+                        help="Seconds between per-worker memory reports (0 = only at startup)")
+    args = parser.parse_args(argv)
+
+    intra_op = args.torch_threads or max(1, cores // args.workers)
+
+    # Load everything once in the parent; children inherit it copy-on-write
+    import run
+    print(f"Models loaded in parent: {run.warmup()}")
+    import api  # noqa: F401  (builds the Flask app before forking)
+    gc.collect()
+    gc.freeze()  # keep the GC from writing to (and so copying) the shared pages
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    workers = {i: _spawn(sock, i, intra_op, args.torch_interop_threads, args.threads) for i in range(args.workers)}
+    print(f"Prefork server on http://{args.host}:{args.port} with {args.workers} workers")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers.values():
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    time.sleep(2)
+    print_memory_report(workers)
+    last_report = time.time()
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            index = next((i for i, p in workers.items() if p == pid), None)
+            workers.pop(index, None)
+            if not stopping and index is not None:
+                print(f"Worker {index} (pid {pid}) died with status {status}, restarting")
+                workers[index] = _spawn(sock, index, intra_op, args.torch_interop_threads, args.threads)
+            continue
+        if args.memory_report_interval and time.time() - last_report >= args.memory_report_interval:
+            print_memory_report(workers)
+            last_report = time.time()
+        time.sleep(1)
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
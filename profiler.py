@@ -0,0 +1,222 @@
+"""
+Opt-in sampling profiler for single persona requests.
+
+While a request is profiled, a background thread samples the request thread's
+stack every PROFILE_INTERVAL seconds. Each sample is tagged with the persona id
+and the pipeline stage it fell in (the `metrics.stage()` blocks). When the
+request finishes, the samples are written to PROFILE_DIR as:
+- speedscope JSON (open at https://www.speedscope.app): the sampled profile
+  plus a stage timeline
+- collapsed stacks (`persona;stage;frame;frame count`) for flamegraph.pl,
+  inferno or speedscope
+
+Profiling is switched on with PROFILE_REQUESTS=1, `run.py --profile`, or the
+`X-Profile: 1` header on /persona and /jobs. When it is off,
+`profile_request()` returns a shared no-op context manager and no sampler
+thread exists.
+"""
+
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+import metrics
+
+ENABLED = os.getenv("PROFILE_REQUESTS", "0").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(".cache", "profiles"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+# "speedscope", "collapsed" or "both"
+PROFILE_FORMAT = os.getenv("PROFILE_FORMAT", "both")
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+_sequence = itertools.count(1)
+
+
+def _frame_label(code):
+    path = code.co_filename
+    if path.startswith(_ROOT):
+        path = os.path.relpath(path, _ROOT)
+    else:
+        # ".../site-packages/torch/nn/modules/module.py" -> "torch/nn/modules/module.py"
+        path = re.split(r"[\\/](?:site|dist)-packages[\\/]", path)[-1]
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's stack at a fixed interval.
+
+    Args:
+        thread_id: Thread to sample (default: the calling thread)
+        interval: Seconds between samples
+        tag: Root frame for every stack, e.g. "persona:42"
+    """
+
+    def __init__(self, thread_id=None, interval=PROFILE_INTERVAL, tag="request"):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.tag = tag
+        self.samples = Counter()  # (stage, frame labels root first) -> count
+        self.stages = []           # [stage names], innermost last
+        self.events = []           # (seconds since start, "O"/"C", stage)
+        self._labels = {}          # code object -> label
+        self._stop = threading.Event()
+        self._thread = None
+        self.started = None
+        self.duration = 0.0
+
+    # Stage hooks called by metrics.stage() on the profiled thread
+    def enter_stage(self, name):
+        if threading.get_ident() == self.thread_id:
+            self.stages.append(name)
+            self.events.append((time.perf_counter() - self.started, "O", name))
+
+    def exit_stage(self, name):
+        if threading.get_ident() == self.thread_id and self.stages:
+            self.stages.pop()
+            self.events.append((time.perf_counter() - self.started, "C", name))
+
+    def _sample(self):
+        if self._stop.is_set():
+            return
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _frame_label(code)
+            stack.append(label)
+            frame = frame.f_back
+        stack.reverse()
+        stage = "/".join(self.stages) or "-"
+        self.samples[(stage, tuple(stack))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self.started = time.perf_counter()
+        metrics.stage_listeners.append(self)
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.tag}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        try:
+            metrics.stage_listeners.remove(self)
+        except ValueError:
+            pass
+        self.duration = time.perf_counter() - self.started
+        # Close stages still open (the request raised)
+        for name in reversed(self.stages):
+            self.events.append((self.duration, "C", name))
+        self.stages = []
+
+    # --- Output formats ---
+    def collapsed(self):
+        """Brendan Gregg's collapsed stack format, one `frame;frame;... count` line per stack."""
+        lines = []
+        for (stage, stack), count in sorted(self.samples.items()):
+            frames = [self.tag, f"stage:{stage}"] + list(stack)
+            lines.append(";".join(f.replace(";", ",") for f in frames) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self):
+        """speedscope file with the sampled profile and an evented stage timeline."""
+        frames, index = [], {}
+
+        def frame_id(name):
+            if name not in index:
+                index[name] = len(frames)
+                frames.append({"name": name})
+            return index[name]
+
+        samples, weights = [], []
+        for (stage, stack), count in self.samples.items():
+            samples.append([frame_id(f"stage:{stage}")] + [frame_id(f) for f in stack])
+            weights.append(count * self.interval)
+
+        stage_events = [{"type": kind, "at": at, "frame": frame_id(f"stage:{name}")}
+                        for at, kind, name in self.events]
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.tag,
+            "exporter": "ReceptoNLP profiler",
+            "shared": {"frames": frames},
+            "profiles": [
+                {"type": "sampled", "name": f"{self.tag} samples", "unit": "seconds",
+                 "startValue": 0, "endValue": sum(weights), "samples": samples, "weights": weights},
+                {"type": "evented", "name": f"{self.tag} stages", "unit": "seconds",
+                 "startValue": 0, "endValue": self.duration, "events": stage_events},
+            ],
+        }
+
+    def write(self, directory=PROFILE_DIR, fmt=PROFILE_FORMAT):
+        """Writes the profile files and returns their paths."""
+        os.makedirs(directory, exist_ok=True)
+        safe_tag = re.sub(r"[^A-Za-z0-9_.-]+", "_", self.tag)[:80]
+        # pid + sequence keep concurrent profiles of the same persona apart
+        base = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_sequence)}-{safe_tag}")
+        paths = []
+        if fmt in ("speedscope", "both"):
+            with open(base + ".speedscope.json", "w", encoding="utf-8") as f:
+                json.dump(self.speedscope(), f)
+            paths.append(base + ".speedscope.json")
+        if fmt in ("collapsed", "both"):
+            with open(base + ".collapsed.txt", "w", encoding="utf-8") as f:
+                f.write(self.collapsed())
+            paths.append(base + ".collapsed.txt")
+        return paths
+
+
+class _Profiled:
+    def __init__(self, tag):
+        self.profiler = SamplingProfiler(tag=tag)
+        self.paths = []
+
+    def __enter__(self):
+        self.profiler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.stop()
+        try:
+            self.paths = self.profiler.write()
+            print(f"Profile of {self.profiler.tag} ({self.profiler.duration:.1f}s, "
+                  f"{sum(self.profiler.samples.values())} samples): {', '.join(self.paths)}")
+        except OSError as e:
+            print(f"Could not write profile for {self.profiler.tag}: {e}")
+        return False
+
+
+class _NotProfiled:
+    paths = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOT_PROFILED = _NotProfiled()
+
+
+def profile_request(persona_id, enabled=None):
+    """
+    Profiles the enclosed block when `enabled` (default: PROFILE_REQUESTS) is true.
+
+    The yielded handle's `paths` lists the written files once the block exits.
+    """
+    if not (ENABLED if enabled is None else enabled):
+        return _NOT_PROFILED
+    return _Profiled(f"persona:{persona_id}")
@@ -0,0 +1,266 @@
+"""
+Circuit breakers and a shared retry budget for the upstream services.
+
+Each upstream (google_cse, linkedin, tavily, azure_openai, image_cdn) has a
+circuit breaker. After BREAKER_FAILURES consecutive failures it opens. While
+it is open, calls fail at once with `CircuitOpen` and the pipeline skips the
+source. After BREAKER_RESET seconds one trial call is let through (half open):
+it closes the breaker on success and reopens it on failure.
+
+Retries of all upstreams draw from one budget. Over the last RETRY_WINDOW
+seconds, retries may add at most RETRY_RATIO of the first attempts, plus
+RETRY_MIN_PER_WINDOW so that a quiet process can still retry. When an
+upstream degrades, personas fail over to the next source instead of each one
+running its full retry schedule against it. Backoff is jittered
+("full jitter"), capped at RETRY_BACKOFF_CAP, and skipped when the retry
+would overrun the request deadline.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import deadline
+import metrics
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "30"))
+RETRY_RATIO = float(os.getenv("RETRY_RATIO", "0.2"))
+RETRY_MIN_PER_WINDOW = int(os.getenv("RETRY_MIN_PER_WINDOW", "10"))
+RETRY_WINDOW = float(os.getenv("RETRY_WINDOW", "60"))
+RETRY_BACKOFF_CAP = float(os.getenv("RETRY_BACKOFF_CAP", "8"))
+
+_random = random.Random()
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+    def __init__(self, upstream, retry_in):
+        super().__init__(f"{upstream} circuit open, next trial in {retry_in:.0f}s")
+        self.upstream = upstream
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Args:
+        name: Upstream name, as used in metrics
+        failures: Consecutive failures that open the breaker
+        reset_after: Seconds before an open breaker lets a trial call through
+    """
+
+    def __init__(self, name, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET):
+        self.name = name
+        self.failures = failures
+        self.reset_after = reset_after
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raises CircuitOpen unless the call may go ahead."""
+        with self._lock:
+            if self.state == "closed":
+                return
+            retry_in = self.opened_at + self.reset_after - time.monotonic()
+            if self.state == "open" and retry_in <= 0:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return
+        metrics.inc("circuit_breaker_rejections_total", upstream=self.name)
+        raise CircuitOpen(self.name, max(retry_in, 0.0))
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self._trial_running = False
+            if self.state != "closed":
+                print(f"Circuit breaker for {self.name} closed again.")
+                self.state = "closed"
+                metrics.set_gauge("circuit_breaker_open", 0, upstream=self.name)
+
+    def release(self):
+        """Ends a call that says nothing about the upstream's health (e.g. cut short by the deadline)."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            reopen = self.state == "half_open"
+            self._trial_running = False
+            if reopen or (self.state == "closed" and self.consecutive_failures >= self.failures):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                print(f"Circuit breaker for {self.name} opened after {self.consecutive_failures} failures; "
+                      f"skipping it for {self.reset_after:.0f}s.")
+                metrics.inc("circuit_breaker_opened_total", upstream=self.name)
+                metrics.set_gauge("circuit_breaker_open", 1, upstream=self.name)
+
+    @property
+    def is_open(self):
+        return self.state != "closed"
+
+
+class RetryBudget:
+    """Retries allowed as a fraction of the first attempts over a sliding window."""
+
+    def __init__(self, ratio=RETRY_RATIO, min_per_window=RETRY_MIN_PER_WINDOW, window=RETRY_WINDOW):
+        self.ratio = ratio
+        self.min_per_window = min_per_window
+        self.window = window
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        for times in (self._requests, self._retries):
+            while times and now - times[0] > self.window:
+                times.popleft()
+
+    def record_request(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_retry(self):
+        """Takes one retry from the budget; False when it is spent."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if len(self._retries) >= self.min_per_window + self.ratio * len(self._requests):
+                return False
+            self._retries.append(now)
+            return True
+
+
+budget = RetryBudget()
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(name):
+    """The circuit breaker of upstream `name` (created on first use)."""
+    found = _breakers.get(name)
+    if found is None:
+        with _breakers_lock:
+            found = _breakers.setdefault(name, CircuitBreaker(name))
+    return found
+
+
+def _status_code(error):
+    status = getattr(error, "status_code", None)  # openai.APIStatusError
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_failure(error):
+    """
+    Whether an exception says the upstream is unhealthy.
+
+    Client errors (404 and the like) are answers, not failures. A timeout cut
+    short by the request deadline says nothing about the upstream either.
+    """
+    if not isinstance(error, Exception) or isinstance(error, (CircuitOpen, deadline.DeadlineExceeded)):
+        return False
+    status = _status_code(error)
+    if status is not None:
+        return status >= 500 or status == 429
+    current = deadline.current()
+    if current is not None and current.exhausted:
+        return False
+    return True
+
+
+@contextmanager
+def guarded(name, retry=False):
+    """
+    Runs one call to upstream `name` through its circuit breaker.
+
+    Raises CircuitOpen without running the block while the breaker is open.
+    The outcome of the block is recorded on the breaker; `retry=True` marks a
+    repeated attempt, which does not count as a new request for the budget.
+    """
+    circuit = breaker(name)
+    circuit.before_call()
+    if not retry:
+        budget.record_request()
+    try:
+        yield circuit
+    except BaseException as e:
+        if is_failure(e):
+            circuit.record_failure()
+        elif _status_code(e) is not None:
+            # The upstream answered, just not with what we wanted
+            circuit.record_success()
+        else:
+            circuit.release()
+        raise
+    circuit.record_success()
+
+
+def backoff(attempt, base=1.0, cap=RETRY_BACKOFF_CAP):
+    """Full-jitter backoff before retry number `attempt` (0-based): uniform in [0, min(cap, base * 2**attempt)]."""
+    return _random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_allowed(name):
+    """
+    True when upstream `name` may be retried: its breaker is closed and the shared budget has room.
+    """
+    if breaker(name).is_open:
+        return False
+    if not budget.try_retry():
+        metrics.inc("retry_budget_exhausted_total", upstream=name)
+        print(f"Retry budget exhausted, not retrying {name}.")
+        return False
+    metrics.inc("upstream_retries_total", upstream=name)
+    return True
+
+
+def wait_before_retry(name, attempt, base=1.0):
+    """
+    Checks the budget and sleeps a jittered backoff before retrying `name`.
+
+    Returns:
+        bool: False when the retry should not happen (breaker open, budget spent,
+        or the backoff would overrun the request deadline)
+    """
+    delay = backoff(attempt, base)
+    if not deadline.allows(delay):
+        return False
+    if not retry_allowed(name):
+        return False
+    time.sleep(delay)
+    return True
+
+
+def call(name, fn, attempts=3, base=1.0):
+    """
+    Calls `fn()` against upstream `name` with breaker, budget and jittered backoff.
+
+    Exceptions that are not upstream failures (see `is_failure`) are raised at once.
+    """
+    for attempt in range(attempts):
+        try:
+            with guarded(name, retry=attempt > 0):
+                return fn()
+        except Exception as e:
+            if not is_failure(e) or attempt == attempts - 1 or not wait_before_retry(name, attempt, base):
+                raise
+
+
+def status():
+    """Breaker states by upstream, for /worker."""
+    return {name: {"state": circuit.state, "consecutive_failures": circuit.consecutive_failures}
+            for name, circuit in sorted(_breakers.items())}
@@ -0,0 +1,199 @@
+"""
+Persona-level result cache in front of `find_best_linkedin_match`.
+
+Results are keyed by a fingerprint of the persona. It ignores `id`, key order,
+empty fields, runs of whitespace and cosmetic URL differences (scheme, `www.`,
+trailing slashes, tracking parameters). A resubmitted persona is answered from
+a SQLite table in about a millisecond instead of rerunning enrichment, search,
+scraping and scoring.
+
+- Within RESULT_CACHE_TTL seconds a result is fresh and returned as is.
+- For RESULT_CACHE_STALE seconds after that it is returned at once while a
+  background thread recomputes it (stale-while-revalidate).
+- Later it is a miss.
+- "No match" results use the shorter RESULT_CACHE_NEGATIVE_TTL, since they are
+  often caused by a failing upstream.
+- Partial (deadline) results are never stored.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import metrics
+
+ENABLED = os.getenv("RESULT_CACHE", "1").lower() in ("1", "true", "yes")
+DEFAULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join(".cache", "results.sqlite"))
+TTL = float(os.getenv("RESULT_CACHE_TTL", str(24 * 3600)))
+STALE = float(os.getenv("RESULT_CACHE_STALE", str(6 * 24 * 3600)))
+NEGATIVE_TTL = float(os.getenv("RESULT_CACHE_NEGATIVE_TTL", "3600"))
+
+# Persona fields that do not change the match
+_IGNORED_FIELDS = {"id"}
+# Query parameters that never change what a URL points to
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|trk\w*|ref|refid|fbclid|gclid|originalSubdomain)$", re.IGNORECASE)
+_URL = re.compile(r"^(https?://|www\.)", re.IGNORECASE)
+
+
+def canonical_url(url):
+    """Lowercase host without `www.`, https, no fragment, tracking parameters or trailing slash."""
+    if not re.match(r"^https?://", url, re.IGNORECASE):
+        url = "https://" + url
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _TRACKING_PARAMS.match(k))
+    return urlunsplit(("https", host, parts.path.rstrip("/"), urlencode(query), ""))
+
+
+def _canonical(value):
+    if isinstance(value, dict):
+        items = ((str(k).strip(), _canonical(v)) for k, v in value.items() if str(k).strip() not in _IGNORED_FIELDS)
+        return {k: v for k, v in sorted(items) if v not in (None, "", [], {})}
+    if isinstance(value, (list, tuple)):
+        return [v for v in (_canonical(v) for v in value) if v not in (None, "", [], {})]
+    if isinstance(value, str):
+        text = " ".join(unicodedata.normalize("NFKC", value).split())
+        return canonical_url(text) if _URL.match(text) and " " not in text else text
+    return value
+
+
+def persona_fingerprint(persona, **options):
+    """
+    Stable hash of the persona fields that decide the match.
+
+    `options` (e.g. cascade=False) are part of the key, because they change the result.
+    """
+    canonical = {"persona": _canonical(persona or {}), "options": options}
+    payload = json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Args:
+        cache_path: SQLite file (None = in-memory only)
+        ttl: Seconds a result is fresh
+        stale: Seconds after `ttl` during which the stale result is served while it is recomputed
+        negative_ttl: Freshness of "no match" results
+        refresh_workers: Background threads recomputing stale results
+    """
+
+    def __init__(self, cache_path=DEFAULT_CACHE_PATH, ttl=TTL, stale=STALE, negative_ttl=NEGATIVE_TTL,
+                 refresh_workers=1):
+        self.ttl = ttl
+        self.stale = stale
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._refresh_pool = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="result-refresh")
+
+        if cache_path and os.path.dirname(cache_path):
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self._db = sqlite3.connect(cache_path or ":memory:", check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS results ("
+                         "fingerprint TEXT PRIMARY KEY, result TEXT, created_at REAL, fresh_until REAL, "
+                         "stale_until REAL)")
+        self._db.execute("DELETE FROM results WHERE stale_until < ?", (time.time(),))
+        self._db.commit()
+
+    def get(self, fingerprint):
+        """
+        Returns (result, state) with state "fresh", "stale" or "miss" (result None).
+        """
+        with self._lock:
+            row = self._db.execute("SELECT result, created_at, fresh_until, stale_until FROM results "
+                                   "WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        now = time.time()
+        if row is None or now >= row[3]:
+            metrics.cache_lookup("result", False)
+            return None, "miss"
+        metrics.cache_lookup("result", True)
+        result = json.loads(row[0])
+        state = "fresh" if now < row[2] else "stale"
+        result["cached"] = {"age_seconds": round(now - row[1], 1), "stale": state == "stale"}
+        return result, state
+
+    def put(self, fingerprint, result):
+        """Stores a finished result; partial and failed results are skipped."""
+        if not isinstance(result, dict) or result.get("partial") or "error" in result:
+            return
+        stored = {k: v for k, v in result.items() if k not in ("cached", "profile")}
+        now = time.time()
+        fresh = self.ttl if stored.get("linkedin_url") else min(self.ttl, self.negative_ttl)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                             (fingerprint, json.dumps(stored, ensure_ascii=False), now, now + fresh,
+                              now + fresh + self.stale))
+            self._db.commit()
+
+    def invalidate(self, fingerprint=None):
+        """Drops one result, or all of them."""
+        with self._lock:
+            if fingerprint is None:
+                self._db.execute("DELETE FROM results")
+            else:
+                self._db.execute("DELETE FROM results WHERE fingerprint = ?", (fingerprint,))
+            self._db.commit()
+
+    def refresh(self, fingerprint, compute):
+        """Recomputes a stale result in the background, once per fingerprint at a time."""
+        with self._lock:
+            if fingerprint in self._refreshing:
+                return
+            self._refreshing.add(fingerprint)
+
+        def run():
+            try:
+                self.put(fingerprint, compute())
+            except Exception as e:
+                print(f"Refreshing cached result {fingerprint[:12]} failed: {type(e).__name__} - {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(fingerprint)
+
+        self._refresh_pool.submit(run)
+
+    def lookup(self, fingerprint, recompute):
+        """`get()`, also starting a background `recompute()` when the result is stale."""
+        result, state = self.get(fingerprint)
+        if state == "stale":
+            self.refresh(fingerprint, recompute)
+        return result
+
+    def get_or_compute(self, fingerprint, compute, bypass=False, recompute=None):
+        """
+        Cached result for `fingerprint`, computing (and storing) it on a miss.
+
+        With `bypass=True` the lookup is skipped but the new result is stored.
+        `recompute` refreshes stale results in the background (default: `compute`).
+        """
+        if not bypass:
+            result = self.lookup(fingerprint, recompute or compute)
+            if result is not None:
+                return result
+        result = compute()
+        self.put(fingerprint, result)
+        return result
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Shared cache using RESULT_CACHE_PATH."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
@@ -1,46 +1,713 @@
 from agent.preprocess import enrich_profile_json, update_intro_with_search, find_linkedin_profiles_by_tavily
-from scrappers.combine import search_profiles_from_json, get_profiles_details
+from scrappers.combine import search_profiles_from_json, get_profiles_details_by_url
+from scrappers.prefilter import prefilter_candidates, name_match_score, name_tokens
+from scrappers.transform import iter_raw_profiles
+from scrappers.name_index import get_name_index
+from scrappers.store import ProfileStore
 from confidenceScore.profile_compare import get_embedding, VGG16ImageComparer, llm_validation, confidence_score
-from agent.models import llm
+from confidenceScore.profile_compare import get_embeddings, cached_embedder, preprocess_text
+from confidenceScore.profile_compare import warmup as warmup_models, recombine_confidence
+from confidenceScore.structured import rank_candidates
+from agent.models import get_llm
+from agent.preprocess import get_tavily
+from jobqueue import check_cancelled
+from deadline import DeadlineExceeded, request_scope, reserve as reserve_deadline, current as current_deadline
+from metrics import stage, inc
+from profiler import profile_request
+from result_cache import get_result_cache, persona_fingerprint
+from history import get_history
+from vector_index import get_profile_index
+import deadline
+import memory
+import metrics
+import profiler
+import result_cache
+import vector_index
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import argparse
+import asyncio
+import json
 import os
+import traceback
 
 load_dotenv()
 
-imgComparer = VGG16ImageComparer()
+imgComparer = VGG16ImageComparer()  # VGG16 weights load on first use or in warmup()
+memory.budget.register_evictor("images", imgComparer.evict)
 null = None
+# Share of a request deadline kept free for scoring while candidates are scraped
+DEADLINE_SCORING_SHARE = float(os.getenv("DEADLINE_SCORING_SHARE", "0.25"))
+# A local candidate scoring at least this is accepted without calling the search APIs
+LOCAL_MATCH_CONFIDENCE = float(os.getenv("LOCAL_MATCH_CONFIDENCE", "0.8"))
+LOCAL_CANDIDATES = int(os.getenv("LOCAL_CANDIDATES", "5"))
+# Name-match score (see scrappers/prefilter.py) a local candidate needs
+LOCAL_NAME_MATCH = 0.5
 
-def find_best_linkedin_match(persona: dict):
-    search_persona = enrich_profile_json(llm, persona)
-    final_persona = update_intro_with_search(search_persona)
-    print(f"Final persona which we'll be used for Confidence Score Evaluation: \n{final_persona}")
-    google_json_urls = search_profiles_from_json(search_persona, max_results=4)
-    tavliy_urls = find_linkedin_profiles_by_tavily(search_persona)
-    linkedin_urls = list(set(tavliy_urls + google_json_urls))
-    print(f"Total {len(linkedin_urls)} urls were found by Google Json({len(google_json_urls)}) + Tavily ({len(tavliy_urls)})")
-    nth_personas = get_profiles_details(linkedin_urls)
-    confidence_scores = []
-    
-    for ith_persona in nth_personas:
-        cf = confidence_score(final_persona, ith_persona, get_embedding, imgComparer, llm_validation, llm)
-        confidence_scores.append(cf)
-
-    if confidence_scores:
-        conf_values = [
-            float(score['overall_confidence'].split()[0]) 
-            for score in confidence_scores
-        ]
-        max_index = conf_values.index(max(conf_values))
-        best_match_url = linkedin_urls[max_index]
-        best_confidence = conf_values[max_index]
-        return {
+def warmup() -> dict:
+    """
+    Loads every heavy model and client up front instead of on the first persona.
+
+    Returns:
+        dict: component -> load time in seconds
+    """
+    import time
+    timings = warmup_models(imgComparer)
+    for name, load in (("llm_client", get_llm), ("tavily_client", get_tavily)):
+        start = time.perf_counter()
+        load()
+        timings[name] = time.perf_counter() - start
+    return timings
+
+def profile_startup(top: int = 15) -> None:
+    """
+    Prints what importing `run` costs per module (via `python -X importtime`) and
+    how long each lazily loaded model takes in warmup().
+    """
+    import subprocess
+    import sys
+    import time
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import run"],
+                          capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((int(parts[1]), int(parts[0].split(":")[1]), parts[2].rstrip()))
+    total = max((cumulative for cumulative, _, name in rows if name.strip() == "run"), default=0)
+    print(f"Importing run: {total / 1e6:.2f}s")
+    print(f"{'cumulative':>11} {'self':>9}  module")
+    for cumulative, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative / 1e6:>10.3f}s {self_us / 1e6:>8.3f}s  {name}")
+
+    start = time.perf_counter()
+    timings = warmup()
+    print(f"\nwarmup(): {time.perf_counter() - start:.2f}s")
+    for name, seconds in timings.items():
+        print(f"  {name:<22} {seconds:.2f}s")
+
+def _score_candidates(final_persona: dict, candidates: dict, cascade: bool = True, cancel_event=None,
+                      embedder=get_embedding) -> dict:
+    """
+    Scores scraped candidates (URL -> profile) against the persona and returns the best match.
+
+    Candidates are scored in order of their cheap structured similarity, so the likely
+    match usually comes first. When the
+    request deadline runs out, the best of the candidates scored so far is returned
+    with `partial` set.
+    """
+    best = None
+    best_so_far = None
+    scored = 0
+    deadline_hit = None
+
+    ranking = rank_candidates(final_persona, candidates)
+    if ranking:
+        print("Structured ranking: " + ", ".join(f"{url} ({score:.2f})" for url, score in ranking))
+
+    try:
+        for url, structured_score in ranking:
+            check_cancelled(cancel_event, "scoring")
+            with stage("confidence_score"):
+                cf = confidence_score(final_persona, candidates[url], embedder, imgComparer, llm_validation, get_llm(),
+                                      cascade=cascade, structured_score=structured_score)
+            scored += 1
+            overall = float(cf['overall_confidence'].split()[0])
+            if best_so_far is None or overall > best_so_far:
+                best_so_far = overall
+                best = (url, cf)
+    except DeadlineExceeded as e:
+        deadline_hit = e
+        print(f"{e}; returning the best of {scored}/{len(ranking)} scored candidates.")
+
+    if best:
+        best_match_url, best_confidence = best
+        result = {
             "linkedin_url": best_match_url,
-            "confidence_score": confidence_scores[max_index]
+            "confidence_score": best_confidence
         }
     else:
-        return {
+        result = {
             "linkedin_url": None,
             "confidence_score": 0.0
         }
+    if deadline_hit is not None:
+        result.update(_partial(deadline_hit, scored=scored, candidates=len(ranking)))
+    return result
+
+def _partial(error: DeadlineExceeded, **progress) -> dict:
+    """Fields flagging a result cut short by the request deadline."""
+    inc("deadline_exceeded_total", at=error.what or "unknown")
+    return {"partial": True, "partial_reason": str(error), **progress}
+
+def _find_candidate_urls(search_persona: dict, search_cache: dict = None) -> list:
+    search_titles = {}
+    google_json_urls = search_profiles_from_json(search_persona, max_results=4, titles=search_titles,
+                                                 search_cache=search_cache)
+    tavliy_urls = find_linkedin_profiles_by_tavily(search_persona, titles=search_titles, search_cache=search_cache)
+    linkedin_urls = list(set(tavliy_urls + google_json_urls))
+    print(f"Total {len(linkedin_urls)} urls were found by Google Json({len(google_json_urls)}) + Tavily ({len(tavliy_urls)})")
+    linkedin_urls, _ = prefilter_candidates(linkedin_urls, (search_persona or {}).get("name"), search_titles)
+    return linkedin_urls
+
+# ----------------- LOCAL CANDIDATES -----------------
+def _overall(result: dict) -> float:
+    cf = (result or {}).get("confidence_score")
+    return float(cf["overall_confidence"].split()[0]) if isinstance(cf, dict) else 0.0
+
+def _local_candidates(final_persona: dict, embedder=get_embedding) -> dict:
+    """
+    Previously scraped profiles near the persona (URL -> profile).
+
+    The persona's intro and image are looked up in the vector index, and its name
+    and companies in the name index (see scrappers/name_index.py). Profiles whose
+    name does not match the persona's are dropped.
+    """
+    if not vector_index.ENABLED:
+        return {}
+    original = final_persona.get("original_keys") or {}
+    text = preprocess_text(original.get("intro"))
+    image = original.get("image")
+    name = final_persona.get("name")
+    try:
+        with stage("local_lookup"):
+            index = get_profile_index()
+            hits = index.query(k=LOCAL_CANDIDATES, text=embedder(text) if text else None,
+                               image=imgComparer.features_for(image, save_as="img1") if image else None)
+            block = get_name_index().block(name, final_persona.get("company_names") or [], limit=LOCAL_CANDIDATES)
+            urls = list(dict.fromkeys([url for url, _ in hits] + [url for url, _ in block]))
+            profiles = index.profiles(urls)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"Local index lookup failed: {type(e).__name__} - {e}")
+        return {}
+    matching = [url for url in urls if url in profiles
+                and name_match_score(name, name_tokens(profiles[url].get("name"))) >= LOCAL_NAME_MATCH]
+    if urls:
+        print(f"Local index: {len(matching)}/{len(urls)} known profiles ({len(hits)} nearby, {len(block)} by name) "
+              f"match the name {name!r}.")
+    return {url: profiles[url] for url in matching[:LOCAL_CANDIDATES]}
+
+def index_profiles(profiles_by_url: dict, embedder=get_embedding) -> None:
+    """
+    Adds scraped profiles (URL -> profile) to the name index and to the vector index,
+    with their summary embedding and, when scoring already computed them, their image features.
+    """
+    if not vector_index.ENABLED or not profiles_by_url:
+        return
+    try:
+        with stage("index_profiles"):
+            items = []
+            for url, profile in profiles_by_url.items():
+                text = preprocess_text(profile.get("summary", ""))
+                items.append((url, profile, {"text": embedder(text) if text else None,
+                                             "image": imgComparer.features.get(profile.get("image"))}))
+            get_profile_index().add_many(items)
+            get_name_index().add_profiles(profiles_by_url)
+    except Exception as e:
+        print(f"Indexing {len(profiles_by_url)} profiles failed: {type(e).__name__} - {e}")
+
+def index_profile_dump(path: str, batch_size: int = 256) -> int:
+    """
+    Adds saved profiles to the local indexes: a profile store written by
+    `save_profiles_to_file` (.sqlite), or a JSON array or JSONL dump. Summaries
+    and images are embedded in shared batches.
+
+    Returns:
+        int: Number of profiles indexed
+    """
+    total = 0
+    batch = []
+
+    def flush():
+        embedder = cached_embedder(get_embeddings(preprocess_text(p.get("summary", "")) for p in batch))
+        imgComparer.precompute_features(p.get("image") for p in batch)
+        index_profiles({p["url"]: p for p in batch}, embedder=embedder)
+        imgComparer.evict()
+        batch.clear()
+
+    if path.endswith((".sqlite", ".db")):
+        profiles = ({**profile, "url": url} for url, profile in ProfileStore(path).iter_profiles())
+    else:
+        profiles = iter_raw_profiles(path)
+    for profile in profiles:
+        if isinstance(profile, dict) and profile.get("url"):
+            batch.append(profile)
+            total += 1
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    print(f"Indexed {total} profiles from {path}.")
+    return total
+
+def find_best_linkedin_match(persona: dict, cascade: bool = True, cancel_event=None, profile: bool = None,
+                             deadline: float = None, bypass_cache: bool = False):
+    """
+    Finds the LinkedIn profile that best matches `persona`.
+
+    With `profile=True` (or PROFILE_REQUESTS=1) the request is sampled and a
+    flamegraph-ready profile is written to PROFILE_DIR (see profiler.py).
+
+    `deadline` (seconds, default PERSONA_DEADLINE; 0 = none) bounds the whole
+    request: every search, scrape, image and LLM call gets the time that is
+    left as its timeout. Once it runs out, the best match among the candidates
+    scored so far is returned with `"partial": true` (see deadline.py).
+
+    Previously scraped profiles close to the persona in the local vector index
+    (see vector_index.py) are scored first. When one reaches LOCAL_MATCH_CONFIDENCE
+    it is returned with `"candidate_source": "local_index"` and the search APIs are
+    not called.
+
+    Results are cached by persona fingerprint (see result_cache.py); a cached
+    result carries a `cached` field. `bypass_cache=True` (and profiling) skips
+    the lookup and stores the new result.
+    """
+    if not result_cache.ENABLED:
+        return _match_persona(persona, cascade, cancel_event, profile, deadline)
+    return get_result_cache().get_or_compute(
+        persona_fingerprint(persona, cascade=cascade),
+        lambda: _match_persona(persona, cascade, cancel_event, profile, deadline),
+        bypass=bypass_cache or bool(profile if profile is not None else profiler.ENABLED),
+        recompute=lambda: _match_persona(persona, cascade, None, False, deadline),
+    )
+
+def cached_match(persona: dict, cascade: bool = True):
+    """
+    The cached result for `persona`, or None; a stale one is returned and refreshed in the background.
+    """
+    if not result_cache.ENABLED:
+        return None
+    return get_result_cache().lookup(persona_fingerprint(persona, cascade=cascade),
+                                     lambda: _match_persona(persona, cascade, None, False, None))
+
+def _match_persona(persona: dict, cascade: bool, cancel_event, profile, deadline):
+    persona_tag = (persona or {}).get("id") or (persona or {}).get("name") or "unknown"
+    with profile_request(persona_tag, enabled=profile) as profiled, request_scope(deadline):
+        try:
+            result = _find_best_linkedin_match(persona, cascade=cascade, cancel_event=cancel_event)
+        except DeadlineExceeded as e:
+            # Ran out before any candidate could be scored
+            print(f"{e}; no candidate was scored.")
+            result = {"linkedin_url": None, "confidence_score": 0.0, **_partial(e)}
+    if profiled.paths and isinstance(result, dict):
+        result["profile"] = profiled.paths
+    return result
+
+def _find_best_linkedin_match(persona: dict, cascade: bool = True, cancel_event=None):
+    with stage("total"):
+        with stage("enrich"):
+            search_persona = enrich_profile_json(get_llm(), persona)
+        check_cancelled(cancel_event, "search")
+        with stage("intro_search"):
+            final_persona = update_intro_with_search(search_persona)
+        print(f"Final persona which we'll be used for Confidence Score Evaluation: \n{final_persona}")
+        local_result = None
+        local = _local_candidates(final_persona)
+        if local:
+            with stage("scoring", source="local"):
+                local_result = _score_candidates(final_persona, local, cascade=cascade, cancel_event=cancel_event)
+            if local_result.get("partial") or _overall(local_result) >= LOCAL_MATCH_CONFIDENCE:
+                inc("local_matches_total")
+                print(f"Matched from the vector index ({_overall(local_result):.4f}); skipping search.")
+                return {**local_result, "candidate_source": "local_index"}
+        check_cancelled(cancel_event, "search")
+        with stage("search"):
+            # Local candidates were scored already
+            linkedin_urls = [url for url in _find_candidate_urls(search_persona) if url not in local]
+        check_cancelled(cancel_event, "scraping")
+        # Scraping stops early enough to leave part of the deadline for scoring
+        current = current_deadline()
+        with stage("scrape"), \
+                reserve_deadline(current.seconds * DEADLINE_SCORING_SHARE if current else 0) as scrape_deadline:
+            nth_personas = get_profiles_details_by_url(linkedin_urls, cancel_event=cancel_event)
+        with stage("scoring"):
+            result = _score_candidates(final_persona, nth_personas, cascade=cascade, cancel_event=cancel_event)
+        index_profiles(nth_personas)
+        if local_result is not None and _overall(local_result) > _overall(result):
+            # A local candidate beat everything the search found
+            result = {**result, "linkedin_url": local_result["linkedin_url"],
+                      "confidence_score": local_result["confidence_score"]}
+        if scrape_deadline is not None and scrape_deadline.exhausted and not result.get("partial") \
+                and len(nth_personas) < len(linkedin_urls):
+            # Scored everything that was scraped, but scraping itself was cut short
+            result.update(_partial(DeadlineExceeded("scraping all candidates"),
+                                   scored=len(nth_personas), candidates=len(linkedin_urls)))
+        return result
+
+null=None
+
+
+# ----------------- RE-VERIFICATION -----------------
+def reverify_linkedin_match(persona_id: str, persona: dict, cancel_event=None, history=None) -> dict:
+    """
+    Re-verifies a persona against its match history (see history.py).
+
+    Candidates are rediscovered only for new personas or when the persona's fields
+    changed. Only pages older than HISTORY_PAGE_TTL are rescraped, and a candidate
+    is rescored only when the persona or its page changed; otherwise its stored
+    component scores are recombined into `overall_confidence`. Rescored candidates
+    get every component (no cascade) so that later runs can recombine them.
+    """
+    history = history or get_history()
+    fingerprint = persona_fingerprint(persona)
+    record = history.persona(persona_id)
+    stats = {"rediscovered": False, "rescraped": 0, "rescored": 0, "reused": 0}
+
+    with stage("total", mode="reverify"):
+        if record is None or record.fingerprint != fingerprint:
+            stats["rediscovered"] = True
+            with stage("enrich", mode="reverify"):
+                search_persona = enrich_profile_json(get_llm(), persona)
+            if not search_persona:
+                raise ValueError("Persona enrichment failed")
+            check_cancelled(cancel_event, "search")
+            with stage("intro_search", mode="reverify"):
+                final_persona = update_intro_with_search(search_persona)
+            with stage("search", mode="reverify"):
+                linkedin_urls = _find_candidate_urls(search_persona)
+        else:
+            final_persona, linkedin_urls = record.final_persona, record.candidate_urls
+
+        pages = history.pages(linkedin_urls)
+        stale = [url for url in linkedin_urls if history.is_stale(pages.get(url))]
+        if stale:
+            check_cancelled(cancel_event, "scraping")
+            with stage("scrape", mode="reverify"):
+                rescraped = get_profiles_details_by_url(stale, cancel_event=cancel_event)
+            history.put_pages(rescraped)
+            index_profiles(rescraped)
+            # A page that could not be rescraped keeps its previous version
+            pages = history.pages(linkedin_urls)
+        stats["rescraped"] = len(stale)
+
+        stored_scores = history.scores(persona_id)
+        best = None
+        with stage("scoring", mode="reverify"):
+            candidates = {url: page.profile for url, page in pages.items()}
+            for url, structured_score in rank_candidates(final_persona, candidates):
+                check_cancelled(cancel_event, "scoring")
+                stored = stored_scores.get(url)
+                if stored and stored.fingerprint == fingerprint and stored.content_hash == pages[url].content_hash:
+                    cf = recombine_confidence(stored.scores)
+                    stats["reused"] += 1
+                else:
+                    with stage("confidence_score"):
+                        cf = confidence_score(final_persona, candidates[url], get_embedding, imgComparer,
+                                              llm_validation, get_llm(), cascade=False,
+                                              structured_score=structured_score)
+                    history.put_score(persona_id, url, fingerprint, pages[url].content_hash, cf)
+                    stats["rescored"] += 1
+                overall = float(cf['overall_confidence'].split()[0])
+                if best is None or overall > best[0]:
+                    best = (overall, url, cf)
+
+    result = {
+        "linkedin_url": best[1] if best else None,
+        "confidence_score": best[2] if best else 0.0,
+    }
+    history.put_persona(persona_id, fingerprint, final_persona, linkedin_urls, result)
+    print(f"Re-verified {persona_id}: {stats['rescraped']}/{len(linkedin_urls)} pages rescraped, "
+          f"{stats['rescored']} candidates rescored, {stats['reused']} reused"
+          + (" (candidates rediscovered)" if stats["rediscovered"] else ""))
+    return {**result, "reverified": stats}
+
+
+# ----------------- BULK MODE -----------------
+def iter_bulk_matches(personas, cascade: bool = True, cancel_event=None):
+    """
+    Matches many personas together, sharing work across them.
+
+    Identical Google/Tavily queries run once, every distinct candidate URL is
+    scraped once, and all text and image embeddings are computed in shared
+    batched forward passes before scoring. Yields `(persona_id, result)` per
+    persona; items can be persona dicts or `(persona_id, persona)` pairs.
+    """
+    search_cache = {}
+    prepared = []
+    requested_urls = 0
+
+    for persona_id, persona in _with_ids(personas):
+        check_cancelled(cancel_event, "search")
+        try:
+            with stage("enrich", mode="bulk"):
+                search_persona = enrich_profile_json(get_llm(), persona)
+            if not search_persona:
+                raise ValueError("Persona enrichment failed")
+            with stage("intro_search", mode="bulk"):
+                final_persona = update_intro_with_search(search_persona, search_cache=search_cache)
+            with stage("search", mode="bulk"):
+                linkedin_urls = _find_candidate_urls(search_persona, search_cache=search_cache)
+            requested_urls += len(linkedin_urls)
+            prepared.append((persona_id, final_persona, linkedin_urls))
+        except Exception as e:
+            traceback.print_exc()
+            yield persona_id, {"error": f"{type(e).__name__}: {e}"}
+
+    unique_urls = list(dict.fromkeys(url for _, _, urls in prepared for url in urls))
+    print(f"Bulk: {len(prepared)} personas, {len(search_cache)} distinct searches, "
+          f"{len(unique_urls)} distinct candidate URLs (instead of {requested_urls}).")
+    check_cancelled(cancel_event, "scraping")
+    with stage("scrape", mode="bulk"):
+        profiles_by_url = get_profiles_details_by_url(unique_urls, cancel_event=cancel_event)
+
+    # Shared forward passes for every text and image that will be compared
+    check_cancelled(cancel_event, "embedding")
+    texts = [preprocess_text((fp.get("original_keys") or {}).get("intro")) for _, fp, _ in prepared]
+    texts += [preprocess_text(profile.get("summary", "")) for profile in profiles_by_url.values()]
+    with stage("precompute", mode="bulk"):
+        embedder = cached_embedder(get_embeddings(texts))
+        images = [(fp.get("original_keys") or {}).get("image") for _, fp, _ in prepared]
+        images += [profile.get("image") for profile in profiles_by_url.values()]
+        imgComparer.precompute_features(images)
+    index_profiles(profiles_by_url, embedder=embedder)
+
+    for persona_id, final_persona, linkedin_urls in prepared:
+        candidates = {url: profiles_by_url[url] for url in linkedin_urls if url in profiles_by_url}
+        try:
+            yield persona_id, _score_candidates(final_persona, candidates, cascade=cascade,
+                                                cancel_event=cancel_event, embedder=embedder)
+        except Exception as e:
+            if cancel_event is not None and cancel_event.is_set():
+                raise
+            traceback.print_exc()
+            yield persona_id, {"error": f"{type(e).__name__}: {e}"}
+
+
+def find_best_linkedin_matches(personas, cascade: bool = True, cancel_event=None) -> list:
+    """List version of `iter_bulk_matches`: `[{"persona_id": ..., "result": ...}, ...]`."""
+    return [{"persona_id": persona_id, "result": result}
+            for persona_id, result in iter_bulk_matches(personas, cascade=cascade, cancel_event=cancel_event)]
+
+
+# ----------------- BATCH MODE -----------------
+def persona_id_of(persona: dict, line_no: int) -> str:
+    """Stable id for a persona: its own `id`/`persona_id` field, else its line number."""
+    for key in ("id", "persona_id"):
+        if persona.get(key) is not None:
+            return str(persona[key])
+    return f"line-{line_no}"
+
+
+def iter_personas_jsonl(path: str):
+    """Streams (persona_id, persona) pairs from a JSONL file without loading it whole."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                persona = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping line {line_no}: invalid JSON")
+                continue
+            if not isinstance(persona, dict):
+                print(f"Skipping line {line_no}: expected a JSON object, got {type(persona).__name__}")
+                continue
+            # Accept both bare personas and {"persona": {...}} like the API body
+            if isinstance(persona.get("persona"), dict):
+                persona = {"id": persona.get("id"), **persona["persona"]}
+            yield persona_id_of(persona, line_no), persona
+
+
+def load_checkpoint(checkpoint_path: str) -> set:
+    """Ids of personas already written to the output by a previous run."""
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def _match_or_error(persona: dict, persona_id: str = None, reverify: bool = False) -> dict:
+    try:
+        if reverify:
+            return reverify_linkedin_match(persona_id, persona)
+        return find_best_linkedin_match(persona)
+    except Exception as e:
+        traceback.print_exc()
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+# ----------------- STREAMING API -----------------
+def _with_ids(personas):
+    """Accepts personas or (persona_id, persona) pairs and yields pairs."""
+    for index, item in enumerate(personas, 1):
+        if isinstance(item, tuple) and len(item) == 2:
+            yield str(item[0]), item[1]
+        else:
+            yield persona_id_of(item, index), item
+
+
+def iter_best_matches(personas, concurrency: int = 4, reverify: bool = False):
+    """
+    Yields `(persona_id, result)` for each persona in completion order.
+
+    Up to `concurrency` personas run through enrichment, search, scraping and
+    scoring at once, so slow upstream calls of one persona overlap with the
+    work of the others. `personas` is consumed lazily (it can be a generator
+    over a huge file): only the in-flight window is held in memory. Items can
+    be persona dicts or `(persona_id, persona)` pairs. A failing persona yields
+    `{"error": ...}` instead of raising. While RSS is over MEMORY_BUDGET_MB no
+    new persona starts until the running ones finish. With `reverify=True` each
+    persona goes through `reverify_linkedin_match` instead.
+    """
+    source = _with_ids(personas)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = {}
+        exhausted = False
+        while True:
+            while not exhausted and len(in_flight) < concurrency:
+                # Over the memory budget: let running personas finish before starting more
+                if in_flight and memory.budget.check():
+                    break
+                try:
+                    persona_id, persona = next(source)
+                except StopIteration:
+                    exhausted = True
+                    break
+                in_flight[pool.submit(_match_or_error, persona, persona_id, reverify)] = persona_id
+            if not in_flight:
+                return
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield in_flight.pop(future), future.result()
+
+
+async def aiter_best_matches(personas, concurrency: int = 4):
+    """
+    Async-iterator variant of `iter_best_matches`.
+
+    `personas` may be a regular or an async iterable. The blocking pipeline runs
+    on a thread pool of `concurrency` workers so the event loop stays free.
+    """
+    loop = asyncio.get_running_loop()
+    if hasattr(personas, "__aiter__"):
+        source = personas.__aiter__()
+        next_item = source.__anext__
+    else:
+        sync_source = iter(personas)
+
+        async def next_item():
+            try:
+                return next(sync_source)
+            except StopIteration:
+                raise StopAsyncIteration
+
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    in_flight = {}
+    index = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(in_flight) < concurrency:
+                try:
+                    item = await next_item()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                index += 1
+                if isinstance(item, tuple) and len(item) == 2:
+                    persona_id, persona = str(item[0]), item[1]
+                else:
+                    persona_id, persona = persona_id_of(item, index), item
+                task = loop.run_in_executor(pool, _match_or_error, persona)
+                in_flight[task] = persona_id
+            if not in_flight:
+                return
+            finished, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                yield in_flight.pop(task), task.result()
+    finally:
+        pool.shutdown(wait=False)
+
+
+def run_batch(input_path: str, output_path: str, workers: int = 4, checkpoint_path: str = None,
+              reverify: bool = False) -> dict:
+    """
+    Runs `find_best_linkedin_match` (or, with `reverify=True`, `reverify_linkedin_match`)
+    over a JSONL file of personas on a bounded worker pool.
+
+    Each result is appended to `output_path` as soon as it completes and its id is
+    recorded in the checkpoint file, so a crashed job can be rerun with the same
+    arguments and will skip everything already finished. Failures are written
+    with an `error` field and retried on the next run.
+
+    Returns:
+        dict: counts of processed, skipped (already done) and failed personas
+    """
+    checkpoint_path = checkpoint_path or f"{output_path}.checkpoint"
+    done = load_checkpoint(checkpoint_path)
+    stats = {"processed": 0, "skipped": 0, "failed": 0}
+    if done:
+        print(f"Resuming: {len(done)} personas already completed according to {checkpoint_path}")
+
+    def pending():
+        for persona_id, persona in iter_personas_jsonl(input_path):
+            if persona_id in done:
+                stats["skipped"] += 1
+                continue
+            done.add(persona_id)
+            yield persona_id, persona
+
+    with open(output_path, "a", encoding="utf-8") as out, \
+            open(checkpoint_path, "a", encoding="utf-8") as ckpt:
+        for persona_id, result in iter_best_matches(pending(), concurrency=workers, reverify=reverify):
+            out.write(json.dumps({"persona_id": persona_id, "result": result}, ensure_ascii=False) + "\n")
+            out.flush()
+            if "error" in result:
+                # Failed personas are not checkpointed so a rerun retries them
+                stats["failed"] += 1
+            else:
+                # Only checkpoint once the result is safely on disk
+                ckpt.write(persona_id + "\n")
+                ckpt.flush()
+                stats["processed"] += 1
+            print(f"[{stats['processed'] + stats['failed']}] finished persona {persona_id}")
+
+    print(f"Batch complete: {stats['processed']} processed, {stats['failed']} failed, "
+          f"{stats['skipped']} skipped from checkpoint. Results in {output_path}")
+    if metrics.ENABLED:
+        print(f"\nStage and upstream metrics:\n{metrics.summary()}")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the best LinkedIn match for personas.")
+    parser.add_argument("--input", help="JSONL file with one persona per line")
+    parser.add_argument("--output", help="JSONL file results are appended to")
+    parser.add_argument("--workers", type=int, default=4, help="Number of personas processed concurrently")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="Report import and model load times, then exit")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write a sampling profile per persona to PROFILE_DIR")
+    parser.add_argument("--reverify", action="store_true",
+                        help="Re-verify against the match history: rescrape stale pages, rescore changed candidates")
+    parser.add_argument("--deadline", type=float, default=None,
+                        help="Seconds per persona before the best match so far is returned as partial")
+    parser.add_argument("--index-profiles", metavar="FILE", default=None,
+                        help="Add a profile store (.sqlite) or dump (JSON or JSONL) to the local indexes, then exit")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        profiler.ENABLED = True
+    if args.deadline is not None:
+        deadline.DEFAULT_DEADLINE = args.deadline
+
+    if args.startup_profile:
+        profile_startup()
+        return
+    if args.index_profiles:
+        index_profile_dump(args.index_profiles)
+        return
+    if not args.input or not args.output:
+        parser.error("--input and --output are required")
+    warmup()
+    run_batch(args.input, args.output, workers=args.workers, checkpoint_path=args.checkpoint,
+              reverify=args.reverify)
+
 
-null=None
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,6 @@ Main module for LinkedIn profile search and scraping.
 Provides functions to search for profiles and extract detailed information.
 """
 
-import json
 import time
 from typing import List, Dict, Any, Optional
 
@@ -12,15 +11,24 @@ from typing import List, Dict, Any, Optional
 from scrappers.search import LinkedInProfileFinder
 from scrappers.scrape import LinkedInProvider
 from scrappers.transform import run_transformation
+from scrappers.store import ProfileStore, get_profile_store
+import deadline
+from deadline import DeadlineExceeded
+from resilience import CircuitOpen
+from metrics import stage, cache_lookup
 
 
-def search_profiles_from_json(profile_json: Dict[str, Any], max_results: int = 10) -> List[str]:
+def search_profiles_from_json(profile_json: Dict[str, Any], max_results: int = 10,
+                              titles: Optional[Dict[str, str]] = None,
+                              search_cache: Optional[Dict[Any, Any]] = None) -> List[str]:
     """
     Search for LinkedIn profiles using criteria extracted from input JSON.
     
     Args:
         profile_json: Dictionary containing search criteria (name, intro, etc.)
         max_results: Maximum number of results to return
+        titles: Optional dict that gets filled with URL -> search result title
+        search_cache: Optional dict shared across personas so identical searches run once
         
     Returns:
         List of LinkedIn profile URLs
@@ -59,6 +67,17 @@ def search_profiles_from_json(profile_json: Dict[str, Any], max_results: int = 1
         if title and 'http' in title:
             title = title.split('http')[0].strip()
     
+    # Personas sharing a name share the same Google query
+    cache_key = ("google", name.strip().lower(), max_results)
+    if search_cache is not None:
+        cache_lookup("search", cache_key in search_cache)
+    if search_cache is not None and cache_key in search_cache:
+        results, cached_titles = search_cache[cache_key]
+        print(f"Reusing Google Json Search results for '{name}' ({len(results)} URLs).")
+        if titles is not None:
+            titles.update(cached_titles)
+        return list(results)
+
     # Initialize the finder
     try:
         finder = LinkedInProfileFinder()
@@ -79,6 +98,11 @@ def search_profiles_from_json(profile_json: Dict[str, Any], max_results: int = 1
         max_results=max_results,
     )
     
+    if titles is not None:
+        titles.update(finder.result_titles)
+    if search_cache is not None:
+        search_cache[cache_key] = (list(results), dict(finder.result_titles))
+
     if results:
         print(f"\nFound {len(results)} LinkedIn profile URLs from Google Json Search.")
     else:
@@ -86,31 +110,49 @@ def search_profiles_from_json(profile_json: Dict[str, Any], max_results: int = 1
     
     return results
 
-def get_profiles_details(urls: List[str]) -> List[Dict[str, Any]]:
+def get_profiles_details(urls: List[str], cancel_event=None) -> List[Dict[str, Any]]:
     """
     Scrape and transform LinkedIn profiles from a list of URLs.
     
     Args:
         urls: List of LinkedIn profile URLs
+        cancel_event: Optional threading.Event; scraping stops early once it is set
         
     Returns:
         List of dictionaries containing detailed profile information
+
+    Scraping also stops early, keeping the profiles scraped so far, once the
+    request deadline (see deadline.py) leaves no time for another profile.
+    """
+    return list(get_profiles_details_by_url(urls, cancel_event=cancel_event).values())
+
+def get_profiles_details_by_url(urls: List[str], cancel_event=None) -> Dict[str, Dict[str, Any]]:
+    """
+    Same as `get_profiles_details`, but keyed by the input URL each profile was scraped from.
+    URLs that could not be scraped are left out.
     """
     if not urls:
         print("No URLs provided to scrape.")
-        return []
+        return {}
     
     print(f"\n--- Scraping {len(urls)} LinkedIn Profiles ---")
     
     provider = LinkedInProvider()
-    profile_details = []
+    profile_details = {}
     
     for i, url in enumerate(urls, 1):
+        if cancel_event is not None and cancel_event.is_set():
+            print(f"Scraping cancelled after {i - 1}/{len(urls)} URLs.")
+            break
+        if not deadline.allows(0):
+            print(f"Scraping stopped by the request deadline after {i - 1}/{len(urls)} URLs.")
+            break
         print(f"\nProcessing URL {i}/{len(urls)}: {url}")
         
         try:
             # Scrape the profile using the LinkedInProvider
-            basic_data, complete_data = provider.person_profile(url)
+            with stage("scrape_profile"):
+                basic_data, complete_data = provider.person_profile(url)
             
             if not basic_data and not complete_data:
                 print(f"Failed to extract any data from {url}. Skipping.")
@@ -152,7 +194,7 @@ def get_profiles_details(urls: List[str]) -> List[Dict[str, Any]]:
             profile_json = {k: v for k, v in profile_json.items() if v is not None}
             
             if profile_json:
-                profile_details.append(profile_json)
+                profile_details[url] = profile_json
                 print(f"Successfully extracted data for: {profile_json.get('name', 'Unknown')}")
             else:
                 print(f"No usable data extracted from {url}")
@@ -160,9 +202,21 @@ def get_profiles_details(urls: List[str]) -> List[Dict[str, Any]]:
             # Add a delay between requests to avoid rate limiting
             if i < len(urls):
                 wait_time = 3  # seconds
+                if not deadline.allows(wait_time):
+                    print(f"Scraping stopped by the request deadline after {i}/{len(urls)} URLs.")
+                    break
                 print(f"Waiting {wait_time} seconds before next request...")
-                time.sleep(wait_time)
+                if cancel_event is not None:
+                    cancel_event.wait(wait_time)
+                else:
+                    time.sleep(wait_time)
                 
+        except DeadlineExceeded:
+            print(f"Scraping stopped by the request deadline after {i - 1}/{len(urls)} URLs.")
+            break
+        except CircuitOpen as e:
+            print(f"Skipping the remaining {len(urls) - i + 1} URLs: {e}")
+            break
         except Exception as e:
             print(f"Error processing {url}: {type(e).__name__} - {e}")
             import traceback
@@ -171,22 +225,27 @@ def get_profiles_details(urls: List[str]) -> List[Dict[str, Any]]:
     print(f"\nCompleted scraping. Successfully extracted data for {len(profile_details)} profiles")
     return profile_details
 
-def save_profiles_to_file(profiles: List[Dict[str, Any]], output_file: str) -> None:
+def save_profiles_to_file(profiles: List[Dict[str, Any]], output_file: Optional[str] = None) -> None:
     """
-    Save profile results to a JSON file.
+    Save profile results to the profile store (see scrappers/store.py).
+
+    Profiles are upserted by their `url`, so saving again adds new profiles and
+    refreshes changed ones without rewriting the others.
     
     Args:
         profiles: List of profile dictionaries
-        output_file: Path to output file
+        output_file: Path to the SQLite store (default: PROFILE_STORE_PATH)
     """
     if not profiles:
         print("No profiles to save")
         return
     
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(profiles, f, indent=2, ensure_ascii=False)
-        print(f"Successfully saved {len(profiles)} profiles to {output_file}")
+        store = ProfileStore(output_file) if output_file else get_profile_store()
+        saved = store.upsert_many((profile.get('url'), profile) for profile in profiles)
+        print(f"Successfully saved {saved} profiles to {store.path}")
+        if saved < len(profiles):
+            print(f"Skipped {len(profiles) - saved} profiles without a url")
     except Exception as e:
-        print(f"Error saving profiles to {output_file}: {e}")
+        print(f"Error saving profiles to {output_file or 'the profile store'}: {e}")
 
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Module for resolving free-text locations ("San Francisco Bay Area",
+"London, England, United Kingdom") to IANA timezones.
+
+Lookups go through three tiers:
+1. A persistent SQLite cache keyed by the normalized location string.
+2. An offline gazetteer of cities, regions and countries (data/gazetteer.tsv).
+3. Nominatim geocoding + TimezoneFinder, rate limited to Nominatim's 1 req/s.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from metrics import cache_lookup, upstream
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer.tsv")
+DEFAULT_CACHE_PATH = os.getenv("GEOCACHE_PATH", os.path.join(".cache", "geocache.sqlite"))
+
+# Words LinkedIn adds around place names ("Greater Seattle Area", "New York City Metropolitan Area")
+_METRO_WORDS = re.compile(r"\b(greater|metropolitan|metro|area|region|city of)\b")
+# Locations that will never geocode to a single place
+_UNRESOLVABLE = {"remote", "worldwide", "global", "anywhere", "earth", "hybrid", "on site", "onsite"}
+
+# Geolocation tools are initialized on first use (TimezoneFinder loads its data at construction)
+geolocator = None
+tz_finder = None
+_geo_tools_initialized = False
+
+
+def init_geo_tools():
+    """Initializes the Nominatim geocoder and TimezoneFinder once."""
+    global geolocator, tz_finder, _geo_tools_initialized
+    if _geo_tools_initialized:
+        return geolocator, tz_finder
+    _geo_tools_initialized = True
+    try:
+        from geopy.geocoders import Nominatim
+        from timezonefinder import TimezoneFinder
+        geolocator = Nominatim(user_agent="timezone_locator")
+        tz_finder = TimezoneFinder()
+        # Ensure this print matches the original script's output if needed
+        if 'print("Geolocation tools initialized.")' in open('paste.txt').read():
+             print("Geolocation tools initialized.")
+    except Exception as e:
+        print(f"Warning: Could not initialize geolocation tools. Timezone lookup might fail. Error: {e}")
+        # geolocator and tz_finder remain None
+    return geolocator, tz_finder
+
+
+# --- Normalisation ---
+def normalize_location(location: Optional[str]) -> str:
+    """Lowercases, strips accents and punctuation, keeping commas as segment separators."""
+    if not location:
+        return ""
+    text = unicodedata.normalize("NFKD", location)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r"[^a-z0-9,]+", " ", text)
+    segments = [" ".join(seg.split()) for seg in text.split(",")]
+    return ", ".join(seg for seg in segments if seg)
+
+
+def _segment_keys(segment: str) -> List[str]:
+    """The segment as written, then without metro words ("greater boston area" -> "boston")."""
+    keys = [segment]
+    stripped = " ".join(_METRO_WORDS.sub(" ", segment).split())
+    if stripped and stripped != segment:
+        keys.append(stripped)
+    return keys
+
+
+# --- Offline Gazetteer ---
+class Gazetteer:
+    """In-memory index of the bundled city/region/country table."""
+
+    def __init__(self, path: str = GAZETTEER_PATH):
+        # name -> [(kind, country, timezone or None)], in file order (most likely first)
+        self.index: Dict[str, List[Tuple[str, str, Optional[str]]]] = defaultdict(list)
+        with open(path, "rb") as f:
+            # Cached answers from another version of the table are looked up again
+            self.version = hashlib.sha1(f.read()).hexdigest()[:12]
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                kind, name, country, timezone = line.rstrip("\n").split("\t")
+                self.index[name].append((kind, country, None if timezone == "-" else timezone))
+
+    def _entries(self, segment: str):
+        for key in _segment_keys(segment):
+            if key in self.index:
+                return self.index[key]
+        return []
+
+    def lookup(self, normalized: str) -> Optional[str]:
+        """
+        Timezone for a normalized location, or None when the table can't tell.
+
+        Every segment after the first ("maine", "united states") must be a known
+        region or country, and together they must agree with the first one;
+        otherwise the answer is left to the network. A region's own timezone wins
+        over the city's, since cities are only recorded per country ("Portland,
+        Maine" is not the Portland in the table).
+        """
+        if not normalized:
+            return None
+        segments = normalized.split(", ")
+
+        # The whole string may be a known name ("san francisco bay area")
+        whole = normalized.replace(", ", " ")
+        if len(segments) > 1:
+            for kind, country, timezone in self._entries(whole):
+                if timezone:
+                    return timezone
+
+        place, qualifiers = segments[0], []
+        for segment in segments[1:]:
+            entries = [e for e in self._entries(segment) if e[0] in ("country", "region")]
+            if not entries:
+                return None
+            qualifiers.append(entries)
+
+        # Countries every qualifier allows
+        allowed = None
+        for entries in qualifiers:
+            countries = {country for _, country, _ in entries}
+            allowed = countries if allowed is None else allowed & countries
+        if allowed is not None and not allowed:
+            return None
+
+        place_entries = self._entries(place)
+        matches = [e for e in place_entries if allowed is None or e[1] in allowed]
+        if place_entries and not matches:
+            return None
+        countries = {country for _, country, _ in matches} or allowed
+
+        regions = {timezone for entries in qualifiers for kind, country, timezone in entries
+                   if kind == "region" and timezone and country in countries}
+        if len(regions) == 1:
+            return regions.pop()
+        for kind, country, timezone in matches:
+            if timezone:
+                return timezone
+        if place_entries:
+            return None
+
+        # Unknown place: only a qualifier that means a single timezone will do ("somewhere, germany")
+        timezones = {timezone for entries in qualifiers for _, country, timezone in entries
+                     if country in countries}
+        if len(timezones) == 1 and None not in timezones:
+            return timezones.pop()
+        return None
+
+
+# --- Resolver ---
+class TimezoneResolver:
+    """
+    Resolves locations to timezones using the cache, the gazetteer, then the network.
+
+    Args:
+        cache_path: SQLite file for the persistent cache (None = in-memory only)
+        min_interval: Minimum seconds between two network geocoding calls
+        negative_ttl: Seconds before a location that could not be resolved is retried
+        use_network: Allow falling back to Nominatim
+    """
+
+    def __init__(self, cache_path: Optional[str] = DEFAULT_CACHE_PATH, min_interval: float = 1.0,
+                 negative_ttl: float = 30 * 24 * 3600, use_network: bool = True):
+        self.min_interval = min_interval
+        self.negative_ttl = negative_ttl
+        self.use_network = use_network
+        self.gazetteer = Gazetteer()
+        self._gazetteer_source = f"gazetteer:{self.gazetteer.version}"
+        self.stats = {"cache_hits": 0, "gazetteer_hits": 0, "network_calls": 0, "unresolved": 0}
+        self._lock = threading.Lock()
+        self._network_lock = threading.Lock()
+        self._last_network_call = 0.0
+
+        if cache_path and os.path.dirname(cache_path):
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self._db = sqlite3.connect(cache_path or ":memory:", check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS timezones ("
+                         "location TEXT PRIMARY KEY, timezone TEXT, source TEXT, updated_at REAL)")
+        self._db.commit()
+
+    def _cached(self, key: str):
+        with self._lock:
+            row = self._db.execute("SELECT timezone, source, updated_at FROM timezones WHERE location = ?",
+                                   (key,)).fetchone()
+        if row is None:
+            return False, None
+        timezone, source, updated_at = row
+        if timezone is None and time.time() - updated_at > self.negative_ttl:
+            return False, None
+        if source.startswith("gazetteer") and source != self._gazetteer_source:
+            return False, None
+        return True, timezone
+
+    def _store(self, key: str, timezone: Optional[str], source: str):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO timezones VALUES (?, ?, ?, ?)",
+                             (key, timezone, source, time.time()))
+            self._db.commit()
+
+    def _geocode(self, location: str) -> Optional[str]:
+        geolocator, tz_finder = init_geo_tools()
+        if not geolocator or not tz_finder:
+            return None
+        # One request at a time, spaced by min_interval (Nominatim usage policy)
+        with self._network_lock:
+            wait = self.min_interval - (time.time() - self._last_network_call)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                self.stats["network_calls"] += 1
+                with upstream("nominatim"):
+                    location_geo = geolocator.geocode(location, timeout=10)
+            finally:
+                self._last_network_call = time.time()
+        if not location_geo:
+            return None
+        return tz_finder.timezone_at(lat=location_geo.latitude, lng=location_geo.longitude)
+
+    def resolve(self, location: Optional[str], use_network: Optional[bool] = None) -> Optional[str]:
+        """IANA timezone for a free-text location, or None. `use_network=False` never geocodes."""
+        key = normalize_location(location)
+        if not key:
+            return None
+
+        found, timezone = self._cached(key)
+        cache_lookup("timezone", found)
+        if found:
+            self.stats["cache_hits"] += 1
+            return timezone
+
+        if key in _UNRESOLVABLE:
+            self._store(key, None, "unresolvable")
+            self.stats["unresolved"] += 1
+            return None
+
+        timezone = self.gazetteer.lookup(key)
+        if timezone:
+            self.stats["gazetteer_hits"] += 1
+            self._store(key, timezone, self._gazetteer_source)
+            return timezone
+
+        if not (self.use_network if use_network is None else use_network):
+            self.stats["unresolved"] += 1
+            return None
+
+        try:
+            timezone = self._geocode(location)
+        except Exception as e:
+            # Network errors are not cached, the next lookup retries
+            print(f"Error geocoding '{location}': {type(e).__name__} - {e}")
+            return None
+        self._store(key, timezone, "nominatim")
+        if not timezone:
+            self.stats["unresolved"] += 1
+        return timezone
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver() -> TimezoneResolver:
+    """Shared resolver using GEOCACHE_PATH."""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = TimezoneResolver()
+    return _resolver
+
+
+def resolve_timezone(location: Optional[str], use_network: Optional[bool] = None) -> Optional[str]:
+    return get_resolver().resolve(location, use_network=use_network)
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""
+Module for blocking the scraped-profile corpus by name.
+
+An inverted index maps keys derived from each profile's name and companies
+to the profiles carrying them:
+- n:<token>     normalised name token ("n:doty")
+- p:<soundex>   phonetic key of each name token, for misspellings ("p:d300")
+- s:<initial><surname> and i:<initials>, for "E. Doty" and "ED"
+- c:<token>     company tokens from `workspaces` and `experience`
+
+`block()` returns the few profiles sharing the most (weighted) keys with a
+persona, so it only has to be compared against those. Postings are arrays of
+increasing document ids kept in memory. The index is persisted as one
+compact .npz snapshot plus an append-only log of profiles added since then.
+
+Several processes (prefork workers) may append to the same log. Appends and
+snapshots take an exclusive lock on `<path>.lock`, and a snapshot is rebuilt
+from the snapshot and log on disk rather than from one process's memory, so
+it keeps what the other processes logged.
+"""
+
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from scrappers.prefilter import name_tokens, normalize_text
+
+DEFAULT_INDEX_PATH = os.getenv("NAME_INDEX_PATH", os.path.join(".cache", "name_index.npz"))
+# Log entries before the snapshot is rewritten
+SNAPSHOT_EVERY = int(os.getenv("NAME_INDEX_SNAPSHOT_EVERY", "10000"))
+# Keys with longer postings are only used to score candidates found through rarer keys
+GENERATE_LIMIT = 2000
+
+KEY_WEIGHTS = {"n": 3, "s": 2, "p": 1, "i": 1, "c": 1}
+# Words that appear in company names without identifying the company
+_COMPANY_NOISE = {"inc", "llc", "ltd", "limited", "corp", "corporation", "co", "company", "gmbh", "plc",
+                  "pvt", "private", "technologies", "technology", "labs", "hq", "group", "the", "and", "of"}
+_SOUNDEX_CODES = {c: digit for digit, letters in (("1", "bfpv"), ("2", "cgjkqsxz"), ("3", "dt"),
+                                                  ("4", "l"), ("5", "mn"), ("6", "r")) for c in letters}
+
+
+# --- Keys ---
+def soundex(token: str) -> str:
+    """American Soundex code of a normalised token ("doty" -> "d300")."""
+    letters = "".join(c for c in token if c.isalpha())
+    if not letters:
+        return ""
+    code = letters[0]
+    last = _SOUNDEX_CODES.get(letters[0], "")
+    for c in letters[1:]:
+        digit = _SOUNDEX_CODES.get(c, "")
+        if digit and digit != last:
+            code += digit
+            if len(code) == 4:
+                break
+        # h and w do not separate letters with the same code, vowels do
+        if c not in "hw":
+            last = digit
+    return code.ljust(4, "0")
+
+
+def company_tokens(companies: Iterable[Optional[str]]) -> Set[str]:
+    tokens = set()
+    for company in companies:
+        tokens.update(t for t in normalize_text(company).split()
+                      if len(t) > 1 and t not in _COMPANY_NOISE and not t.isdigit())
+    return tokens
+
+
+def profile_companies(profile: Dict) -> List[str]:
+    """Company names of a scraped profile, from `workspaces` and `experience`."""
+    companies = [w.get("name") for w in profile.get("workspaces") or [] if isinstance(w, dict)]
+    companies += [e.get("company") for e in profile.get("experience") or [] if isinstance(e, dict)]
+    return [c for c in companies if c]
+
+
+def blocking_keys(name: Optional[str], companies: Iterable[Optional[str]] = ()) -> Set[str]:
+    """Index keys for a name and its companies."""
+    tokens = name_tokens(name)
+    keys = set()
+    for token in tokens:
+        if len(token) > 1:
+            keys.add("n:" + token)
+            keys.add("p:" + soundex(token))
+    if len(tokens) > 1:
+        keys.add("s:" + tokens[0][0] + tokens[-1])
+        keys.add("i:" + "".join(t[0] for t in tokens))
+    keys.update("c:" + t for t in company_tokens(companies))
+    return keys
+
+
+# --- Index ---
+class NameIndex:
+    """
+    Inverted index from blocking keys to profile URLs.
+
+    Args:
+        path: .npz snapshot; `<path>.log` holds profiles added since (None = in-memory only)
+        snapshot_every: Log entries before `add` rewrites the snapshot
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_INDEX_PATH, snapshot_every: int = SNAPSHOT_EVERY):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        self._postings: Dict[str, array] = {}
+        self._urls: List[Optional[str]] = []  # document id -> URL (None once replaced)
+        self._ids: Dict[str, int] = {}
+        self._logged = 0
+        self._log = None
+        self._lock_file = None
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._lock_file = open(path + ".lock", "a")
+            with self._file_lock():
+                self._load()
+            self._log = open(self._log_path(), "a", encoding="utf-8")
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _log_path(self) -> str:
+        return self.path + ".log"
+
+    @contextmanager
+    def _file_lock(self):
+        """Excludes other processes using the same files."""
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _add(self, url: str, keys: Set[str]):
+        previous = self._ids.get(url)
+        if previous is not None:
+            self._urls[previous] = None
+        doc = len(self._urls)
+        self._urls.append(url)
+        self._ids[url] = doc
+        for key in keys:
+            postings = self._postings.get(key)
+            if postings is None:
+                postings = self._postings[key] = array("I")
+            postings.append(doc)
+
+    def add(self, url: str, name: Optional[str], companies: Iterable[Optional[str]] = ()):
+        """Indexes (or re-indexes) one profile."""
+        self.add_many([(url, name, companies)])
+
+    def add_many(self, entries: Iterable[Tuple[str, Optional[str], Iterable[Optional[str]]]]):
+        """Indexes (url, name, companies) entries, appending them to the log."""
+        with self._lock:
+            lines = []
+            for url, name, companies in entries:
+                companies = [c for c in companies if c]
+                self._add(url, blocking_keys(name, companies))
+                lines.append(json.dumps({"url": url, "name": name, "companies": companies},
+                                        ensure_ascii=False) + "\n")
+            if self._log is None or not lines:
+                return
+            with self._file_lock():
+                self._log.write("".join(lines))
+                self._log.flush()
+            self._logged += len(lines)
+            if self._logged >= self.snapshot_every:
+                self._save()
+
+    def add_profiles(self, profiles_by_url: Dict[str, Dict]):
+        """Indexes scraped profiles (URL -> profile as built by `get_profiles_details_by_url`)."""
+        self.add_many((url, profile.get("name"), profile_companies(profile))
+                      for url, profile in profiles_by_url.items() if profile)
+
+    def block(self, name: Optional[str], companies: Iterable[Optional[str]] = (), limit: int = 50,
+              min_score: int = KEY_WEIGHTS["n"]) -> List[Tuple[str, int]]:
+        """
+        Profiles sharing the most weighted keys with a persona.
+
+        Args:
+            name: Persona name
+            companies: Persona company names
+            limit: Maximum block size
+            min_score: Minimum summed key weight (default: one exact name token)
+
+        Returns:
+            List of (URL, score), best first
+        """
+        keys = blocking_keys(name, companies)
+        with self._lock:
+            postings = sorted(((self._postings[k], KEY_WEIGHTS[k[0]]) for k in keys if k in self._postings),
+                              key=lambda item: len(item[0]))
+            if not postings:
+                return []
+            # Rare keys propose candidates; the rarest one always does so a block is never empty
+            # just because every key is common
+            generators = [(docs, weight) for docs, weight in postings if len(docs) <= GENERATE_LIMIT] or postings[:1]
+            scores = Counter()
+            for docs, weight in generators:
+                for doc in docs:
+                    scores[doc] += weight
+            for docs, weight in postings[len(generators):]:
+                for doc in scores:
+                    i = bisect_left(docs, doc)
+                    if i < len(docs) and docs[i] == doc:
+                        scores[doc] += weight
+            ranked = [(self._urls[doc], score) for doc, score in scores.most_common()
+                      if score >= min_score and self._urls[doc] is not None]
+        return ranked[:limit]
+
+    # --- Persistence ---
+    def _load(self):
+        """Replaces the in-memory index with the snapshot and log on disk."""
+        self._postings = {}
+        self._urls = []
+        self._ids = {}
+        self._logged = 0
+        if os.path.exists(self.path):
+            self._load_snapshot()
+        self._replay_log()
+
+    def _load_snapshot(self):
+        with np.load(self.path) as saved:
+            keys = saved["keys"].tobytes().decode("utf-8").split("\n")
+            urls = saved["urls"].tobytes().decode("utf-8").split("\n")
+            offsets = saved["offsets"]
+            postings = saved["postings"]
+        self._urls = urls if urls != [""] else []
+        self._ids = {url: doc for doc, url in enumerate(self._urls)}
+        if keys == [""]:
+            return
+        for key, start, end in zip(keys, offsets[:-1], offsets[1:]):
+            docs = array("I")
+            docs.frombytes(postings[start:end].astype(np.uint32).tobytes())
+            self._postings[key] = docs
+
+    def _replay_log(self):
+        if not os.path.exists(self._log_path()):
+            return
+        with open(self._log_path(), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a crash
+                    continue
+                self._add(entry["url"], blocking_keys(entry.get("name"), entry.get("companies") or []))
+                self._logged += 1
+
+    def _compact(self):
+        """Renumbers documents without the replaced ones."""
+        live = [doc for doc, url in enumerate(self._urls) if url is not None]
+        if len(live) == len(self._urls):
+            return
+        remap = np.full(len(self._urls), -1, dtype=np.int64)
+        remap[live] = np.arange(len(live))
+        for key, docs in list(self._postings.items()):
+            ids = remap[np.frombuffer(docs, dtype=np.uint32)]
+            ids = ids[ids >= 0]
+            if len(ids):
+                compacted = array("I")
+                compacted.frombytes(ids.astype(np.uint32).tobytes())
+                self._postings[key] = compacted
+            else:
+                del self._postings[key]
+        self._urls = [self._urls[doc] for doc in live]
+        self._ids = {url: doc for doc, url in enumerate(self._urls)}
+
+    def _save(self):
+        with self._file_lock():
+            # Other processes may have logged profiles this one has not seen
+            self._load()
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        self._compact()
+        keys = list(self._postings)
+        lengths = np.fromiter((len(self._postings[k]) for k in keys), dtype=np.int64, count=len(keys))
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        postings = np.frombuffer(b"".join(self._postings[k].tobytes() for k in keys), dtype=np.uint32)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path,
+                 keys=np.frombuffer("\n".join(keys).encode("utf-8"), dtype=np.uint8),
+                 urls=np.frombuffer("\n".join(self._urls).encode("utf-8"), dtype=np.uint8),
+                 offsets=offsets, postings=postings)
+        os.replace(tmp_path, self.path)
+        # Everything in the log is in the snapshot now. Other processes keep appending
+        # through their own handles, which are opened in append mode.
+        self._log.truncate(0)
+        self._logged = 0
+
+    def save(self):
+        """Writes the snapshot and empties the log."""
+        if self.path is None:
+            return
+        with self._lock:
+            self._save()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_name_index() -> NameIndex:
+    """Shared index using NAME_INDEX_PATH."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = NameIndex()
+    return _index
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Module for cheap name matching of candidate LinkedIn URLs.
+Scores the profile slug and the search-result title against the persona
+name so obviously unrelated profiles can be dropped before they are scraped.
+"""
+
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+# Tokens that show up in search titles/slugs but never belong to a name
+_NOISE_TOKENS = {"linkedin", "in", "profile", "the", "and", "at", "of", "dr", "mr", "mrs", "ms"}
+
+
+# --- Normalisation Helpers ---
+def normalize_text(text: Optional[str]) -> str:
+    """Lowercases, strips accents and replaces anything non-alphanumeric with spaces."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^a-z0-9]+", " ", text.lower())
+    return " ".join(text.split())
+
+
+def name_tokens(name: Optional[str]) -> List[str]:
+    """Splits a name into normalised tokens, dropping noise and single digits."""
+    # Split camel case ("RohanM" -> "Rohan M") before lowercasing
+    if name:
+        name = re.sub(r"(?<=[a-z])(?=[A-Z])", " ", name)
+    return [t for t in normalize_text(name).split() if t not in _NOISE_TOKENS and not t.isdigit()]
+
+
+def slug_tokens(url: str) -> List[str]:
+    """Extracts name-like tokens from a /in/<slug> LinkedIn URL."""
+    path = unquote(urlparse(url).path or "")
+    match = re.search(r"/in/([^/]+)", path)
+    if not match:
+        return []
+    tokens = re.split(r"[-_.]+", match.group(1).lower())
+    # Drop LinkedIn's numeric/hex disambiguation suffixes like "8a7b6c12"
+    return [t for t in tokens if t and not (re.search(r"\d", t) and len(t) >= 4) and not t.isdigit()]
+
+
+def title_tokens(title: Optional[str]) -> List[str]:
+    """Extracts tokens from the part of a search title that holds the name."""
+    if not title:
+        return []
+    # "Eric Doty - Content Lead - Dock | LinkedIn" -> "Eric Doty"
+    head = re.split(r"\s[-|–—·]\s|\|", title, maxsplit=1)[0]
+    return name_tokens(head)
+
+
+def edit_distance(a: str, b: str, max_distance: int = 2) -> int:
+    """Levenshtein distance with an early exit once `max_distance` is exceeded."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+def _token_matches(token: str, candidates: List[str]) -> bool:
+    """A name token matches exactly, as an initial, or within a small edit distance."""
+    for cand in candidates:
+        if token == cand:
+            return True
+        if len(cand) == 1 and token[0] == cand:
+            return True
+        if len(token) >= 4 and edit_distance(token, cand, 1) <= 1:
+            return True
+    return False
+
+
+# --- Scoring ---
+def name_match_score(name: str, candidate_tokens: List[str]) -> float:
+    """
+    Scores how well a candidate's tokens cover the persona name, in [0, 1].
+
+    Besides token-by-token matching, the joined candidate string is checked for
+    the name glued together ("ericdoty") or as initials plus surname ("edoty").
+    """
+    tokens = name_tokens(name)
+    if not tokens or not candidate_tokens:
+        return 0.0
+
+    matched = sum(1 for t in tokens if _token_matches(t, candidate_tokens))
+    score = matched / len(tokens)
+
+    compact = "".join(candidate_tokens)
+    if len(tokens) > 1:
+        first, last = tokens[0], tokens[-1]
+        initials = "".join(t[0] for t in tokens[:-1])
+        if compact in ("".join(tokens), first + last, first[0] + last, initials + last, last + first):
+            return 1.0
+        if last in compact and compact.startswith(first[0]):
+            score = max(score, 0.8)
+    # Partial credit for any name token hidden inside a glued slug
+    contained = sum(1 for t in tokens if len(t) >= 3 and t in compact)
+    return max(score, 0.6 * contained / len(tokens))
+
+
+def score_candidate(name: str, url: str, title: Optional[str] = None) -> float:
+    """Best of the slug and title scores for one candidate URL."""
+    return max(name_match_score(name, slug_tokens(url)), name_match_score(name, title_tokens(title)))
+
+
+def prefilter_candidates(urls: List[str], name: Optional[str], titles: Optional[Dict[str, str]] = None,
+                         threshold: float = 0.5, drop: bool = True,
+                         min_keep: int = 1) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Orders candidate URLs by name-match score and drops (or deprioritises) weak ones.
+
+    Args:
+        urls: Candidate LinkedIn profile URLs
+        name: Cleaned persona name (e.g. from `enrich_profile_json`)
+        titles: Optional mapping of URL -> search-result title
+        threshold: Minimum score for a candidate to be scraped
+        drop: Drop candidates below the threshold; otherwise move them to the end
+        min_keep: Always keep at least this many of the best candidates
+
+    Returns:
+        Tuple of (URLs to scrape, report dict with `total`, `kept` and `avoided` counts)
+    """
+    titles = titles or {}
+    if not urls or not name_tokens(name):
+        return list(urls or []), {"total": len(urls or []), "kept": len(urls or []), "avoided": 0}
+
+    scored = sorted(((score_candidate(name, url, titles.get(url)), url) for url in urls),
+                    key=lambda item: item[0], reverse=True)
+    kept = [url for i, (score, url) in enumerate(scored) if score >= threshold or i < min_keep]
+    below = [url for score, url in scored if url not in kept]
+    if not drop:
+        kept = kept + below
+
+    report = {"total": len(urls), "kept": len(kept), "avoided": len(urls) - len(kept)}
+    print(f"Name pre-filter kept {report['kept']}/{report['total']} candidate URLs "
+          f"({report['avoided']} scrapes avoided, {len(below)} below threshold {threshold}).")
+    return kept, report
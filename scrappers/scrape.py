@@ -6,7 +6,7 @@ and the LinkedInProvider class.
 """
 
 import json
-import time
+import os
 import requests
 import re
 import itertools
@@ -17,6 +17,12 @@ from bs4 import BeautifulSoup
 from pydantic import BaseModel
 from typing_extensions import TypedDict
 
+import deadline
+import resilience
+from deadline import DeadlineExceeded
+from metrics import stage, upstream
+from resilience import CircuitOpen, guarded
+
 # --- Constants and Global Initializations (Scraping/Transformation - moved here) ---
 user_agents = [
     "Slackbot-LinkExpanding 1.0 (+https://api.slack.com/robots)",
@@ -28,6 +34,12 @@ user_agents = [
 ]
 user_agent_cycle = itertools.cycle(user_agents)
 
+# Load tests point scraping at a local stand-in (benchmarks/stubs.py):
+# LINKEDIN_BASE_URL replaces scheme and host of profile URLs, SCRAPE_PROXY_URL
+# replaces the proxy ("none" disables it; the default is off when LINKEDIN_BASE_URL is set).
+LINKEDIN_BASE_URL = os.getenv("LINKEDIN_BASE_URL")
+SCRAPE_PROXY_URL = os.getenv("SCRAPE_PROXY_URL")
+
 # --- Helper Functions (Scraping/Transformation - moved here) ---
 def mimic_bot_headers() -> str:
     """Mimic bot headers"""
@@ -336,6 +348,9 @@ def extract_profile_data(html):
 
     data["recommendationsReceived"] = recommendations_received
 
+    # The parse tree is full of parent/child reference cycles; free it now
+    # instead of waiting for the cyclic garbage collector
+    soup.decompose()
     return data
 
 # --- LinkedIn Provider Class (Scraping) ---
@@ -356,23 +371,33 @@ class LinkedInProvider:
             "http": f"http://{proxy_user}:{proxy_pass}@{proxy_host}:{proxy_port}",
             "https": f"http://{proxy_user}:{proxy_pass}@{proxy_host}:{proxy_port}",
         }
+        if SCRAPE_PROXY_URL:
+            proxies = None if SCRAPE_PROXY_URL.lower() == "none" else {"http": SCRAPE_PROXY_URL, "https": SCRAPE_PROXY_URL}
+        elif LINKEDIN_BASE_URL:
+            proxies = None
+        if LINKEDIN_BASE_URL:
+            url = LINKEDIN_BASE_URL.rstrip("/") + "/" + url.split("://", 1)[-1].split("/", 1)[-1]
 
         for attempt in range(retry_count):
             user_agent = mimic_bot_headers()
             headers = {"User-Agent": user_agent}
+            backoff_base = 3  # seconds, doubled per attempt and jittered
 
             try:
                 # Ensure this print matches the original script's output if needed
                 if 'print(f"Attempt {attempt + 1}/{retry_count}: Fetching {url} with User-Agent: {user_agent}")' in open('paste.txt').read():
                      print(f"Attempt {attempt + 1}/{retry_count}: Fetching {url} with User-Agent: {user_agent}")
-                response = requests.get(
-                    url,
-                    headers=headers,
-                    proxies=proxies,
-                    timeout=45,  # Increased timeout
-                    verify=False # Added verify=False (use with caution, understands security implications)
-                )
-                response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
+                # Raises CircuitOpen while LinkedIn keeps failing; the caller skips the remaining URLs
+                with guarded("linkedin", retry=attempt > 0), upstream("linkedin") as call:
+                    response = requests.get(
+                        url,
+                        headers=headers,
+                        proxies=proxies,
+                        timeout=deadline.timeout(45, "linkedin"),  # Increased timeout, capped by the request deadline
+                        verify=False # Added verify=False (use with caution, understands security implications)
+                    )
+                    call.bytes = len(response.content)
+                    response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
                 # Ensure this print matches the original script's output if needed
                 if 'print(f"Success: Status code {response.status_code}")' in open('paste.txt').read():
                      print(f"Success: Status code {response.status_code}")
@@ -385,22 +410,20 @@ class LinkedInProvider:
                 # Specific handling for common block codes
                 if e.response.status_code in [403, 429, 503]:
                      print("Potential block or rate limit detected.")
-                     time.sleep(5 * (attempt + 1)) # Exponential backoff
+                     backoff_base = 5
                 else:
                      break # Don't retry on other client/server errors like 404
             except requests.exceptions.ProxyError as e:
                  print(f"Attempt {attempt + 1} failed: Proxy Error: {e}")
                  print("Check proxy configuration and credentials.")
-                 time.sleep(5) # Wait before retrying proxy issue
+                 backoff_base = 5
             except requests.exceptions.RequestException as e:
                 print(f"Attempt {attempt + 1} failed: Request Exception: {e}")
-                time.sleep(3 * (attempt + 1)) # General backoff
 
-            # Wait before retrying
-            if attempt < retry_count - 1:
-                wait_time = 3 * (attempt + 1)
-                print(f"Waiting {wait_time} seconds before retry...")
-                time.sleep(wait_time)
+            # Jittered backoff, within the shared retry budget and the request deadline
+            if attempt < retry_count - 1 and not resilience.wait_before_retry("linkedin", attempt, base=backoff_base):
+                print("Not retrying: circuit open, retry budget spent or request deadline reached.")
+                break
 
         print(f"Failed to fetch the linkedin URL after {retry_count} attempts: {url}")
         return None
@@ -408,6 +431,7 @@ class LinkedInProvider:
     def _json_ld_data(self, html_content: str) -> Optional[dict]:
         """Extracts JSON-LD data from HTML, trying different script types."""
         if not html_content: return {}
+        soup = None
         try:
             soup = BeautifulSoup(html_content, "html.parser")
             # Standard JSON-LD
@@ -439,6 +463,9 @@ class LinkedInProvider:
         except Exception as e:
             print(f"Error in extracting JSON-LD or embedded script data: {e}")
             return {}
+        finally:
+            if soup is not None:
+                soup.decompose()
 
     def person_profile(self, url: str) -> Tuple[Optional[LinkedinPersonProfile], Optional[Dict]]:
         """Extracts basic (Pydantic) and complete (scraped) profile details of a person."""
@@ -451,7 +478,8 @@ class LinkedInProvider:
                 return None, None
 
             # --- Perform Full HTML Scraping FIRST ---
-            scraped_data = extract_profile_data(html_content)
+            with stage("parse"):
+                scraped_data = extract_profile_data(html_content)
 
             # --- Attempt JSON-LD Extraction (Secondary/Complementary) ---
             json_ld_data = self._json_ld_data(html_content)
@@ -518,6 +546,8 @@ class LinkedInProvider:
 
             return basic_profile, scraped_data # Return both basic and complete data
 
+        except (DeadlineExceeded, CircuitOpen):
+            raise
         except Exception as e:
             print(f"Error occurred during person profile extraction for {url}: {e}")
             import traceback
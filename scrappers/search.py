@@ -15,6 +15,11 @@ import json # For potential error parsing
 from urllib.parse import quote
 from typing import List
 
+import deadline
+from deadline import DeadlineExceeded
+from metrics import upstream
+from resilience import CircuitOpen, guarded
+
 # Attempt to import userdata, fail gracefully if not available
 try:
     from google.colab import userdata
@@ -62,8 +67,10 @@ class LinkedInProfileFinder:
                   print("Google Search credentials loaded.")
 
 
-        self.base_url = "https://www.googleapis.com/customsearch/v1"
+        # Overridable so load tests can point at a local stand-in (benchmarks/stubs.py)
+        self.base_url = os.getenv("GOOGLE_CSE_BASE_URL", "https://www.googleapis.com/customsearch/v1")
         self.profiles_list = []  # Initialize profiles list
+        self.result_titles = {}  # URL -> search result title, used by the name pre-filter
 
     def search_profiles(self, name, timezone=None, company=None, location=None, title=None, max_results=10):
         """Search for LinkedIn profiles based on various filters using Google Custom Search."""
@@ -108,11 +115,13 @@ class LinkedInProfileFinder:
                  print(f"Requesting URL: {request_url}")
 
             try:
-                response = requests.get(request_url, timeout=20)
+                with guarded("google_cse"), upstream("google_cse") as call:
+                    response = requests.get(request_url, timeout=deadline.timeout(20, "google search"))
+                    call.bytes = len(response.content)
+                    response.raise_for_status()  # Raise exception for HTTP errors (4xx, 5xx)
                 # Ensure this print matches the original script's output if needed
                 if 'print(f"Google API Response Status: {response.status_code}")' in open('paste.txt').read():
                      print(f"Google API Response Status: {response.status_code}")
-                response.raise_for_status()  # Raise exception for HTTP errors (4xx, 5xx)
                 data = response.json()
 
                 # --- Debug: Print snippet of response ---
@@ -138,6 +147,8 @@ class LinkedInProfileFinder:
                         if normalized_url not in processed_urls:
                             results.append(normalized_url)
                             processed_urls.add(normalized_url)
+                            if item.get("title"):
+                                self.result_titles[normalized_url] = item["title"]
                             found_new = True
                             # Ensure this print matches the original script's output if needed
                             if 'print(f"  Added: {normalized_url}")' in open('paste.txt').read():
@@ -155,6 +166,10 @@ class LinkedInProfileFinder:
                           print("Reached max results or no more pages indicated by API.")
                      break
 
+                if not deadline.allows(1):
+                    print("Stopping Google search: request deadline reached.")
+                    break
+
                 page += 1
                 # Add delay to respect API rate limits (adjust as needed)
                 # Ensure this print matches the original script's output if needed
@@ -162,6 +177,12 @@ class LinkedInProfileFinder:
                      print("Waiting 1 second before next page request...")
                 time.sleep(1)
 
+            except DeadlineExceeded:
+                print("Stopping Google search: request deadline reached.")
+                break
+            except CircuitOpen as e:
+                print(f"Skipping Google search: {e}")
+                break
             except requests.exceptions.Timeout:
                 print("Error: Google API request timed out.")
                 break # Stop searching on timeout
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Module for storing scraped and transformed profiles durably, keyed by URL.
+
+Profiles live in one SQLite table. The fields most readers need (name,
+image, intro, summary) are plain columns, and everything else (experience,
+education, skills, ...) is one JSON column. A projection such as
+`project(("name", "image", "summary"))` therefore reads the plain columns
+and never parses the experience arrays. Writes are upserts by URL, grouped
+into transactions of `batch_size` profiles, so a scrape can be appended to
+and a profile refreshed without rewriting the rest.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_STORE_PATH = os.getenv("PROFILE_STORE_PATH", os.path.join(".cache", "profiles.sqlite"))
+BATCH_SIZE = 500
+
+# Fields stored as their own columns; the rest of the profile goes to `data`
+COLUMNS = ("name", "image", "intro", "summary")
+
+
+class ProfileStore:
+    """
+    URL-keyed profile store on SQLite.
+
+    Args:
+        path: SQLite file (None = in-memory only)
+        batch_size: Profiles written per transaction
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_STORE_PATH, batch_size: int = BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        if path:
+            # Readers are not blocked by a batch being written
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS profiles ("
+                         "url TEXT PRIMARY KEY, name TEXT, image TEXT, intro TEXT, summary TEXT, "
+                         "data TEXT, updated_at REAL)")
+        self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    def __contains__(self, url):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM profiles WHERE url = ?", (url,)).fetchone() is not None
+
+    @staticmethod
+    def _row(url: str, profile: Dict[str, Any], now: float) -> Tuple:
+        rest = {k: v for k, v in profile.items() if k not in COLUMNS}
+        return (url, *(profile.get(k) for k in COLUMNS), json.dumps(rest, ensure_ascii=False), now)
+
+    @staticmethod
+    def _profile(columns: Sequence, data: str) -> Dict[str, Any]:
+        profile = {k: v for k, v in zip(COLUMNS, columns) if v is not None}
+        profile.update(json.loads(data))
+        return profile
+
+    # --- Writes ---
+    def upsert_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """
+        Inserts or replaces (url, profile) pairs, `batch_size` per transaction.
+
+        Items without a URL or profile are skipped.
+
+        Returns:
+            int: Number of profiles written
+        """
+        written = 0
+        batch: List[Tuple] = []
+        for url, profile in items:
+            if not url or not profile:
+                continue
+            batch.append(self._row(url, profile, time.time()))
+            if len(batch) >= self.batch_size:
+                written += self._write(batch)
+                batch = []
+        if batch:
+            written += self._write(batch)
+        return written
+
+    def _write(self, rows: List[Tuple]) -> int:
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO profiles VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(url) DO UPDATE SET "
+                "name = excluded.name, image = excluded.image, intro = excluded.intro, "
+                "summary = excluded.summary, data = excluded.data, updated_at = excluded.updated_at", rows)
+        return len(rows)
+
+    def upsert(self, url: str, profile: Dict[str, Any]) -> None:
+        self.upsert_many([(url, profile)])
+
+    def delete(self, urls: Iterable[str]) -> int:
+        with self._lock, self._db:
+            return self._db.executemany("DELETE FROM profiles WHERE url = ?", ((u,) for u in urls)).rowcount
+
+    # --- Reads ---
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        return self.get_many([url]).get(url)
+
+    def get_many(self, urls: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Full profiles for `urls`: url -> profile (unknown URLs are left out)."""
+        urls = list(urls)
+        found = {}
+        # Stay under SQLite's limit on bound parameters
+        for start in range(0, len(urls), 500):
+            chunk = urls[start:start + 500]
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT url, {', '.join(COLUMNS)}, data FROM profiles "
+                    f"WHERE url IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+            found.update((row[0], self._profile(row[1:-1], row[-1])) for row in rows)
+        return found
+
+    def iter_profiles(self, chunk_size: int = 1000) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Streams every (url, full profile) pair in URL order."""
+        for row in self._scan(f"{', '.join(COLUMNS)}, data", chunk_size):
+            yield row[0], self._profile(row[1:-1], row[-1])
+
+    def project(self, fields: Sequence[str] = ("name", "image", "summary"),
+                chunk_size: int = 1000) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streams (url, {field: value}) with only `fields` loaded, in URL order.
+
+        Fields in COLUMNS are read from their columns without touching the JSON.
+        Other fields are extracted from it by SQLite (json_extract, with json_type
+        to tell arrays, objects and booleans from plain values), one value per row.
+        """
+        selects = []
+        for field in fields:
+            if not field.isidentifier():
+                raise ValueError(f"Invalid profile field: {field!r}")
+            if field in COLUMNS:
+                selects.append(f"{field}, NULL")
+            else:
+                selects.append(f"json_extract(data, '$.{field}'), json_type(data, '$.{field}')")
+        for row in self._scan(", ".join(selects), chunk_size):
+            values = {}
+            for i, field in enumerate(fields):
+                value, kind = row[1 + 2 * i], row[2 + 2 * i]
+                if kind in ("array", "object"):
+                    value = json.loads(value)
+                elif kind in ("true", "false"):
+                    value = kind == "true"
+                if value is not None:
+                    values[field] = value
+            yield row[0], values
+
+    def _scan(self, select: str, chunk_size: int) -> Iterator[Tuple]:
+        # Keyset pagination, so the lock is never held across a yield
+        last = ""
+        while True:
+            with self._lock:
+                rows = self._db.execute(f"SELECT url, {select} FROM profiles WHERE url > ? ORDER BY url LIMIT ?",
+                                        (last, chunk_size)).fetchall()
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            last = rows[-1][0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_profile_store() -> ProfileStore:
+    """Shared store using PROFILE_STORE_PATH."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ProfileStore()
+    return _store
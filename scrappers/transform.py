@@ -5,31 +5,20 @@ for comparison, including timezone lookup.
 """
 
 import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional, List
-
-# Transformation Specific Imports from original script
-from geopy.geocoders import Nominatim
-from timezonefinder import TimezoneFinder
-
-# Initialize Geolocation tools (do this once per module load)
-geolocator = None
-tz_finder = None
-try:
-    geolocator = Nominatim(user_agent="timezone_locator")
-    tz_finder = TimezoneFinder()
-    # Ensure this print matches the original script's output if needed
-    if 'print("Geolocation tools initialized.")' in open('paste.txt').read():
-         print("Geolocation tools initialized.")
-except Exception as e:
-    print(f"Warning: Could not initialize geolocation tools. Timezone lookup might fail. Error: {e}")
-    # geolocator and tz_finder remain None
+from typing import Dict, Iterator, Optional, List
+
+from scrappers.geocache import resolve_timezone, get_resolver
+from scrappers.store import ProfileStore, get_profile_store
 
 # --- Transformation Functions ---
 def get_first_company_timezone(profile_entry: Dict) -> Optional[str]:
     """
     Extracts location from the first experience entry with a company,
-    geocodes it, and returns the IANA timezone name.
+    resolves it (cache, offline gazetteer, then Nominatim), and returns the IANA timezone name.
 
     Args:
         profile_entry: A dictionary representing one profile entry from the scraped JSON.
@@ -37,10 +26,6 @@ def get_first_company_timezone(profile_entry: Dict) -> Optional[str]:
     Returns:
         IANA timezone string or None if not found/error.
     """
-    if not geolocator or not tz_finder:
-        # print("Warning: Geolocation tools not available for timezone lookup.") # Keep commented as per original
-        return None # Return None if tools failed to initialize
-
     try:
         # Check if 'complete_data' and 'experience' exist and are valid
         complete_data = profile_entry.get("complete_data")
@@ -65,19 +50,11 @@ def get_first_company_timezone(profile_entry: Dict) -> Optional[str]:
             # print(f"No location found in experience for profile: {profile_entry.get('url')}") # Keep commented as per original
             return None
 
-        # Geocode the location string
-        # print(f"Geocoding location: {location_str}") # Debug comment kept from original
-        location_geo = geolocator.geocode(location_str, timeout=10) # Add timeout
-        if not location_geo:
-            # print(f"Could not geocode location: '{location_str}'") # Keep commented as per original
-            return None
-
-        # Find timezone using latitude and longitude
-        # print(f"Finding timezone for coordinates: ({location_geo.latitude}, {location_geo.longitude})") # Debug comment kept from original
-        timezone_iana = tz_finder.timezone_at(lat=location_geo.latitude, lng=location_geo.longitude)
+        # Resolve the location string (see scrappers/geocache.py)
+        timezone_iana = resolve_timezone(location_str)
 
         if not timezone_iana:
-             # print(f"Timezone not found for location: '{location_str}' at ({location_geo.latitude}, {location_geo.longitude})") # Keep commented as per original
+             # print(f"Timezone not found for location: '{location_str}'") # Keep commented as per original
              return None
 
         # print(f"Found timezone: {timezone_iana}") # Debug comment kept from original
@@ -162,71 +139,274 @@ def transform_profile_structure(profile_entry: Dict) -> Optional[Dict]:
     return target_profile
 
 # --- Main Workflow Function (Transformation - moved here) ---
-def run_transformation(input_file: str, output_file: str) -> None:
+def _profile_url(transformed: Dict) -> Optional[str]:
+    """The LinkedIn URL `transform_profile_structure` put in `social_profile`."""
+    for link in transformed.get("social_profile") or []:
+        if link.get("type") == "linkedin":
+            return link.get("url")
+    return None
+
+def run_transformation(input_file: str, output_file: Optional[str] = None) -> None:
     """
     Loads raw scraped data, transforms it into the comparer format, and saves it.
 
+    Raw profiles are streamed from the input and the transformed ones are upserted
+    into the profile store by LinkedIn URL, in batched transactions (see
+    scrappers/store.py). Rerunning on a newer scrape refreshes the profiles it
+    contains and leaves the others alone.
+
     Args:
-        input_file: Path to the JSON file containing raw scraped data (e.g., "linkedin_profiles.json").
-        output_file: Path to save the transformed JSON data (e.g., "/content/jun.json").
+        input_file: Path to the JSON array or JSONL file of raw scraped data (e.g., "linkedin_profiles.json").
+        output_file: Path to the SQLite profile store (default: PROFILE_STORE_PATH).
     """
     # Ensure this print matches the original script's output if needed
     if 'print(f"\\n--- Step 3: Transform Scraped Data for Comparison ---")' in open('paste.txt').read():
          print(f"\n--- Step 3: Transform Scraped Data for Comparison ---")
+    store = ProfileStore(output_file) if output_file else get_profile_store()
     print(f"Input raw data: {input_file}")
-    print(f"Output transformed data: {output_file}")
+    print(f"Output profile store: {store.path}")
 
-    # --- Load Raw Scraped Data ---
+    # --- Transform Each Profile ---
+    stats = {"transformed": 0, "skipped": 0}
+
+    def transformed_profiles():
+        for profile_entry in iter_raw_profiles(input_file):
+            transformed = transform_profile_structure(profile_entry)
+            url = _profile_url(transformed) if transformed else None
+            if url:
+                stats["transformed"] += 1
+                yield url, transformed
+            else:
+                stats["skipped"] += 1
+
+    print("Starting transformation process...")
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            raw_data = json.load(f)
-        if not isinstance(raw_data, list):
-            print(f"Error: Input file {input_file} does not contain a list. Transformation aborted.")
-            return
-        print(f"Loaded {len(raw_data)} raw profiles from {input_file}.")
+        saved = store.upsert_many(transformed_profiles())
     except FileNotFoundError:
         print(f"Error: Input file {input_file} not found. Transformation aborted.")
         return
-    except json.JSONDecodeError:
-        print(f"Error: Input file {input_file} contains invalid JSON. Transformation aborted.")
+    except ValueError as e:
+        # Includes json.JSONDecodeError; profiles saved before the bad input are kept
+        print(f"Error: Input file {input_file} contains invalid JSON ({e}). Transformation stopped.")
         return
     except Exception as e:
-        print(f"Error loading {input_file}: {type(e).__name__} - {e}. Transformation aborted.")
+        print(f"ERROR: Failed to save transformed profiles to {store.path}: {type(e).__name__} - {e}")
         return
 
-    # --- Transform Each Profile ---
-    transformed_profiles = []
-    skipped_count = 0
-    print("Starting transformation process...")
-    for i, profile_entry in enumerate(raw_data):
-        if i % 5 == 0 and i > 0: # Print progress periodically
-             # Ensure this print matches the original script's output if needed
-             if 'print(f"  Processed {i}/{len(raw_data)} profiles...")' in open('paste.txt').read():
-                  print(f"  Processed {i}/{len(raw_data)} profiles...")
-        transformed = transform_profile_structure(profile_entry)
-        if transformed:
-            transformed_profiles.append(transformed)
+    print(f"Transformation complete. Successfully transformed {stats['transformed']} profiles.")
+    print(f"Timezone lookups: {get_resolver().stats}")
+    if stats["skipped"] > 0:
+        print(f"Skipped {stats['skipped']} profiles due to missing essential data (like name or URL).")
+    print(f"Successfully saved {saved} transformed profiles to {store.path}")
+
+
+# --- Streaming Transformation (large dumps) ---
+READ_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+
+def _iter_json_array(f, chunk_size: int = READ_CHUNK_SIZE) -> Iterator:
+    """
+    Yields the elements of a top-level JSON array one at a time.
+
+    Only the current element (plus one read chunk) is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buf = f.read(chunk_size).lstrip()
+    while buf == "" or buf[0] != "[":
+        if buf:
+            raise ValueError("Input is not a JSON array")
+        more = f.read(chunk_size)
+        if not more:
+            return
+        buf = more.lstrip()
+    pos = 1
+    eof = False
+
+    while True:
+        # Skip separators, refilling the buffer when it runs out
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buf):
+            more = f.read(chunk_size)
+            if not more:
+                raise ValueError("Truncated JSON array (missing ']')")
+            buf, pos = buf[pos:] + more, 0
+            continue
+        if buf[pos] == "]":
+            return
+
+        error = None
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            error, end = e, None
+        # A value not followed by a separator may be cut short at the buffer end
+        # (a number read as "3" of "3.5", or "1" of "1e3")
+        if end is None or ((end == len(buf) or buf[end] not in " \t\r\n,]") and not eof):
+            more = f.read(chunk_size)
+            if not more:
+                if error is not None:
+                    raise error
+                eof = True
+                continue
+            buf, pos = buf[pos:] + more, 0
+            continue
+
+        yield obj
+        pos = end
+        if pos >= chunk_size:
+            buf, pos = buf[pos:], 0
+
+
+def _iter_jsonl(f) -> Iterator:
+    for line_no, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"Warning: skipping invalid JSON on line {line_no}: {e}")
+
+
+def iter_raw_profiles(input_file: str) -> Iterator[Dict]:
+    """
+    Streams raw profiles from a JSON array file or a JSONL file.
+
+    The format is detected from the first non-whitespace character, so
+    `linkedin_profiles.json` dumps and `.jsonl` files both work.
+    """
+    with open(input_file, "r", encoding="utf-8") as f:
+        head = f.read(4096)
+        first = head.lstrip()[:1]
+        f.seek(0)
+        if first == "[":
+            yield from _iter_json_array(f)
         else:
-            skipped_count += 1
-            # print(f"Skipped transforming profile: {profile_entry.get('url', 'URL missing')}") # Optional debug kept commented
+            yield from _iter_jsonl(f)
 
-    print(f"Transformation complete. Successfully transformed {len(transformed_profiles)} profiles.")
-    if skipped_count > 0:
-        print(f"Skipped {skipped_count} profiles due to missing essential data (like name).")
 
-    # --- Save Transformed Data ---
-    if not transformed_profiles:
-        print("No profiles were successfully transformed. Output file will not be created/updated.")
-        return
+def _checkpoint_path(output_file: str) -> str:
+    return output_file + ".progress"
+
 
+def _read_checkpoint(output_file: str) -> Dict[str, int]:
     try:
-        # Ensure output directory exists if needed (e.g., /content/)
-        output_path = Path(output_file)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(_checkpoint_path(output_file), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
 
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(transformed_profiles, f, indent=2, ensure_ascii=False)
-        print(f"Successfully saved {len(transformed_profiles)} transformed profiles to {output_file}")
-    except Exception as e:
-        print(f"ERROR: Failed to save transformed profiles to {output_file}: {type(e).__name__} - {e}")
 
+def _write_checkpoint(output_file: str, out, stats: Dict[str, int]) -> None:
+    """Flushes the output to disk, then records how far it got."""
+    out.flush()
+    os.fsync(out.fileno())
+    tmp = _checkpoint_path(output_file) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({**stats, "offset": out.tell()}, f)
+    os.replace(tmp, _checkpoint_path(output_file))
+
+
+def run_transformation_streaming(input_file: str, output_file: str, workers: int = 8,
+                                 checkpoint_every: int = 500, resume: bool = True) -> Dict[str, int]:
+    """
+    Transforms a raw scrape dump into JSONL without loading it into memory.
+
+    Profiles are read incrementally, transformed on a thread pool (so the
+    timezone lookups of different profiles overlap) and written in input
+    order. At most `workers * 4` profiles are in flight at any time.
+
+    Every `checkpoint_every` profiles the output is flushed and fsync'd and
+    `<output_file>.progress` records how many input profiles are done and the
+    output size at that point; with `resume=True` a rerun truncates the output
+    back to that size, skips those profiles and appends.
+
+    Args:
+        input_file: JSON array or JSONL file of raw scraped profiles.
+        output_file: JSONL file for the transformed profiles.
+        workers: Number of transformation threads.
+        checkpoint_every: Profiles between flush checkpoints.
+        resume: Continue from `<output_file>.progress` if present.
+
+    Returns:
+        Counts of consumed, written and skipped profiles.
+    """
+    print(f"Input raw data: {input_file}")
+    print(f"Output transformed data (JSONL): {output_file}")
+
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    checkpoint = _read_checkpoint(output_file) if resume and output_path.exists() else {}
+    start_at = checkpoint.get("consumed", 0)
+    if start_at:
+        # Lines written after the last checkpoint are redone, so drop them
+        with open(output_path, "r+b") as f:
+            f.truncate(checkpoint.get("offset", 0))
+        print(f"Resuming after {start_at} already transformed profiles.")
+
+    stats = {key: checkpoint.get(key, 0) for key in ("consumed", "written", "skipped")}
+    max_in_flight = max(1, workers) * 4
+    in_flight = deque()
+
+    def drain(out, limit: int):
+        # Write finished results in input order until at most `limit` remain in flight
+        while len(in_flight) > limit:
+            try:
+                transformed = in_flight.popleft().result()
+            except Exception as e:
+                print(f"Error transforming profile: {type(e).__name__} - {e}")
+                transformed = None
+            stats["consumed"] += 1
+            if transformed:
+                out.write(json.dumps(transformed, ensure_ascii=False) + "\n")
+                stats["written"] += 1
+            else:
+                stats["skipped"] += 1
+            if stats["consumed"] % checkpoint_every == 0:
+                _write_checkpoint(output_file, out, stats)
+                print(f"  Processed {stats['consumed']} profiles...")
+
+    try:
+        with open(output_path, "a" if start_at else "w", encoding="utf-8") as out, \
+                ThreadPoolExecutor(max_workers=workers) as pool:
+            for i, profile_entry in enumerate(iter_raw_profiles(input_file)):
+                if i < start_at:
+                    continue
+                in_flight.append(pool.submit(transform_profile_structure, profile_entry))
+                drain(out, max_in_flight)
+            drain(out, 0)
+            _write_checkpoint(output_file, out, stats)
+    except FileNotFoundError:
+        print(f"Error: Input file {input_file} not found. Transformation aborted.")
+        return stats
+    except ValueError as e:
+        # Includes json.JSONDecodeError; output up to the last checkpoint stays valid
+        print(f"Error: Input file {input_file} contains invalid JSON ({e}). Transformation stopped.")
+        return stats
+
+    print(f"Transformation complete. Successfully transformed {stats['written']} profiles.")
+    print(f"Timezone lookups: {get_resolver().stats}")
+    if stats["skipped"] > 0:
+        print(f"Skipped {stats['skipped']} profiles due to missing essential data (like name).")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Transform scraped LinkedIn profiles for comparison.")
+    parser.add_argument("input", help="Raw scraped profiles (JSON array or JSONL)")
+    parser.add_argument("output", help="Transformed profiles (JSONL with --stream, else a SQLite profile store)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream to JSONL with a worker pool (for large dumps)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--checkpoint-every", type=int, default=500)
+    parser.add_argument("--no-resume", action="store_true", help="Start over instead of resuming")
+    args = parser.parse_args()
+
+    if args.stream:
+        run_transformation_streaming(args.input, args.output, workers=args.workers,
+                                     checkpoint_every=args.checkpoint_every, resume=not args.no_resume)
+    else:
+        run_transformation(args.input, args.output)
@@ -0,0 +1,80 @@
+import pytest
+
+from scrappers.geocache import Gazetteer, TimezoneResolver, normalize_location
+
+
+@pytest.fixture(scope="module")
+def gazetteer():
+    return Gazetteer()
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    return TimezoneResolver(cache_path=str(tmp_path / "geocache.sqlite"), use_network=False)
+
+
+@pytest.mark.parametrize("location, timezone", [
+    ("London, England, United Kingdom", "Europe/London"),
+    ("San Francisco Bay Area", "America/Los_Angeles"),
+    ("Greater Seattle Area", "America/Los_Angeles"),
+    ("Bengaluru, Karnataka, India", "Asia/Kolkata"),
+    ("Portland, Oregon, United States", "America/Los_Angeles"),
+    # The region decides between places of the same name
+    ("Portland, Maine", "America/New_York"),
+    ("Atlanta, Georgia", "America/New_York"),
+    ("Tbilisi, Georgia", "Asia/Tbilisi"),
+])
+def test_gazetteer_lookup(gazetteer, location, timezone):
+    assert gazetteer.lookup(normalize_location(location)) == timezone
+
+
+@pytest.mark.parametrize("location", [
+    # Qualifiers that contradict the only known place of that name
+    "Birmingham, Alabama",
+    "Vancouver, Washington",
+    "Paris, Texas",
+    "Sydney, Canada",
+])
+def test_gazetteer_leaves_contradictions_to_the_network(gazetteer, location):
+    assert gazetteer.lookup(normalize_location(location)) is None
+
+
+def test_gazetteer_version_follows_table_content(tmp_path):
+    table = tmp_path / "gazetteer.tsv"
+    table.write_text("city\tportland\tUS\tAmerica/Los_Angeles\n", encoding="utf-8")
+    first = Gazetteer(str(table)).version
+    table.write_text("city\tportland\tUS\tAmerica/New_York\n", encoding="utf-8")
+    assert Gazetteer(str(table)).version != first
+    assert Gazetteer(str(table)).version == Gazetteer(str(table)).version
+
+
+def test_resolver_caches_gazetteer_answers(tmp_path):
+    path = str(tmp_path / "geocache.sqlite")
+    resolver = TimezoneResolver(cache_path=path, use_network=False)
+    assert resolver.resolve("Portland, Maine") == "America/New_York"
+    assert resolver.stats["gazetteer_hits"] == 1
+
+    reopened = TimezoneResolver(cache_path=path, use_network=False)
+    assert reopened.resolve("portland,  MAINE") == "America/New_York"
+    assert reopened.stats["cache_hits"] == 1
+
+
+def test_resolver_ignores_answers_from_another_gazetteer_version(resolver):
+    key = normalize_location("Portland, Maine")
+    resolver._store(key, "America/Los_Angeles", "gazetteer:0123456789ab")
+    assert resolver.resolve("Portland, Maine") == "America/New_York"
+    assert resolver.stats["cache_hits"] == 0
+    assert resolver.stats["gazetteer_hits"] == 1
+
+
+def test_resolver_keeps_network_answers_across_versions(resolver):
+    resolver._store("springfield, illinois", "America/Chicago", "nominatim")
+    assert resolver.resolve("Springfield, Illinois") == "America/Chicago"
+    assert resolver.stats["cache_hits"] == 1
+
+
+def test_resolver_without_network(resolver):
+    assert resolver.resolve("Remote") is None
+    assert resolver.resolve("Paris, Texas") is None
+    assert resolver.stats["network_calls"] == 0
+    assert resolver.resolve(None) is None
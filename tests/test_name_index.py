@@ -0,0 +1,84 @@
+import pytest
+
+from scrappers.name_index import NameIndex, blocking_keys, soundex
+
+
+@pytest.mark.parametrize("token, code", [
+    ("doty", "d300"),
+    ("robert", "r163"),
+    ("rupert", "r163"),
+    ("ashcraft", "a261"),
+    ("", ""),
+])
+def test_soundex(token, code):
+    assert soundex(token) == code
+
+
+def test_blocking_keys():
+    keys = blocking_keys("Eric Doty", ["Dock Inc", "Superpath"])
+    assert {"n:eric", "n:doty", "p:d300", "s:edoty", "i:ed", "c:dock", "c:superpath"} <= keys
+    # Company noise words are not keys
+    assert "c:inc" not in keys
+
+
+def test_block_ranks_by_shared_keys():
+    index = NameIndex(path=None)
+    index.add("https://linkedin.com/in/eric-doty", "Eric Doty", ["Dock"])
+    index.add("https://linkedin.com/in/eric-smith", "Eric Smith", ["Acme"])
+    index.add("https://linkedin.com/in/jane-roe", "Jane Roe", ["Dock"])
+
+    ranked = index.block("Eric Dotty", ["Dock"])
+    assert ranked[0][0] == "https://linkedin.com/in/eric-doty"
+    assert "https://linkedin.com/in/jane-roe" not in [url for url, _ in ranked]
+
+
+def test_readding_a_url_replaces_it():
+    index = NameIndex(path=None)
+    index.add("https://linkedin.com/in/x", "Eric Doty")
+    index.add("https://linkedin.com/in/x", "Jane Roe")
+    assert len(index) == 1
+    assert index.block("Eric Doty") == []
+    assert index.block("Jane Roe")[0][0] == "https://linkedin.com/in/x"
+
+
+def test_log_is_replayed_after_restart(tmp_path):
+    path = str(tmp_path / "name_index.npz")
+    index = NameIndex(path, snapshot_every=1000)
+    index.add_many([("u1", "Eric Doty", ["Dock"]), ("u2", "Jane Roe", [])])
+
+    reopened = NameIndex(path)
+    assert len(reopened) == 2
+    assert reopened.block("Eric Doty")[0][0] == "u1"
+
+
+def test_snapshot_plus_log_after_restart(tmp_path):
+    path = str(tmp_path / "name_index.npz")
+    index = NameIndex(path, snapshot_every=2)
+    index.add_many([("u1", "Eric Doty", []), ("u2", "Jane Roe", [])])  # snapshot written
+    index.add("u1", "Eric Doty", ["Dock"])  # logged after it
+    index.add("u3", "Ravi Kumar", [])
+
+    reopened = NameIndex(path)
+    assert len(reopened) == 3
+    assert dict(reopened.block("Eric Doty", ["Dock"]))["u1"] > dict(reopened.block("Eric Doty"))["u1"]
+    assert reopened.block("Ravi Kumar")[0][0] == "u3"
+
+
+def test_snapshot_keeps_entries_logged_by_another_process(tmp_path):
+    path = str(tmp_path / "name_index.npz")
+    first = NameIndex(path, snapshot_every=1000)
+    second = NameIndex(path, snapshot_every=1000)
+    first.add("u1", "Eric Doty")
+    second.add("u2", "Jane Roe")
+    second.save()
+
+    reopened = NameIndex(path)
+    assert len(reopened) == 2
+
+
+def test_truncated_log_line_is_skipped(tmp_path):
+    path = str(tmp_path / "name_index.npz")
+    NameIndex(path).add("u1", "Eric Doty")
+    with open(path + ".log", "a", encoding="utf-8") as f:
+        f.write('{"url": "u2", "na')
+    assert len(NameIndex(path)) == 1
@@ -0,0 +1,76 @@
+import pytest
+
+from scrappers.prefilter import (edit_distance, name_match_score, name_tokens, prefilter_candidates,
+                                 score_candidate, slug_tokens, title_tokens)
+
+
+def test_name_tokens_normalise_accents_and_noise():
+    assert name_tokens("Dr. José Álvarez") == ["jose", "alvarez"]
+    assert name_tokens("RohanM") == ["rohan", "m"]
+    assert name_tokens(None) == []
+
+
+def test_slug_tokens_drop_disambiguation_suffix():
+    assert slug_tokens("https://www.linkedin.com/in/eric-doty-8a7b6c12/") == ["eric", "doty"]
+    assert slug_tokens("https://www.linkedin.com/company/dock") == []
+
+
+def test_title_tokens_keep_the_name_part():
+    assert title_tokens("Eric Doty - Content Lead - Dock | LinkedIn") == ["eric", "doty"]
+
+
+def test_edit_distance_exits_early():
+    assert edit_distance("doty", "dotty") == 1
+    assert edit_distance("doty", "smithson", max_distance=2) == 3
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://www.linkedin.com/in/eric-doty", 1.0),
+    ("https://www.linkedin.com/in/ericdoty", 1.0),
+    ("https://www.linkedin.com/in/edoty", 1.0),
+    ("https://www.linkedin.com/in/eric-dotty", 1.0),
+    ("https://www.linkedin.com/in/jane-smith", 0.0),
+])
+def test_score_candidate_from_slug(url, expected):
+    assert score_candidate("Eric Doty", url) == pytest.approx(expected)
+
+
+def test_score_candidate_uses_title_when_slug_is_opaque():
+    url = "https://www.linkedin.com/in/ACoAAB12345"
+    assert score_candidate("Eric Doty", url) == 0.0
+    assert score_candidate("Eric Doty", url, "Eric Doty - Content Lead - Dock | LinkedIn") == 1.0
+
+
+def test_partial_match_scores_in_between():
+    assert 0.0 < name_match_score("Eric Doty", ["eric", "jones"]) < 1.0
+
+
+URLS = ["https://www.linkedin.com/in/jane-smith",
+        "https://www.linkedin.com/in/eric-doty",
+        "https://www.linkedin.com/in/bob-jones"]
+
+
+def test_prefilter_drops_weak_candidates():
+    kept, report = prefilter_candidates(URLS, "Eric Doty")
+    assert kept == ["https://www.linkedin.com/in/eric-doty"]
+    assert report == {"total": 3, "kept": 1, "avoided": 2}
+
+
+def test_prefilter_min_keep_keeps_best_below_threshold():
+    kept, report = prefilter_candidates(URLS, "Eric Doty", threshold=1.1, min_keep=2)
+    assert len(kept) == 2
+    assert kept[0] == "https://www.linkedin.com/in/eric-doty"
+    assert report["avoided"] == 1
+
+
+def test_prefilter_without_drop_only_reorders():
+    kept, report = prefilter_candidates(URLS, "Eric Doty", drop=False)
+    assert kept[0] == "https://www.linkedin.com/in/eric-doty"
+    assert sorted(kept) == sorted(URLS)
+    assert report["avoided"] == 0
+
+
+def test_prefilter_without_name_keeps_everything():
+    kept, report = prefilter_candidates(URLS, None)
+    assert kept == URLS
+    assert report["avoided"] == 0
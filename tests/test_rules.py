@@ -0,0 +1,76 @@
+import json
+import os
+
+import pytest
+
+from agent.rules import clean_name, extract_companies, measure_rule_agreement, rule_based_enrich
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "..", "agent", "fixtures", "enrich_fixtures.jsonl")
+
+
+def load_fixtures():
+    with open(FIXTURE_PATH, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("Eric Doty (Superpath)", ("Eric Doty", "Superpath", True)),
+    ("RohanM", ("Rohan M", None, True)),
+    ("jane doe", ("Jane Doe", None, True)),
+    ("McDonald Smith", ("McDonald Smith", None, False)),
+    ("LeBron James", ("LeBron James", None, False)),
+    ("DeShawn", ("DeShawn", None, False)),
+    (None, (None, None, False)),
+])
+def test_clean_name(raw, expected):
+    assert clean_name(raw) == expected
+
+
+@pytest.mark.parametrize("intro, companies, confident", [
+    ("Content @ Dock", ["Dock"], True),
+    ("Senior Engineer at Stripe", ["Stripe"], True),
+    ("CTO | Acme", ["Acme"], True),
+    ("Founder @ Acme | Investor at Sequoia Capital", ["Acme", "Sequoia Capital"], True),
+    ("ex-Meta, now building developer tools", ["Meta"], True),
+    ("Founder (Acme Labs) https://acmelabs.io", ["Acme Labs"], True),
+    ("Writer, speaker and Kubernetes wrangler", [], False),
+    ("Head of Growth at hubspot", [], False),
+    ("Working at home", [], False),
+    ("Acme | hello", [], False),
+    (None, [], True),
+])
+def test_extract_companies(intro, companies, confident):
+    assert extract_companies(intro) == (companies, confident)
+
+
+def test_role_words_are_not_companies():
+    companies, _ = extract_companies("Founder @ Acme | Investor at Sequoia Capital")
+    assert "Investor" not in companies
+
+
+@pytest.mark.parametrize("fixture", load_fixtures(), ids=lambda f: f["input"].get("name") or "")
+def test_rules_agree_with_fixture_when_confident(fixture):
+    result, confident = rule_based_enrich(fixture["input"])
+    if not confident:
+        pytest.skip("rules defer to the LLM")
+    expected = fixture["llm_output"]
+    assert (result["name"] or "").lower() == (expected["name"] or "").lower()
+    assert sorted(c.lower() for c in result["company_names"] or []) == \
+        sorted(c.lower() for c in expected["company_names"] or [])
+    assert sorted(result["links"] or []) == sorted(expected["links"] or [])
+
+
+def test_measure_rule_agreement_counts_recorded_fixtures(tmp_path):
+    path = tmp_path / "fixtures.jsonl"
+    fixtures = load_fixtures()
+    # A recorded entry that agrees and one where the rules are unsure
+    recorded = [dict(fixtures[0], source="llm"), dict(fixtures[-1], source="llm")]
+    recorded[1] = dict(recorded[1], input=dict(recorded[1]["input"], intro="Head of Growth at hubspot"))
+    path.write_text("\n".join(json.dumps(f) for f in fixtures + recorded) + "\n", encoding="utf-8")
+
+    report = measure_rule_agreement(str(path))
+    assert report["total"] == len(fixtures) + 2
+    assert report["agreement"] == 1.0
+    assert report["recorded"] == 1
+    assert report["recorded_all"] == 1
+    assert report["disagreements"] == []
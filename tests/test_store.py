@@ -0,0 +1,67 @@
+import pytest
+
+from scrappers.store import ProfileStore
+
+PROFILE = {
+    "name": "Eric Doty",
+    "image": "https://example.com/eric.png",
+    "summary": "Content lead",
+    "experience": [{"company": "Dock", "title": "Content Lead"}],
+    "location": "Portland, Oregon",
+    "open_to_work": True,
+    "connections": 500,
+}
+
+
+@pytest.fixture
+def store():
+    return ProfileStore(path=None, batch_size=2)
+
+
+def test_upsert_and_get(store):
+    assert store.upsert_many([("u1", PROFILE), ("u2", {"name": "Jane Roe"}), (None, PROFILE), ("u3", {})]) == 2
+    assert len(store) == 2
+    assert "u1" in store and "u3" not in store
+    assert store.get("u1") == PROFILE
+    assert store.get_many(["u2", "missing"]) == {"u2": {"name": "Jane Roe"}}
+
+
+def test_upsert_replaces_by_url(store):
+    store.upsert("u1", PROFILE)
+    store.upsert("u1", {"name": "Eric D.", "summary": "Moved on"})
+    assert len(store) == 1
+    assert store.get("u1") == {"name": "Eric D.", "summary": "Moved on"}
+
+
+def test_project_reads_columns_and_json_fields(store):
+    store.upsert_many([("u2", {"name": "Jane Roe"}), ("u1", PROFILE)])
+    projected = list(store.project(("name", "experience", "location", "open_to_work", "connections", "skills")))
+    assert projected == [
+        ("u1", {"name": "Eric Doty", "experience": PROFILE["experience"], "location": "Portland, Oregon",
+                "open_to_work": True, "connections": 500}),
+        ("u2", {"name": "Jane Roe"}),
+    ]
+
+
+def test_project_rejects_unsafe_fields(store):
+    with pytest.raises(ValueError):
+        list(store.project(("name", "x') FROM profiles --")))
+
+
+def test_iteration_pages_through_every_profile(store):
+    store.upsert_many((f"u{i:03d}", {"name": f"P{i}"}) for i in range(25))
+    urls = [url for url, _ in store.iter_profiles(chunk_size=4)]
+    assert urls == sorted(f"u{i:03d}" for i in range(25))
+    assert len(list(store.project(("name",), chunk_size=5))) == 25
+
+
+def test_delete(store):
+    store.upsert_many([("u1", PROFILE), ("u2", PROFILE)])
+    assert store.delete(["u1", "missing"]) == 1
+    assert len(store) == 1
+
+
+def test_store_persists_to_disk(tmp_path):
+    path = str(tmp_path / "profiles.sqlite")
+    ProfileStore(path).upsert("u1", PROFILE)
+    assert ProfileStore(path).get("u1") == PROFILE
@@ -0,0 +1,33 @@
+import io
+import json
+
+import pytest
+
+from scrappers.transform import _iter_json_array
+
+ITEMS = [{"name": "Zoë", "n": 12345, "nested": {"a": [1, 2, {"b": "]"}]}}, [], "x, y", 3.5, None, True,
+         {"s": "quote \" and , comma"}]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 16, 1 << 16])
+def test_iter_json_array_across_chunk_boundaries(chunk_size):
+    text = "  \n" + json.dumps(ITEMS, ensure_ascii=False, indent=1)
+    assert list(_iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == ITEMS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 1 << 16])
+def test_iter_json_array_numbers_at_buffer_end(chunk_size):
+    # Numbers must not be cut short at a chunk boundary ("12345" into 12 and 345, "3.5" into 3)
+    text = "[12345,678, 3.5, -2e3,0]"
+    assert list(_iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == [12345, 678, 3.5, -2000.0, 0]
+
+
+def test_iter_json_array_empty_inputs():
+    assert list(_iter_json_array(io.StringIO(""))) == []
+    assert list(_iter_json_array(io.StringIO(" [ ] "))) == []
+
+
+@pytest.mark.parametrize("text", ['{"a": 1}', '[{"a": 1}, {"b": 2'])
+def test_iter_json_array_rejects_bad_input(text):
+    with pytest.raises(ValueError):
+        list(_iter_json_array(io.StringIO(text), chunk_size=3))
@@ -0,0 +1,379 @@
+"""
+Local approximate-nearest-neighbour index of previously scraped profiles.
+
+Every scraped profile is added with its summary embedding (MiniLM, "text"
+space) and, when it was computed while scoring, its VGG16 image features
+("image" space). `find_best_linkedin_match` queries the index with the
+persona's intro and image before going to Google CSE and Tavily. The search
+APIs are only called when no local candidate scores high enough.
+
+Each space is an inverted-file (IVF) index. Vectors are normalized and
+appended to a memory-mapped float32 file. Below VECTOR_INDEX_TRAIN_MIN
+vectors a query scans them all. From then on, spherical k-means centroids
+split them into up to VECTOR_INDEX_NLIST lists, and a query only scans the
+VECTOR_INDEX_NPROBE lists whose centroids are closest. New vectors are
+assigned to their nearest list as they are inserted. The centroids are
+retrained whenever the space has grown VECTOR_INDEX_RETRAIN_GROWTH times since
+the last training. URLs, row numbers and the profiles themselves are kept in
+a SQLite catalogue next to the vector files.
+
+Several processes (prefork workers) may share one index directory. Rows are
+allocated inside an immediate SQLite write transaction, so writers take turns
+and never hand out the same row, and every process catches up with the rows
+and the training done by the others before it writes or queries.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import metrics
+
+ENABLED = os.getenv("VECTOR_INDEX", "1").lower() in ("1", "true", "yes")
+DEFAULT_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join(".cache", "vector_index"))
+NLIST = int(os.getenv("VECTOR_INDEX_NLIST", "256"))
+NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", "8"))
+# Spaces smaller than this are scanned exhaustively
+TRAIN_MIN = int(os.getenv("VECTOR_INDEX_TRAIN_MIN", "1024"))
+RETRAIN_GROWTH = float(os.getenv("VECTOR_INDEX_RETRAIN_GROWTH", "4"))
+# Cosine similarity below which a neighbour is not a candidate
+MIN_SIMILARITY = float(os.getenv("VECTOR_INDEX_MIN_SIMILARITY", "0.6"))
+
+_INITIAL_CAPACITY = 1024
+_KMEANS_ITERATIONS = 10
+_KMEANS_SAMPLE_PER_LIST = 64
+_ASSIGN_CHUNK = 65536
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 1e-6 else None
+
+
+def _map(filename, dtype, shape):
+    """Memory-maps `filename` as an array of `shape`, growing the file with zeros when needed."""
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    with open(filename, "ab") as f:
+        if f.tell() < size:
+            f.truncate(size)
+    return np.memmap(filename, dtype=dtype, mode="r+", shape=shape)
+
+
+class IVFIndex:
+    """
+    Inverted-file index of unit vectors of one embedding space.
+
+    Rows are dense integers handed out by the caller; writing an existing row replaces its vector.
+    Processes sharing the files call `sync` to see each other's rows.
+
+    Args:
+        path: File prefix (`<path>.vectors`, `<path>.lists`, `<path>.ivf.npz`)
+        dim: Vector dimension
+        count: Rows already stored in the files
+        nlist: Maximum number of inverted lists
+        nprobe: Lists scanned per query
+        train_min: Rows before the lists are trained
+    """
+
+    def __init__(self, path, dim, count=0, nlist=NLIST, nprobe=NPROBE, train_min=TRAIN_MIN):
+        self.path = path
+        self.dim = dim
+        self.count = count
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_min = train_min
+        self.capacity = 0
+        self.vectors = None
+        self.assignments = None
+        self._grow(max(count, _INITIAL_CAPACITY))
+
+        self.centroids = None
+        self.trained_on = 0
+        self._trained_stamp = None
+        self._load_centroids()
+        self._lists = self._build_lists()
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.path + ".ivf.npz")
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_centroids(self):
+        stamp = self._stamp()
+        if stamp is None or stamp == self._trained_stamp:
+            return False
+        with np.load(self.path + ".ivf.npz") as saved:
+            self.centroids = saved["centroids"]
+            self.trained_on = int(saved["trained_on"])
+        self._trained_stamp = stamp
+        return True
+
+    def sync(self, count):
+        """
+        Catches up with another process sharing the files: `count` rows are now
+        stored, and the lists may have been retrained.
+        """
+        if count > self.capacity:
+            self._grow(max(count, self.capacity * 2))
+        # Fewer rows than we hold after a rolled-back write: the catalogue is right
+        if self._load_centroids() or count < self.count:
+            self.count = count
+            self._lists = self._build_lists()
+            return
+        if count > self.count:
+            if self.centroids is not None:
+                for row in range(self.count, count):
+                    self._lists.setdefault(int(self.assignments[row]), []).append(row)
+            self.count = count
+
+    def _grow(self, capacity):
+        if self.vectors is not None:
+            self.flush()
+        self.vectors = _map(self.path + ".vectors", np.float32, (capacity, self.dim))
+        self.assignments = _map(self.path + ".lists", np.int32, (capacity,))
+        self.capacity = capacity
+
+    def _build_lists(self):
+        lists = {}
+        if self.centroids is None:
+            return lists
+        for row, list_id in enumerate(self.assignments[:self.count]):
+            lists.setdefault(int(list_id), []).append(row)
+        return lists
+
+    def add(self, row, vector):
+        """Stores `vector` (normalized) at `row`, which is either an existing row or `count`."""
+        if row > self.count:
+            raise ValueError(f"Row {row} would leave a gap after {self.count} rows")
+        if row == self.count:
+            if row >= self.capacity:
+                self._grow(self.capacity * 2)
+            self.count += 1
+        elif self.centroids is not None:
+            rows = self._lists.get(int(self.assignments[row]), [])
+            if row in rows:
+                rows.remove(row)
+        self.vectors[row] = vector
+
+        if self.centroids is None:
+            self.assignments[row] = -1
+            if self.count >= self.train_min:
+                self.train()
+        elif self.count >= RETRAIN_GROWTH * self.trained_on:
+            self.train()
+        else:
+            list_id = int(np.argmax(self.centroids @ vector))
+            self.assignments[row] = list_id
+            self._lists.setdefault(list_id, []).append(row)
+
+    def train(self, seed=0):
+        """Spherical k-means on a sample of the rows, then assigns every row to its nearest centroid."""
+        started = time.perf_counter()
+        nlist = max(1, min(self.nlist, int(np.sqrt(self.count))))
+        rng = np.random.default_rng(seed)
+        sample_size = min(self.count, nlist * _KMEANS_SAMPLE_PER_LIST)
+        sample = np.asarray(self.vectors[np.sort(rng.choice(self.count, sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)]
+        for _ in range(_KMEANS_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty lists keep their previous centroid
+            centroids = np.where(norms > 1e-6, sums / np.maximum(norms, 1e-6), centroids)
+
+        for start in range(0, self.count, _ASSIGN_CHUNK):
+            chunk = np.asarray(self.vectors[start:start + _ASSIGN_CHUNK][:self.count - start])
+            self.assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        self.centroids = centroids.astype(np.float32)
+        self.trained_on = self.count
+        self._lists = self._build_lists()
+        self.flush()
+        np.savez(self.path + ".ivf.tmp.npz", centroids=self.centroids, trained_on=self.trained_on)
+        os.replace(self.path + ".ivf.tmp.npz", self.path + ".ivf.npz")
+        self._trained_stamp = self._stamp()
+        print(f"Trained {nlist} IVF lists over {self.count} vectors of {os.path.basename(self.path)} "
+              f"in {time.perf_counter() - started:.2f}s.")
+
+    def search(self, vector, k=10):
+        """The `k` nearest rows as (row, cosine similarity), best first."""
+        if self.count == 0:
+            return []
+        if self.centroids is None:
+            rows = np.arange(self.count)
+        else:
+            probe = np.argsort(-(self.centroids @ vector))[:self.nprobe]
+            rows = np.fromiter((row for list_id in probe for row in self._lists.get(int(list_id), ())),
+                               dtype=np.int64)
+            if not len(rows):
+                return []
+        scores = self.vectors[rows] @ vector
+        top = np.argsort(-scores)[:k] if len(scores) <= k else np.argpartition(-scores, k)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def flush(self):
+        self.vectors.flush()
+        self.assignments.flush()
+
+
+class ProfileIndex:
+    """
+    Profiles by URL with one IVFIndex per embedding space.
+
+    Args:
+        directory: Where the SQLite catalogue and the vector files are kept
+    """
+
+    def __init__(self, directory=DEFAULT_INDEX_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Another process may hold the write lock while it retrains a space
+        self._db = sqlite3.connect(os.path.join(directory, "catalogue.sqlite"), timeout=60,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS profiles (url TEXT PRIMARY KEY, profile TEXT, added_at REAL);
+            CREATE TABLE IF NOT EXISTS spaces (name TEXT PRIMARY KEY, dim INTEGER);
+            CREATE TABLE IF NOT EXISTS vectors (
+                space TEXT, url TEXT, row INTEGER, PRIMARY KEY (space, url));
+            CREATE UNIQUE INDEX IF NOT EXISTS vectors_by_row ON vectors (space, row);
+        """)
+        self._db.commit()
+        self._spaces = {}
+        self._sync()
+
+    def _sync(self):
+        """Picks up spaces, rows and trainings added by other processes."""
+        counts = dict(self._db.execute("SELECT space, MAX(row) + 1 FROM vectors GROUP BY space").fetchall())
+        for name, dim in self._db.execute("SELECT name, dim FROM spaces").fetchall():
+            count = counts.get(name) or 0
+            index = self._spaces.get(name)
+            if index is None:
+                self._spaces[name] = IVFIndex(os.path.join(self.directory, name), dim, count)
+            else:
+                index.sync(count)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    def _space(self, name, dim):
+        index = self._spaces.get(name)
+        if index is None:
+            self._db.execute("INSERT INTO spaces VALUES (?, ?)", (name, dim))
+            index = self._spaces[name] = IVFIndex(os.path.join(self.directory, name), dim)
+        elif index.dim != dim:
+            raise ValueError(f"{name} vectors have {index.dim} dimensions, got {dim}")
+        return index
+
+    def add_many(self, items):
+        """
+        Adds or replaces profiles in one transaction.
+
+        Args:
+            items: (url, profile, {space: vector}) triples; missing or zero vectors are skipped
+
+        Returns:
+            int: Number of profiles written
+        """
+        with self._lock:
+            # Taking the write lock before reading the row counts keeps other processes from
+            # handing out the same rows
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                added = self._add_locked(items)
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+            total = self._db.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+        metrics.set_gauge("vector_index_profiles", total)
+        return added
+
+    def _add_locked(self, items):
+        self._sync()
+        added = 0
+        now = time.time()
+        for url, profile, vectors in items:
+            self._db.execute("INSERT OR REPLACE INTO profiles VALUES (?, ?, ?)",
+                             (url, json.dumps(profile, ensure_ascii=False), now))
+            for space, vector in (vectors or {}).items():
+                vector = None if vector is None else _unit(vector)
+                if vector is None:
+                    continue
+                index = self._space(space, len(vector))
+                row = self._db.execute("SELECT row FROM vectors WHERE space = ? AND url = ?",
+                                       (space, url)).fetchone()
+                row = index.count if row is None else row[0]
+                index.add(row, vector)
+                self._db.execute("INSERT OR REPLACE INTO vectors VALUES (?, ?, ?)", (space, url, row))
+            added += 1
+        # Vectors reach the files before the catalogue points at them
+        for index in self._spaces.values():
+            index.flush()
+        return added
+
+    def add(self, url, profile, **vectors):
+        """`add_many` for one profile; vectors are passed by space (text=..., image=...)."""
+        return self.add_many([(url, profile, vectors)])
+
+    def query(self, k=10, min_similarity=MIN_SIMILARITY, **vectors):
+        """
+        Nearest profiles to the given vectors (text=..., image=...).
+
+        Returns:
+            list: (url, similarity) pairs, best first. A URL found in several
+            spaces gets its highest similarity.
+        """
+        best = {}
+        with self._lock:
+            self._sync()
+            for space, vector in vectors.items():
+                index = self._spaces.get(space)
+                vector = None if vector is None else _unit(vector)
+                if index is None or vector is None or len(vector) != index.dim:
+                    continue
+                hits = [(row, score) for row, score in index.search(vector, k) if score >= min_similarity]
+                if not hits:
+                    continue
+                urls = dict(self._db.execute(
+                    f"SELECT row, url FROM vectors WHERE space = ? AND row IN ({','.join('?' * len(hits))})",
+                    [space] + [row for row, _ in hits]).fetchall())
+                for row, score in hits:
+                    if row in urls:
+                        best[urls[row]] = max(best.get(urls[row], -1.0), score)
+        metrics.cache_lookup("vector_index", bool(best))
+        return sorted(best.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def profiles(self, urls):
+        """Stored profiles for `urls`: url -> profile (unknown URLs are left out)."""
+        urls = list(urls)
+        if not urls:
+            return {}
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT url, profile FROM profiles WHERE url IN ({','.join('?' * len(urls))})", urls).fetchall()
+        return {url: json.loads(profile) for url, profile in rows}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_profile_index():
+    """Shared index in VECTOR_INDEX_DIR."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ProfileIndex()
+    return _index